@@ -1,40 +1,89 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import os, uuid, json, hashlib
+import os, uuid, json, hashlib, threading, contextvars, time
 from typing import Literal
 import random
 
 from .settings import settings
+from . import metrics
+from .rag.llm_cache import get_cache
+from .providers.ollama_pool import pool_stats
 from .rag.store import (
     init_db,
     save_question_with_citations,
-    insert_rating,
+    apply_ratings,
+    existing_question_ids,
     get_source_id_by_sha256,
     backfill_sources_sha256,
     backfill_questions_fingerprint,
-    get_question_id_by_fingerprint,
+    backfill_questions_topic,
+    reset_questions_total_cache,
+    question_fingerprint_exists,
+    reset_fingerprint_cache,
+    reset_connection_pool,
     make_question_fingerprint,
-    list_recent_question_stems,
     list_sources,
     get_question,
     list_questions,
+    add_to_question_pool,
+    take_pooled_questions,
 )
 
 
-from .rag.ingest import ingest_files
+from .rag.ingest import ingest_files, backfill_sentences, backfill_minhash
 from .rag.search import rag_search
-from .rag.generate import gen_yes_no, gen_mcq
+from .rag.clusters import update_clusters, cluster_contexts, reset_cluster_cache
+from .rag.packer import pack_context, calibration as token_calibration
+from .rag.budget import llm_budget, BudgetExceeded
+from .rag.scheduler import (
+    llm_client,
+    get_scheduler,
+    SchedulerBusy,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BULK,
+)
+from .rag.generate import gen_yes_no, gen_mcq, gen_yes_no_batch, gen_mcq_batch
+from .rag.llm import provider_model
+from .rag.question_pool import init_pool_worker, get_pool_worker, POOL_CLIENT
+from .rag.rating_queue import init_rating_queue, get_rating_queue
+from .rag.verifier import mode as verifier_mode
+from .rag.rerank import enabled as rerank_enabled
+from .rag.stem_index import remember_stem, reset_stem_index, get_stem_index
 
 app = FastAPI(title="Testownik AI Backend", version="0.1.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
-def _pick_ctx(ctx_all: list[dict], i: int, size: int) -> list[dict]:
+def _pick_ctx(ctx_all: list[dict], i: int, budget_tokens: int, model: str | None = None) -> list[dict]:
+    """Fragment wiodący (rotacja po i) + najlepsze/różnorodne fragmenty w budżecie tokenów.
+
+    Wyniki z grupami (rag_search diversity/groups): kontekst z jednej grupy, rotacja grup po i.
+    """
     if not ctx_all:
         return []
+    n_groups = 1 + max((c.get("group", -1) for c in ctx_all), default=-1)
+    if n_groups > 0:
+        members = [c for c in ctx_all if c.get("group") == i % n_groups]
+        if len(members) >= 2:
+            return pack_context(members, budget_tokens, first=members[0], model=model)
     focus = ctx_all[i % len(ctx_all)]
-    others = [c for c in ctx_all if c is not focus]
-    random.shuffle(others)
-    return [focus] + others[: max(0, size - 1)]
+    return pack_context(ctx_all, budget_tokens, first=focus, model=model)
+
+@app.exception_handler(SchedulerBusy)
+def _scheduler_busy(request: Request, exc: SchedulerBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "llm_busy", "retry_after": exc.retry_after_s},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
+def _client_id(request: Request) -> str:
+    """Klient do fair share w schedulerze: nagłówek X-Client-Id, inaczej IP."""
+    cid = request.headers.get("x-client-id")
+    if cid:
+        return cid.strip()[:64]
+    return request.client.host if request.client else "anonymous"
 
 @app.on_event("startup")
 def _startup():
@@ -44,23 +93,60 @@ def _startup():
     # ważne: żeby deduplikacja działała też dla starych uploadów
     backfill_sources_sha256(settings.src_dir, db_path=settings.db_path)
     backfill_questions_fingerprint(db_path=settings.db_path)
+    backfill_questions_topic(db_path=settings.db_path)
+    if settings.ctx_sentences > 0:
+        backfill_sentences(settings.db_path, emb_model=settings.emb_model)
+    if settings.dedup_jaccard > 0:
+        backfill_minhash(settings.db_path)
+    update_clusters(settings.db_path)
+    # pula pytań: wątek dopełniający (QPOOL_TARGET=0 -> nie startuje)
+    init_pool_worker(_pool_fill, db_path=settings.db_path).start()
+    # oceny: write-behind (RATE_FLUSH_MS=0 -> None, zapis synchroniczny)
+    rq = init_rating_queue(settings.db_path)
+    if rq is not None:
+        rq.start()
+
+@app.on_event("shutdown")
+def _shutdown():
+    worker = get_pool_worker()
+    if worker is not None:
+        worker.stop()
+    rq = get_rating_queue()
+    if rq is not None:
+        rq.stop()
 
 
 class SearchReq(BaseModel):
     query: str
     k: int = 8
+    diversity: float = 0.0
 
 class GenReq(BaseModel):
     topic: str | None = None
     difficulty: str | None = "medium"
     n: int = 1
     provider: Literal["default", "none", "ollama", "openai"] = "default"
+    # ile pytań prosić w jednym wywołaniu LLM (1 = tryb pojedynczy)
+    batch: int = 1
+    # hedging (tryb pojedynczy): ilu kandydatów generować równolegle w pierwszej próbie
+    hedge: int = 1
+    # 0..1: różnorodność kontekstów (MMR + grupy kontekstu per pytanie); 0 = losowe tasowanie.
+    # Bez topic ignorowane: konteksty z klastrów są już rozłożone po całym materiale
+    diversity: float = 0.0
+    # najpierw wydaj pytania z puli pre-generowanych (False = zawsze na żywo)
+    pool: bool = True
+    # budżet requestu: po przekroczeniu zwracamy to, co już jest (+ reason)
+    max_llm_calls: int | None = None
+    deadline_ms: int | None = None
 
 class RateReq(BaseModel):
     question_id: str
     score: int
     feedback: str | None = None
 
+class RateBatchReq(BaseModel):
+    ratings: list[RateReq]
+
 @app.post("/upload")
 async def upload(files: list[UploadFile] = File(...)):
     dsts = []
@@ -86,6 +172,8 @@ async def upload(files: list[UploadFile] = File(...)):
         dsts.append(p)
 
     stats = ingest_files(dsts, db_path=settings.db_path, index_dir=settings.index_dir, emb_model=settings.emb_model)
+    # k-means / przypisania to CPU + SQLite -> poza pętlą zdarzeń
+    await run_in_threadpool(update_clusters, settings.db_path)
     return {"ingested": stats, "skipped": skipped}
 @app.get("/providers")
 def providers():
@@ -95,7 +183,7 @@ def providers():
     # Czy backend ma sensownie skonfigurowane klucze/URL
     configured = {
         "openai": bool(getattr(settings, "openai_api_key", None)),
-        "ollama": bool(getattr(settings, "ollama_base_url", None)),
+        "ollama": bool(getattr(settings, "ollama_endpoints", None) or getattr(settings, "ollama_base_url", None)),
         "none": True,
         "default": True,
     }
@@ -106,6 +194,64 @@ def providers():
         "configured": configured,
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Liczniki i obserwacje procesu (m.in. hit-rate cache LLM)."""
+    out = metrics.snapshot()
+    cache = get_cache()
+    out["llm_cache"] = cache.stats() if cache is not None else {"enabled": False}
+    # odsetek nieparsowalnych wyjść LLM per typ wywołania (structured output: LLM_JSON_SCHEMA)
+    parse: dict[str, dict] = {}
+    for name, val in out["counters"].items():
+        if name.startswith("llm.parse."):
+            kind, status = name[len("llm.parse."):].rsplit(".", 1)
+            parse.setdefault(kind, {"ok": 0, "fail": 0})[status] = int(val)
+    for v in parse.values():
+        total = v["ok"] + v["fail"]
+        v["fail_rate"] = round(v["fail"] / total, 4) if total else None
+    out["llm_parse"] = parse
+    out["ollama_pool"] = pool_stats()
+    sched = get_scheduler()
+    out["llm_scheduler"] = sched.stats() if sched is not None else {"enabled": False}
+    out["stem_index"] = get_stem_index().stats()
+    out["ctx_packer"] = {"token_budget": settings.ctx_token_budget, "chars_per_token": token_calibration()}
+    # weryfikator NLI: zgodność z checkerem LLM (shadow) i czas na pytanie vs LLM
+    c, obs = out["counters"], out["observations"]
+    agree, disagree = int(c.get("nli.shadow.agree", 0)), int(c.get("nli.shadow.disagree", 0))
+    out["nli_verifier"] = {
+        "mode": verifier_mode(),
+        "decided": int(c.get("nli.decided", 0)),
+        "fallback": int(c.get("nli.fallback", 0)),
+        "shadow_agreement": round(agree / (agree + disagree), 4) if agree + disagree else None,
+        "nli_ms_p50": obs.get("nli.ms", {}).get("p50"),
+        "llm_check_ms_p50": obs.get("check.llm_ms", {}).get("p50"),
+    }
+    # reranking: koszt cross-encodera na wyszukiwanie vs szacowany zaoszczędzony prefill
+    # (odcięte tokeny x zmierzony ms/token prefillu); pełne porównanie: RERANK=off vs on
+    # i ctx.pack_tokens / llm.prompt_tokens / llm.prefill_ms w observations.
+    # Bez statystyk prefillu od providera (OpenAI, przerwany stream) -> czas do pierwszego tokenu
+    cut_tok = obs.get("rerank.cut_tokens", {}).get("avg")
+    ms_src = "prefill" if "llm.prefill_ms_per_token" in obs else "ttft" if "llm.ttft_ms_per_token" in obs else None
+    ms_tok = obs.get(f"llm.{ms_src}_ms_per_token", {}).get("p50") if ms_src else None
+    out["rerank"] = {
+        "enabled": rerank_enabled(),
+        "model": settings.rerank_model,
+        "searches": obs.get("rerank.ms", {}).get("count", 0),
+        "rerank_ms_p50": obs.get("rerank.ms", {}).get("p50"),
+        "rerank_ms_p95": obs.get("rerank.ms", {}).get("p95"),
+        "pairs_p50": obs.get("rerank.pairs", {}).get("p50"),
+        "cut": int(c.get("rerank.cut", 0)),
+        "cut_tokens_avg": cut_tok,
+        "prefill_ms_per_token_p50": ms_tok,
+        "prefill_ms_source": ms_src,
+        "est_prefill_saved_ms": round(cut_tok * ms_tok, 3) if cut_tok is not None and ms_tok is not None else None,
+    }
+    rq = get_rating_queue()
+    out["rating_queue"] = rq.stats() if rq is not None else {"enabled": False}
+    worker = get_pool_worker()
+    out["question_pool"] = worker.stats() if worker is not None else {"enabled": False}
+    return out
+
 @app.get("/sources")
 def get_sources(limit: int = 1000, offset: int = 0):
     """Lista wszystkich źródeł w bazie (z paginacją)."""
@@ -126,6 +272,12 @@ def clear_sources():
                 except Exception:
                     pass
 
+    # oceny z kolejki dotyczą usuwanych pytań, ale nie zostawiamy ich w locie
+    rq = get_rating_queue()
+    if rq is not None:
+        rq.flush()
+    # otwarte połączenia z puli blokowałyby usunięcie pliku (Windows) / trzymały stary plik
+    reset_connection_pool()
     for p in [settings.db_path, settings.db_path + "-wal", settings.db_path + "-shm"]:
         if os.path.exists(p):
             try:
@@ -136,126 +288,293 @@ def clear_sources():
     os.makedirs(settings.index_dir, exist_ok=True)
     os.makedirs(settings.src_dir, exist_ok=True)
     init_db(settings.db_path)
+    reset_fingerprint_cache(settings.db_path)
+    reset_questions_total_cache(settings.db_path)
+    reset_stem_index(settings.db_path)
+    reset_cluster_cache(settings.db_path)
     return {"ok": True, "removed_files": removed_files}
 
 @app.post("/search")
 def search(req: SearchReq):
-    return {"results": rag_search(req.query, k=req.k, db_path=settings.db_path)}
-
-@app.post("/gen/yn")
-def gen_yn(req: GenReq):
+    t0 = time.perf_counter()
+    results = rag_search(req.query, k=req.k, db_path=settings.db_path, diversity=req.diversity)
+    metrics.observe("http.search_ms", (time.perf_counter() - t0) * 1000.0)
+    return {"results": results}
+
+_GEN_KINDS = {
+    # kind: (generator, generator batchowy, min. liczba chunków z RAG, mnożnik CTX_TOKEN_BUDGET na pytanie)
+    "YN": (gen_yes_no, gen_yes_no_batch, 30, 1.0),
+    "MCQ": (gen_mcq, gen_mcq_batch, 40, 1.5),
+}
+
+
+def _iter_generation(
+    req: GenReq,
+    kind: str,
+    stop: threading.Event | None = None,
+    client: str = "anonymous",
+    priority: int | None = None,
+):
+    """Wspólna pętla generowania dla /gen/yn i /gen/mcq.
+
+    Generator zwraca zdarzenia (dict) w kolejności pracy:
+      - {"event": "progress", "index", "attempt", "status": "rejected", "reason"}
+      - {"event": "question", "index", "attempt", "question_id", "question"} — po zapisie w DB
+        (z "pooled": true, gdy pytanie pochodzi z puli pre-generowanych)
+      - {"event": "done", "count", "requested", "reason", "llm_calls"}
+    Ustawienie `stop` przerywa pracę przed kolejną próbą (np. rozłączony klient).
+    Budżet (max_llm_calls / deadline_ms) kończy pracę czysto — zostają pytania
+    wyprodukowane do tej pory, a `reason` mówi dlaczego.
+    Wywołania LLM idą przez scheduler jako `client`; n=1 ma priorytet interaktywny
+    (chyba że podano `priority`).
+    Przy req.pool najpierw wydajemy pytania z puli, na żywo generujemy tylko resztę.
+    SchedulerBusy bez żadnego pytania leci dalej (-> 429), z pytaniami kończy pracę.
+    """
+    gen_fn, batch_fn, k_min, ctx_scale = _GEN_KINDS[kind]
+    ctx_budget = int(settings.ctx_token_budget * ctx_scale)
+    # estymator tokenów kalibrowany per model -> pakuj kontekst pod model, który go dostanie
+    ctx_model = provider_model(req.provider)
     n = max(1, int(req.n))
-    # więcej kontekstu => większa szansa na unikalne pytania
-    ctx_all = rag_search(req.topic or "przegląd materiału", k=max(30, n * 12), db_path=settings.db_path)
-    random.shuffle(ctx_all)
+    batch = max(1, min(int(req.batch), 10))
+    hedge = max(1, min(int(req.hedge), settings.llm_max_hedge))
 
-    recent_ban = list_recent_question_stems(settings.db_path, kind="YN", topic=req.topic, limit=40)
-
-    items = []
-    used_fps: set[str] = set()
-    used_stems: list[str] = []
+    count = 0
+    reason = "completed"
 
-    for i in range(n):
-        added = False
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE if n == 1 else PRIORITY_BULK
 
-        for attempt in range(12):
-            ctx = _pick_ctx(ctx_all, i + attempt, size=4)
+    worker = get_pool_worker() if client != POOL_CLIENT else None
+    if worker is not None:
+        worker.note_demand(kind, req.topic, req.difficulty)
+        worker.touch()
 
-            ban = (recent_ban + used_stems)[-40:]
-            q = gen_yes_no(ctx, topic=req.topic, difficulty=req.difficulty, provider=req.provider, variant=i + 1 + attempt)
-
-
-            # Jeśli generator wpadł w fallback (debug.fallback_reason), to nie zapisujmy takiego pytania.
-            # Lepiej zwrócić mniej pytań niż utrwalać bełt typu „zgodne z cytowanym fragmentem”.
-            if req.provider != "none" and isinstance(q, dict) and isinstance(q.get("debug"), dict):
-                if q["debug"].get("fallback_reason"):
+    with llm_budget(max_calls=req.max_llm_calls, deadline_ms=req.deadline_ms) as budget, llm_client(client, priority):
+        if req.pool and req.provider != "none":
+            for qid in take_pooled_questions(settings.db_path, kind, req.topic, req.difficulty, n):
+                item = get_question(qid, settings.db_path, with_quality=False)
+                if item is None:
                     continue
+                yield {"event": "question", "index": count, "attempt": 0, "question_id": qid, "question": item["question"], "pooled": True}
+                count += 1
+            metrics.inc("qpool.hit" if count == n else "qpool.partial" if count else "qpool.miss")
+            metrics.inc("qpool.served", count)
+
+        ctx_all: list[dict] = []
+        if count < n:
+            # więcej kontekstu => większa szansa na unikalne pytania
+            k_ctx = max(k_min, (n - count) * 12)
+            if not req.topic:
+                # bez tematu: konteksty round-robin z klastrów tematycznych (cały materiał po równo)
+                ctx_all = cluster_contexts(settings.db_path, k=k_ctx)
+            if not ctx_all:
+                ctx_all = rag_search(
+                    req.topic or "przegląd materiału",
+                    k=k_ctx,
+                    db_path=settings.db_path,
+                    sentences=settings.ctx_sentences,
+                    diversity=req.diversity,
+                    groups=(n - count) if req.diversity > 0 else 0,
+                )
+                if req.diversity <= 0:
+                    random.shuffle(ctx_all)
+
+        used_fps: set[str] = set()
+        # kandydaci z jednego wywołania batchowego, jeszcze nie sprawdzeni pod kątem duplikatów
+        pending: list[dict] = []
+
+        try:
+            for i in range(count, n):
+                added = False
+
+                for attempt in range(12):
+                    if stop is not None and stop.is_set():
+                        reason = "cancelled"
+                        break
+                    if worker is not None:
+                        worker.touch()
+
+                    if not pending:
+                        # budżet tylko przed nowym wywołaniem LLM — kandydaci z poprzedniego
+                        # batcha są już opłaceni i zapis nie kosztuje wywołania
+                        budget.check()
+                        k = min(batch, n - i)
+                        if k > 1:
+                            # więcej fragmentów, żeby starczyło faktów na k różnych pytań
+                            ctx = _pick_ctx(ctx_all, i + attempt, budget_tokens=int(ctx_budget * (1 + 0.5 * (k - 1))), model=ctx_model)
+                            pending = batch_fn(ctx, k, topic=req.topic, difficulty=req.difficulty, provider=req.provider, variant=i + 1 + attempt)
+                            if not pending:
+                                yield _progress(i, attempt, "batch_empty")
+                                continue
+                        else:
+                            ctx = _pick_ctx(ctx_all, i + attempt, budget_tokens=ctx_budget, model=ctx_model)
+                            pending = [gen_fn(ctx, topic=req.topic, difficulty=req.difficulty, provider=req.provider, variant=i + 1 + attempt, hedge=hedge)]
+                    q = pending.pop(0)
+
+                    # Jeśli generator wpadł w fallback (debug.fallback_reason), to nie zapisujmy takiego pytania.
+                    # Lepiej zwrócić mniej pytań niż utrwalać bełt typu „zgodne z cytowanym fragmentem”.
+                    if req.provider != "none" and isinstance(q, dict) and isinstance(q.get("debug"), dict):
+                        if q["debug"].get("fallback_reason"):
+                            yield _progress(i, attempt, f"fallback: {q['debug']['fallback_reason']}")
+                            continue
+
+                    fp = make_question_fingerprint(q.get("kind", kind), q.get("stem", ""), q.get("options"))
+
+                    # duplikat w tym samym batchu
+                    if fp in used_fps:
+                        yield _progress(i, attempt, "duplicate_in_batch")
+                        continue
+
+                    # duplikat w bazie (wcześniej wygenerowane) — zbiór w pamięci, bez SQLite
+                    if question_fingerprint_exists(fp, db_path=settings.db_path):
+                        yield _progress(i, attempt, "duplicate_in_db")
+                        continue
+
+                    qid = str(uuid.uuid4())
+                    try:
+                        saved = save_question_with_citations(qid, q, db_path=settings.db_path, fingerprint=fp)
+                    except Exception:
+                        yield _progress(i, attempt, "save_failed")
+                        continue
+                    if not saved:
+                        # wyścig z innym requestem — rozstrzygnął UNIQUE index
+                        yield _progress(i, attempt, "duplicate_in_db")
+                        continue
+
+                    used_fps.add(fp)
+                    # parafrazy tego pytania będą odrzucane (także w tym samym requeście)
+                    remember_stem(kind, req.topic, q.get("stem", ""))
+                    count += 1
+                    yield {"event": "question", "index": i, "attempt": attempt, "question_id": qid, "question": q}
+                    added = True
+                    break
+
+                if reason == "cancelled":
+                    break
+                if not added:
+                    # brak możliwości wyprodukowania kolejnego unikalnego pytania w limicie prób
+                    reason = "attempts_exhausted"
+                    break
+        except BudgetExceeded as e:
+            reason = e.reason
+        except SchedulerBusy:
+            if count == 0:
+                raise
+            reason = "scheduler_busy"
+
+    yield {"event": "done", "count": count, "requested": n, "reason": reason, "llm_calls": budget.calls}
+
+
+def _pool_fill(kind: str, topic: str, difficulty: str, n: int, stop: threading.Event) -> int:
+    """Dopełnienie puli: generowanie w tle (priorytet bulk), wynik trafia do question_pool."""
+    req = GenReq(topic=topic or None, difficulty=difficulty or None, n=n, batch=settings.qpool_batch, pool=False)
+    qids = [
+        ev["question_id"]
+        for ev in _iter_generation(req, kind, stop=stop, client=POOL_CLIENT, priority=PRIORITY_BULK)
+        if ev["event"] == "question"
+    ]
+    return add_to_question_pool(settings.db_path, qids, kind, topic, difficulty)
+
+
+def _progress(i: int, attempt: int, reason: str) -> dict:
+    return {"event": "progress", "index": i, "attempt": attempt, "status": "rejected", "reason": reason}
+
+
+def _collect(req: GenReq, kind: str, client: str):
+    items = []
+    reason = "completed"
+    for ev in _iter_generation(req, kind, client=client):
+        if ev["event"] == "question":
+            items.append({"question_id": ev["question_id"], "question": ev["question"]})
+        elif ev["event"] == "done":
+            reason = ev["reason"]
 
-            fp = make_question_fingerprint(q.get("kind", "YN"), q.get("stem", ""), q.get("options"))
+    if max(1, int(req.n)) == 1 and items:
+        return items[0]
+    return {"items": items, "reason": reason}
 
-            # duplikat w tym samym batchu
-            if fp in used_fps:
-                continue
 
-            # duplikat w bazie (wcześniej wygenerowane)
-            if get_question_id_by_fingerprint(fp, db_path=settings.db_path) is not None:
-                continue
+async def _sse(request: Request, req: GenReq, kind: str):
+    """Zdarzenia z _iter_generation jako Server-Sent Events.
 
-            qid = str(uuid.uuid4())
+    Każdy krok generatora idzie do threadpoola (LLM/SQLite blokują), a przed
+    kolejnym krokiem sprawdzamy, czy klient się nie rozłączył.
+    """
+    stop = threading.Event()
+    events = _iter_generation(req, kind, stop=stop, client=_client_id(request))
+    # jeden kontekst dla wszystkich kroków generatora (contextvars ustawione w środku przetrwają)
+    ctx = contextvars.copy_context()
+    try:
+        while True:
+            if await request.is_disconnected():
+                break
             try:
-                save_question_with_citations(qid, q, db_path=settings.db_path, fingerprint=fp)
-            except Exception:
-                # np. wyścig / unique constraint — spróbuj jeszcze raz
-                continue
-
-            used_fps.add(fp)
-            used_stems.append(q.get("stem", ""))
-            items.append({"question_id": qid, "question": q})
-            added = True
-            break
+                ev = await run_in_threadpool(ctx.run, next, events, None)
+            except SchedulerBusy as e:
+                # nagłówki SSE już poszły — 429 jako zdarzenie
+                ev = {"event": "error", "detail": "llm_busy", "retry_after": e.retry_after_s}
+                yield f"event: error\ndata: {json.dumps(ev)}\n\n"
+                break
+            if ev is None:
+                break
+            yield f"event: {ev['event']}\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+    finally:
+        stop.set()
+        try:
+            events.close()
+        except ValueError:
+            # generator nadal pracuje w wątku — zatrzyma się sam na `stop`
+            pass
 
-        if not added:
-            # brak możliwości wyprodukowania kolejnego unikalnego pytania w limicie prób
-            break
 
-    return items[0] if n == 1 else {"items": items}
+@app.post("/gen/yn")
+def gen_yn(req: GenReq, request: Request):
+    return _collect(req, "YN", client=_client_id(request))
 
 @app.post("/gen/mcq")
-def generate_mcq(req: GenReq):
-    n = max(1, int(req.n))
-    ctx_all = rag_search(req.topic or "przegląd materiału", k=max(40, n * 12), db_path=settings.db_path)
-    random.shuffle(ctx_all)
-
-    recent_ban = list_recent_question_stems(settings.db_path, kind="MCQ", topic=req.topic, limit=40)
+def generate_mcq(req: GenReq, request: Request):
+    return _collect(req, "MCQ", client=_client_id(request))
 
-    items = []
-    used_fps: set[str] = set()
-    used_stems: list[str] = []
-
-    for i in range(n):
-        added = False
+@app.post("/gen/yn/stream")
+async def gen_yn_stream(req: GenReq, request: Request):
+    """Jak /gen/yn, ale każde pytanie wysyłane jest (SSE) zaraz po zapisie."""
+    return StreamingResponse(_sse(request, req, "YN"), media_type="text/event-stream")
 
-        for attempt in range(12):
-            ctx = _pick_ctx(ctx_all, i + attempt, size=6)
+@app.post("/gen/mcq/stream")
+async def generate_mcq_stream(req: GenReq, request: Request):
+    """Jak /gen/mcq, ale każde pytanie wysyłane jest (SSE) zaraz po zapisie."""
+    return StreamingResponse(_sse(request, req, "MCQ"), media_type="text/event-stream")
 
-            ban = (recent_ban + used_stems)[-40:]
-            q = gen_mcq(ctx, topic=req.topic, difficulty=req.difficulty, provider=req.provider, variant=i + 1 + attempt)
 
-            # Jeśli generator wpadł w fallback (debug.fallback_reason), to nie zapisujmy takiego pytania.
-            if req.provider != "none" and isinstance(q, dict) and isinstance(q.get("debug"), dict):
-                if q["debug"].get("fallback_reason"):
-                    continue
+_RATE_BATCH_MAX = 1000
 
 
-            fp = make_question_fingerprint(q.get("kind", "MCQ"), q.get("stem", ""), q.get("options"))
-
-            if fp in used_fps:
-                continue
-            if get_question_id_by_fingerprint(fp, db_path=settings.db_path) is not None:
-                continue
-
-            qid = str(uuid.uuid4())
-            try:
-                save_question_with_citations(qid, q, db_path=settings.db_path, fingerprint=fp)
-            except Exception:
-                continue
-
-            used_fps.add(fp)
-            used_stems.append(q.get("stem", ""))
-            items.append({"question_id": qid, "question": q})
-            added = True
-            break
-
-        if not added:
-            break
-
-    return items[0] if n == 1 else {"items": items}
-
+def _submit_ratings(reqs: list[RateReq]) -> tuple[int, list[str]]:
+    """Oceny istniejących pytań -> kolejka write-behind (albo od razu do bazy). (przyjęte, odrzucone id)."""
+    known = existing_question_ids(settings.db_path, [r.question_id for r in reqs])
+    rows = [(r.question_id, r.score, r.feedback) for r in reqs if r.question_id in known]
+    rejected = [r.question_id for r in reqs if r.question_id not in known]
+    rq = get_rating_queue()
+    if rq is not None:
+        rq.submit(rows)
+    else:
+        apply_ratings(settings.db_path, rows)
+    return len(rows), rejected
 
 @app.post("/rate")
 def rate(req: RateReq):
-    insert_rating(req.question_id, req.score, req.feedback, db_path=settings.db_path)
+    accepted, _ = _submit_ratings([req])
+    if not accepted:
+        raise HTTPException(status_code=404, detail="question_not_found")
     return {"ok": True}
+
+@app.post("/rate/batch")
+def rate_batch(req: RateBatchReq):
+    """Wiele ocen naraz (np. koniec quizu); nieistniejące pytania wracają w `rejected`."""
+    if len(req.ratings) > _RATE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"max {_RATE_BATCH_MAX} ratings per batch")
+    accepted, rejected = _submit_ratings(req.ratings)
+    return {"ok": True, "accepted": accepted, "rejected": rejected}
 @app.get("/questions")
 def questions(
     limit: int = 100,
@@ -264,30 +583,44 @@ def questions(
     topic: str | None = None,          # <-- NOWE
     with_citations: bool = True,
     with_quality: bool = True,
+    difficulty: str | None = None,
+    cursor: str | None = None,
+    with_total: bool = True,
 ):
     """Lista zapisanych pytań (z paginacją).
 
     Parametry:
       - kind: "YN" | "MCQ" | None
       - topic: filtr po metadata.topic (np. "algorytmy")
+      - difficulty: filtr po metadata.difficulty
+      - cursor: `next_cursor` z poprzedniej strony (keyset, zamiast offset)
+      - with_total: czy liczyć total (z cache); false -> total=null
       - with_citations: czy dołączać cytowania
-      - with_quality: czy dołączać avg_score/votes (view question_quality)
+      - with_quality: czy dołączać avg_score/votes (tabela question_stats)
     """
-    return list_questions(
-        settings.db_path,
-        limit=limit,
-        offset=offset,
-        kind=kind,
-        topic=topic,                     # <-- NOWE
-        with_citations=with_citations,
-        with_quality=with_quality,
-    )
+    try:
+        return list_questions(
+            settings.db_path,
+            limit=limit,
+            offset=offset,
+            kind=kind,
+            topic=topic,                     # <-- NOWE
+            with_citations=with_citations,
+            with_quality=with_quality,
+            difficulty=difficulty,
+            cursor=cursor,
+            with_total=with_total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/questions/{question_id}")
 def question(question_id: str, with_quality: bool = True):
     """Jedno pytanie po ID (np. do ponownego wyświetlenia/rate)."""
+    t0 = time.perf_counter()
     q = get_question(question_id, db_path=settings.db_path, with_quality=with_quality)
+    metrics.observe("http.question_ms", (time.perf_counter() - t0) * 1000.0)
     if not q:
         raise HTTPException(status_code=404, detail="question_not_found")
     return q
@@ -0,0 +1,50 @@
+import threading
+
+# Proste metryki procesu (liczniki + ostatnie obserwacje), wystawiane przez GET /metrics.
+
+_MAX_OBS = 1000
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_obs: dict[str, list[float]] = {}
+
+
+def inc(name: str, n: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name: str, value: float) -> None:
+    """Zapisuje obserwację (np. czas w ms, liczba tokenów); trzymamy ostatnie _MAX_OBS."""
+    with _lock:
+        vals = _obs.setdefault(name, [])
+        vals.append(float(value))
+        if len(vals) > _MAX_OBS:
+            del vals[: len(vals) - _MAX_OBS]
+
+
+def _quantile(sorted_vals: list[float], q: float) -> float:
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        obs = {k: sorted(v) for k, v in _obs.items() if v}
+
+    observations = {}
+    for k, vals in obs.items():
+        observations[k] = {
+            "count": len(vals),
+            "avg": round(sum(vals) / len(vals), 3),
+            "p50": round(_quantile(vals, 0.50), 3),
+            "p95": round(_quantile(vals, 0.95), 3),
+        }
+    return {"counters": counters, "observations": observations}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _obs.clear()
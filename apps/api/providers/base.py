@@ -1,5 +1,13 @@
 from abc import ABC, abstractmethod
 
 class LLMProvider(ABC):
+    name: str = ""
+    model: str = ""
+    # domyślne opcje generowania; `options` w generate() je nadpisuje
+    options: dict = {}
+
+    def merged_options(self, options: dict | None = None) -> dict:
+        return {**self.options, **(options or {})}
+
     @abstractmethod
-    def generate(self, prompt: str, format=None) -> str: ...
+    def generate(self, prompt: str, format=None, options: dict | None = None) -> str: ...
@@ -0,0 +1,156 @@
+import threading, time
+import requests
+
+# Pula endpointów Ollamy (kilka maszyn GPU).
+# Routing: najmniej zajęty endpoint (inflight / weight), z limitem max_concurrency.
+# Błąd/timeout -> endpoint "down" na down_s sekund; potem przed pierwszym użyciem
+# robimy szybki probe (GET /api/tags) i dopiero wtedy wraca do puli.
+
+
+class OllamaEndpoint:
+    def __init__(self, url: str, weight: float = 1.0, max_concurrency: int = 4):
+        self.url = url.rstrip("/")
+        self.weight = max(0.01, float(weight))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.inflight = 0
+        self.down_until = 0.0
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_used = 0.0
+
+    def is_down(self, now: float) -> bool:
+        return self.down_until > now
+
+    def load(self) -> float:
+        return self.inflight / self.weight
+
+
+def parse_endpoints(spec: str | None) -> list[OllamaEndpoint]:
+    """"http://gpu1:11434|2|4,http://gpu2:11434" -> endpointy (url|waga|max_concurrency)."""
+    out: list[OllamaEndpoint] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        bits = [b.strip() for b in part.split("|")]
+        weight = float(bits[1]) if len(bits) > 1 and bits[1] else 1.0
+        max_conc = int(bits[2]) if len(bits) > 2 and bits[2] else 4
+        out.append(OllamaEndpoint(bits[0], weight=weight, max_concurrency=max_conc))
+    return out
+
+
+class OllamaPool:
+    def __init__(self, endpoints: list[OllamaEndpoint], down_s: float = 30.0, probe_timeout_s: float = 2.0):
+        if not endpoints:
+            raise ValueError("OllamaPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.down_s = float(down_s)
+        self.probe_timeout_s = float(probe_timeout_s)
+        self._cond = threading.Condition()
+
+    def probe(self, ep: OllamaEndpoint) -> bool:
+        try:
+            r = requests.get(f"{ep.url}/api/tags", timeout=self.probe_timeout_s)
+            return r.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def _revive(self, now: float) -> None:
+        """Endpointy, którym minął down_until: probe poza lockiem, wynik z powrotem pod lockiem."""
+        with self._cond:
+            due = [ep for ep in self.endpoints if ep.down_until and not ep.is_down(now)]
+            # zarezerwuj probe, żeby inne wątki nie probowały równolegle
+            for ep in due:
+                ep.down_until = now + self.probe_timeout_s + 1.0
+        for ep in due:
+            ok = self.probe(ep)
+            with self._cond:
+                if ok:
+                    ep.down_until = 0.0
+                    ep.failures = 0
+                    self._cond.notify_all()
+                else:
+                    ep.down_until = time.monotonic() + self.down_s
+
+    def acquire(self, exclude: set[str] | None = None, timeout_s: float = 60.0) -> OllamaEndpoint | None:
+        """Najmniej obciążony działający endpoint (poza `exclude`).
+
+        None -> brak endpointu do spróbowania. Gdy wszystkie działające są pełne,
+        czekamy aż któryś się zwolni (max timeout_s).
+        """
+        exclude = exclude or set()
+        self._revive(time.monotonic())
+        deadline = time.monotonic() + max(0.0, timeout_s)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                cand = [ep for ep in self.endpoints if ep.url not in exclude]
+                if not cand:
+                    return None
+                up = [ep for ep in cand if not ep.is_down(now)]
+                if not up:
+                    if any(not ep.is_down(now) for ep in self.endpoints):
+                        return None
+                    # wszystko leży -> ostatnia deska ratunku: ten, który najwcześniej wraca
+                    # (inaczej pojedynczy OLLAMA_BASE_URL byłby martwy przez down_s po jednym błędzie)
+                    up = [min(cand, key=lambda e: e.down_until)]
+                free = [ep for ep in up if ep.inflight < ep.max_concurrency]
+                if free:
+                    # remis (np. wszystkie wolne) -> najdawniej używany (round-robin)
+                    ep = min(free, key=lambda e: (e.load(), e.last_used))
+                    ep.last_used = now
+                    ep.inflight += 1
+                    ep.requests += 1
+                    return ep
+                left = deadline - now
+                if left <= 0:
+                    return None
+                self._cond.wait(timeout=min(left, 1.0))
+
+    def release(self, ep: OllamaEndpoint, ok: bool) -> None:
+        with self._cond:
+            ep.inflight = max(0, ep.inflight - 1)
+            if ok:
+                ep.failures = 0
+            else:
+                ep.failures += 1
+                ep.errors += 1
+                ep.down_until = time.monotonic() + self.down_s
+            self._cond.notify_all()
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "url": ep.url,
+                    "weight": ep.weight,
+                    "max_concurrency": ep.max_concurrency,
+                    "inflight": ep.inflight,
+                    "up": not ep.is_down(now),
+                    "requests": ep.requests,
+                    "errors": ep.errors,
+                }
+                for ep in self.endpoints
+            ]
+
+
+_pools: dict[str, OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(spec: str, down_s: float = 30.0) -> OllamaPool:
+    """Jedna pula na proces (per konfiguracja) — provider jest tworzony przy każdym wywołaniu."""
+    with _pools_lock:
+        pool = _pools.get(spec)
+        if pool is None:
+            pool = OllamaPool(parse_endpoints(spec), down_s=down_s)
+            _pools[spec] = pool
+        return pool
+
+
+def pool_stats() -> dict[str, list[dict]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {spec: p.stats() for spec, p in pools.items()}
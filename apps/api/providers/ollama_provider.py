@@ -1,40 +1,212 @@
+import json, time
 import requests
 from ..settings import settings
+from .. import metrics
+from ..rag.budget import remaining_seconds, BudgetExceeded
+from ..rag.util import JsonObjectScanner
+from ..rag.hedge import raise_if_cancelled, cancelled, cancellable
+from ..rag.packer import record_prompt_tokens, record_ttft
 from .base import LLMProvider
+from .ollama_pool import get_pool
+
+
+# po domknięciu obiektu JSON czytamy jeszcze najwyżej tyle chunków, czekając na statystyki
+# z chunka done (kalibracja tokenów, czas prefillu)
+_STREAM_TAIL_CHUNKS = 8
+
+
+class _EndpointError(RuntimeError):
+    """Błąd po stronie endpointu (sieć / timeout / 5xx) -> failover na następny."""
+
+
+def _record_prefill(data: dict) -> None:
+    """Czas prefillu z odpowiedzi Ollamy (prompt_eval_duration w ns) — porównanie z kosztem rerankingu."""
+    ns, n = data.get("prompt_eval_duration"), data.get("prompt_eval_count")
+    if not ns or not n:
+        return
+    metrics.observe("llm.prefill_ms", ns / 1e6)
+    metrics.observe("llm.prefill_ms_per_token", ns / 1e6 / n)
+
 
 class OllamaProvider(LLMProvider):
+    name = "ollama"
+
     def __init__(self, base_url: str):
+        # base_url: jeden URL albo lista endpointów "url|waga|max_concurrency,..." (patrz ollama_pool)
         self.base_url = base_url
+        self.pool = get_pool(base_url, down_s=settings.ollama_down_s)
         self.model = settings.ollama_model
+        self.options = {
+            "temperature": 0.2,
+            "max_tokens": 800
+        }
+
+    def generate(self, prompt: str, format=None, options: dict | None = None) -> str:
+        opts = self.merged_options(options)
+        # klucze wspólne (profiles.py) -> nazwy Ollamy; keep_alive jest poza "options"
+        keep_alive = opts.pop("keep_alive", None)
+        if "max_tokens" in opts:
+            opts["num_predict"] = opts.pop("max_tokens")
+        if not opts.get("stop"):
+            opts.pop("stop", None)
 
-    def generate(self, prompt: str, format=None) -> str:
         payload = {
             "model": self.model,
             "prompt": prompt,
             "stream": False,
             "format": "json",
             "think": False, 
-            "options": {
-                "temperature": 0.2,
-                "num_predict": 800
-            }
+            "options": opts
         }
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
         if format is not None:
             payload["format"] = format  
-            
-        r = requests.post(
-            f"{self.base_url}/api/generate",
-            json=payload,
-            timeout=(5, 120)
-        )
+        # wyjście to JSON -> streamuj i przerwij po domknięciu obiektu
+        stream = settings.llm_stream_json and payload["format"] is not None
+        payload["stream"] = stream
+
+        # failover: błąd sieci / timeout / 5xx -> endpoint down, próbujemy następny
+        tried: set[str] = set()
+        last_err = "no endpoint available"
+        while len(tried) < len(self.pool.endpoints):
+            # nie czekaj dłużej niż pozostały deadline requestu — liczony od nowa przed
+            # każdym endpointem, żeby failover nie wydłużał go wielokrotnie
+            read_timeout = 120.0
+            left = remaining_seconds()
+            if left is not None:
+                if left <= 0:
+                    raise BudgetExceeded("deadline_exceeded")
+                read_timeout = min(read_timeout, left)
+            ep = self.pool.acquire(exclude=tried, timeout_s=read_timeout)
+            if ep is None:
+                break
+            tried.add(ep.url)
+
+            try:
+                if stream:
+                    resp = self._generate_stream(ep.url, payload, read_timeout)
+                elif cancellable():
+                    resp = self._generate_collect(ep.url, payload, read_timeout)
+                else:
+                    resp = self._generate_once(ep.url, payload, read_timeout)
+            except _EndpointError as e:
+                self.pool.release(ep, ok=False)
+                last_err = str(e)
+                continue
+            except Exception:
+                self.pool.release(ep, ok=True)
+                raise
+            self.pool.release(ep, ok=True)
+            return resp
 
+        raise RuntimeError(f"Ollama unavailable ({last_err})")
+
+    def _post(self, url: str, payload: dict, read_timeout: float, stream: bool) -> requests.Response:
+        try:
+            r = requests.post(
+                f"{url}/api/generate",
+                json=payload,
+                timeout=(5, read_timeout),
+                stream=stream
+            )
+        except requests.RequestException as e:
+            raise _EndpointError(f"{url}: {e}") from e
+
+        if r.status_code >= 500:
+            raise _EndpointError(f"{url}: HTTP {r.status_code}: {r.text}")
         if r.status_code != 200:
             raise RuntimeError(f"Ollama HTTP {r.status_code}: {r.text}")
+        return r
+
+    def _record_prompt(self, payload: dict, data: dict) -> None:
+        record_prompt_tokens(self.model, payload["prompt"], data.get("prompt_eval_count"))
+        _record_prefill(data)
 
+    def _generate_once(self, url: str, payload: dict, read_timeout: float) -> str:
+        r = self._post(url, payload, read_timeout, stream=False)
         data = r.json()
+        self._record_prompt(payload, data)
 
         resp = (data.get("response") or "").strip()
         if not resp:
             raise RuntimeError(f"Ollama empty response. Full JSON: {data}")
 
         return resp
+
+    def _generate_collect(self, url: str, payload: dict, read_timeout: float) -> str:
+        """Pełna odpowiedź (bez przerywania po JSON-ie), ale czytana strumieniem: przegrany
+        kandydat hedgingu rozłącza się od razu zamiast trzymać endpoint i slot do końca."""
+        r = self._post(url, {**payload, "stream": True}, read_timeout, stream=True)
+        parts: list[str] = []
+        try:
+            for line in r.iter_lines():
+                raise_if_cancelled()
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                parts.append(data.get("response") or "")
+                if data.get("done"):
+                    self._record_prompt(payload, data)
+                    break
+        except requests.RequestException as e:
+            raise _EndpointError(f"{url}: {e}") from e
+        finally:
+            r.close()
+
+        resp = "".join(parts).strip()
+        if not resp:
+            raise RuntimeError("Ollama empty response (stream)")
+        return resp
+
+    def _generate_stream(self, url: str, payload: dict, read_timeout: float) -> str:
+        t0 = time.perf_counter()
+        r = self._post(url, payload, read_timeout, stream=True)
+        scanner = JsonObjectScanner()
+        blob = None
+        tail = 0
+        ttft_ms = None
+        recorded = False
+        try:
+            for line in r.iter_lines():
+                if blob is None:
+                    # przegrany kandydat hedgingu -> zamknij połączenie (Ollama przerywa generowanie)
+                    raise_if_cancelled()
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                if ttft_ms is None and data.get("response"):
+                    ttft_ms = (time.perf_counter() - t0) * 1000.0
+                if blob is None:
+                    blob = scanner.feed(data.get("response") or "")
+                elif not data.get("done"):
+                    # obiekt domknięty: statystyki (prompt_eval_*) są dopiero w chunku done,
+                    # zwykle zaraz po nim; model, który generuje dalej, przerywamy
+                    tail += 1
+                    if tail > _STREAM_TAIL_CHUNKS or cancelled():
+                        # zamknięcie połączenia przerywa generowanie po stronie Ollamy
+                        metrics.inc("llm.stream.early_stop")
+                        break
+                if data.get("done"):
+                    self._record_prompt(payload, data)
+                    recorded = True
+                    break
+        except requests.RequestException as e:
+            if blob is not None:
+                return blob
+            raise _EndpointError(f"{url}: {e}") from e
+        finally:
+            r.close()
+        if not recorded:
+            record_ttft(self.model, payload["prompt"], ttft_ms)
+
+        if blob is not None:
+            return blob
+        resp = scanner.text.strip()
+        if not resp:
+            raise RuntimeError("Ollama empty response (stream)")
+        return resp
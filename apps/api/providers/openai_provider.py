@@ -1,14 +1,120 @@
-import os, json
+import os, json, time
 from .base import LLMProvider
+from ..settings import settings
+from .. import metrics
+from ..rag.budget import remaining_seconds, BudgetExceeded
+from ..rag.util import JsonObjectScanner
+from ..rag.hedge import raise_if_cancelled, cancelled, cancellable
+from ..rag.packer import record_prompt_tokens, record_ttft
 from openai import OpenAI
 
+# po domknięciu obiektu JSON czytamy jeszcze najwyżej tyle chunków, czekając na usage
+_STREAM_TAIL_CHUNKS = 8
+
 class OpenAIProvider(LLMProvider):
+    name = "openai"
+
     def __init__(self, api_key:str):
         self.cli = OpenAI(api_key=api_key)
-    def generate(self, prompt: str, format=None) -> str:
+        self.model = settings.openai_model
+        self.options = {"temperature": 0.2}
+    def generate(self, prompt: str, format=None, options: dict | None = None) -> str:
+        opts = self.merged_options(options)
+        kwargs = {}
+        # num_ctx / keep_alive z profili nie dotyczą OpenAI
+        if opts.get("max_tokens"):
+            kwargs["max_tokens"] = int(opts["max_tokens"])
+        if opts.get("stop"):
+            kwargs["stop"] = opts["stop"]
+        if isinstance(format, dict):
+            # strict=False: schematy używają minItems/maxItems, których tryb strict nie wspiera
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": format.get("title", "output"), "schema": format, "strict": False},
+            }
+        elif format == "json":
+            kwargs["response_format"] = {"type": "json_object"}
+        left = remaining_seconds()
+        if left is not None:
+            # nie czekaj dłużej niż pozostały deadline requestu (bez minimalnego timeoutu,
+            # który wydłużałby prawie wyczerpany deadline)
+            if left <= 0:
+                raise BudgetExceeded("deadline_exceeded")
+            kwargs["timeout"] = left
+        if settings.llm_stream_json and format is not None:
+            return self._generate_stream(prompt, opts, kwargs)
+        if cancellable():
+            return self._generate_collect(prompt, opts, kwargs)
         rsp = self.cli.chat.completions.create(
-            model="gpt-4o-mini",
+            model=self.model,
             messages=[{"role":"user","content":prompt}],
-            temperature=0.2
+            temperature=opts.get("temperature", 0.2),
+            **kwargs
         )
+        usage = getattr(rsp, "usage", None)
+        record_prompt_tokens(self.model, prompt, getattr(usage, "prompt_tokens", None))
         return rsp.choices[0].message.content
+
+    def _generate_collect(self, prompt: str, opts: dict, kwargs: dict) -> str:
+        """Pełna odpowiedź czytana strumieniem: przegrany kandydat hedgingu przerywa od razu."""
+        stream = self.cli.chat.completions.create(
+            model=self.model,
+            messages=[{"role":"user","content":prompt}],
+            temperature=opts.get("temperature", 0.2),
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        parts: list[str] = []
+        try:
+            for chunk in stream:
+                raise_if_cancelled()
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    record_prompt_tokens(self.model, prompt, getattr(usage, "prompt_tokens", None))
+                if chunk.choices:
+                    parts.append(chunk.choices[0].delta.content or "")
+        finally:
+            stream.close()
+        return "".join(parts)
+
+    def _generate_stream(self, prompt: str, opts: dict, kwargs: dict) -> str:
+        """Streaming: przerywa po domknięciu pierwszego obiektu JSON."""
+        t0 = time.perf_counter()
+        stream = self.cli.chat.completions.create(
+            model=self.model,
+            messages=[{"role":"user","content":prompt}],
+            temperature=opts.get("temperature", 0.2),
+            stream=True,
+            # usage (prompt_tokens) przychodzi w ostatnim chunku, bez choices
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        scanner = JsonObjectScanner()
+        blob = None
+        tail = 0
+        ttft_ms = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    record_prompt_tokens(self.model, prompt, getattr(usage, "prompt_tokens", None))
+                    break
+                if blob is None:
+                    raise_if_cancelled()
+                    if chunk.choices:
+                        text = chunk.choices[0].delta.content or ""
+                        if ttft_ms is None and text:
+                            ttft_ms = (time.perf_counter() - t0) * 1000.0
+                        blob = scanner.feed(text)
+                    continue
+                # obiekt domknięty: czekamy chwilę na chunk z usage, model generujący dalej przerywamy
+                tail += 1
+                if tail > _STREAM_TAIL_CHUNKS or cancelled():
+                    metrics.inc("llm.stream.early_stop")
+                    break
+        finally:
+            stream.close()
+        # OpenAI nie podaje czasu prefillu -> ms/token z czasu do pierwszego tokenu
+        record_ttft(self.model, prompt, ttft_ms)
+        return blob if blob is not None else scanner.text
@@ -0,0 +1,47 @@
+import json
+from ..settings import settings
+
+# Profile wywołań LLM: różne typy wywołań potrzebują różnych limitów.
+# Klucze są wspólne dla providerów (provider tłumaczy je na swoje):
+#   temperature, max_tokens, num_ctx, keep_alive, stop
+# Nadpisania: LLM_PROFILES='{"ollama":{"semantic_check":{"max_tokens":24}}}'
+
+GENERATE_QUESTION = "generate_question"
+SEMANTIC_CHECK = "semantic_check"
+REPAIR = "repair"
+
+_DEFAULTS: dict[str, dict[str, dict]] = {
+    "ollama": {
+        GENERATE_QUESTION: {"temperature": 0.2, "max_tokens": 800, "num_ctx": 4096, "keep_alive": "30m"},
+        # checker zwraca {"answer":"TAK"} / {"correct":["b"]}; temperature=0 -> deterministyczny (cache)
+        SEMANTIC_CHECK: {"temperature": 0, "max_tokens": 48, "num_ctx": 4096, "keep_alive": "30m"},
+        REPAIR: {"temperature": 0.2, "max_tokens": 600, "num_ctx": 4096, "keep_alive": "30m"},
+    },
+    "openai": {
+        GENERATE_QUESTION: {"temperature": 0.2, "max_tokens": 800},
+        SEMANTIC_CHECK: {"temperature": 0, "max_tokens": 48},
+        REPAIR: {"temperature": 0.2, "max_tokens": 600},
+    },
+}
+
+
+def _overrides() -> dict:
+    raw = settings.llm_profiles
+    if not raw:
+        return {}
+    try:
+        obj = json.loads(raw)
+    except Exception:
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+def get_profile(provider: str, name: str | None) -> dict:
+    """Opcje profilu `name` dla providera (domyślne + nadpisania z LLM_PROFILES)."""
+    if not name:
+        return {}
+    base = dict(_DEFAULTS.get(provider, {}).get(name, {}))
+    over = _overrides().get(provider, {}).get(name, {})
+    if isinstance(over, dict):
+        base.update(over)
+    return base
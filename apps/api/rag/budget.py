@@ -0,0 +1,76 @@
+import contextvars, threading, time
+from contextlib import contextmanager
+
+# Budżet wywołań LLM dla jednego requestu (/gen/*): limit liczby wywołań + deadline.
+# Trzymany w contextvar, więc ask_llm egzekwuje go bez przekazywania parametrów
+# przez wszystkie warstwy generowania.
+
+
+class BudgetExceeded(RuntimeError):
+    """Budżet requestu wyczerpany; `reason` to kod zwracany klientowi."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class LLMBudget:
+    def __init__(self, max_calls: int | None = None, deadline_ms: int | None = None):
+        self.max_calls = max(0, int(max_calls)) if max_calls is not None else None
+        self.deadline = time.monotonic() + max(0, int(deadline_ms)) / 1000.0 if deadline_ms is not None else None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def remaining_s(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise BudgetExceeded("deadline_exceeded")
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            raise BudgetExceeded("llm_budget_exhausted")
+
+    def charge(self) -> None:
+        # lock: hedging (wiele wątków) dzieli ten sam budżet
+        with self._lock:
+            self.check()
+            self.calls += 1
+
+
+_current: contextvars.ContextVar[LLMBudget | None] = contextvars.ContextVar("llm_budget", default=None)
+
+
+@contextmanager
+def llm_budget(max_calls: int | None = None, deadline_ms: int | None = None):
+    prev = _current.get()
+    b = LLMBudget(max_calls=max_calls, deadline_ms=deadline_ms)
+    _current.set(b)
+    try:
+        yield b
+    finally:
+        # bez reset(token): generator może być zamykany z innego kontekstu (SSE)
+        _current.set(prev)
+
+
+def current_budget() -> LLMBudget | None:
+    return _current.get()
+
+
+def check_llm_budget() -> None:
+    """Jak charge_llm_call, ale bez zużycia wywołania (przed czekaniem na slot)."""
+    b = _current.get()
+    if b is not None:
+        b.check()
+
+
+def charge_llm_call() -> None:
+    b = _current.get()
+    if b is not None:
+        b.charge()
+
+
+def remaining_seconds() -> float | None:
+    b = _current.get()
+    return b.remaining_s() if b is not None else None
@@ -0,0 +1,215 @@
+import math, threading
+import numpy as np
+
+from ..settings import settings
+from .. import metrics
+from .store import _connect
+from .search import _pick_snippet, _attach_sentences
+
+# Klastry tematyczne chunków (k-means na embeddingach) do generowania bez tematu:
+# zamiast wyszukiwania frazy "przegląd materiału" bierzemy konteksty round-robin
+# z kolejnych klastrów — równomierny przegląd całego materiału, bez embeddingu zapytania.
+# Po ingest: nowe chunki przypisywane do najbliższego centroidu (aktualizacja średniej
+# jak w mini-batch k-means); pełne przeliczenie, gdy materiału przybyło na tyle,
+# że docelowe k wyraźnie rośnie.
+
+_lock = threading.Lock()
+# cache przypisań: db_path -> {cluster: [chunk_id, ...]}; kursory round-robin per klaster
+_members: dict[str, dict[int, list[int]]] = {}
+_cursor: dict[tuple[str, int], int] = {}
+
+
+def _target_k(n: int) -> int:
+    return max(1, min(settings.cluster_max_k, int(round(math.sqrt(n / 2.0))) or 1, n))
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norm > 0, norm, 1.0)
+
+
+def kmeans(mat: np.ndarray, k: int, iters: int = 25, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Sferyczny k-means (kosinus) z inicjalizacją k-means++. Zwraca (centroidy, przypisania)."""
+    rng = np.random.default_rng(seed)
+    n = mat.shape[0]
+    k = max(1, min(k, n))
+    centers = [mat[int(rng.integers(n))]]
+    d = 1.0 - mat @ centers[0]
+    for _ in range(1, k):
+        p = np.clip(d, 0.0, None)
+        p = p / p.sum() if p.sum() > 0 else None
+        centers.append(mat[int(rng.choice(n, p=p))])
+        d = np.minimum(d, 1.0 - mat @ centers[-1])
+    cent = np.vstack(centers).astype(np.float32)
+
+    assign = np.zeros(n, dtype=np.int64)
+    for it in range(iters):
+        new = np.argmax(mat @ cent.T, axis=1)
+        if it > 0 and np.array_equal(new, assign):
+            break
+        assign = new
+        for c in range(k):
+            m = assign == c
+            if m.any():
+                cent[c] = mat[m].sum(axis=0)
+        cent = _normalize(cent).astype(np.float32)
+    return cent, assign
+
+
+def _load_embeddings(cur, where: str = "") -> tuple[list[int], np.ndarray]:
+    cur.execute(f"SELECT c.id, c.embedding FROM chunks c {where}")
+    rows = cur.fetchall()
+    ids = [int(r[0]) for r in rows]
+    if not rows:
+        return ids, np.zeros((0, 0), dtype=np.float32)
+    return ids, np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+
+
+def update_clusters(db_path: str, full: bool = False) -> dict:
+    """Przypisuje nowe chunki do klastrów (albo przelicza całość). Wołane po ingest i na starcie."""
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(*) FROM chunks")
+        n_total = int(cur.fetchone()[0] or 0)
+        cur.execute("SELECT cluster, centroid, size FROM cluster_centroids ORDER BY cluster")
+        crow = cur.fetchall()
+        k_now = len(crow)
+
+        if n_total == 0:
+            cur.execute("DELETE FROM cluster_centroids")
+            con.commit()
+            reset_cluster_cache(db_path)
+            return {"mode": "empty", "clusters": 0}
+
+        if full or k_now == 0 or _target_k(n_total) >= max(2, int(k_now * 1.5)):
+            ids, mat = _load_embeddings(cur)
+            cent, assign = kmeans(mat, _target_k(n_total))
+            cur.execute("DELETE FROM chunk_clusters")
+            cur.execute("DELETE FROM cluster_centroids")
+            cur.executemany(
+                "INSERT INTO chunk_clusters(chunk_id, cluster) VALUES(?,?)",
+                [(cid, int(a)) for cid, a in zip(ids, assign)],
+            )
+            sizes = np.bincount(assign, minlength=cent.shape[0])
+            cur.executemany(
+                "INSERT INTO cluster_centroids(cluster, centroid, size) VALUES(?,?,?)",
+                [(c, cent[c].tobytes(), int(sizes[c])) for c in range(cent.shape[0])],
+            )
+            con.commit()
+            reset_cluster_cache(db_path)
+            metrics.inc("clusters.full_fit")
+            return {"mode": "full", "clusters": int(cent.shape[0]), "chunks": len(ids)}
+
+        # przyrostowo: tylko chunki bez przypisania
+        ids, mat = _load_embeddings(
+            cur, "WHERE NOT EXISTS (SELECT 1 FROM chunk_clusters cc WHERE cc.chunk_id = c.id)"
+        )
+        if not ids:
+            return {"mode": "noop", "clusters": k_now}
+        cent = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in crow])
+        sizes = np.asarray([int(r[2]) for r in crow], dtype=np.float64)
+        assign = np.argmax(mat @ cent.T, axis=1)
+        upd = []
+        for c in np.unique(assign):
+            m = assign == c
+            # średnia ważona licznością (centroid trzymamy znormalizowany)
+            cnt = float(m.sum())
+            cent[c] = _normalize(cent[c] * sizes[c] + mat[m].sum(axis=0))
+            sizes[c] += cnt
+            upd.append((cent[c].astype(np.float32).tobytes(), int(sizes[c]), int(crow[c][0])))
+        cur.executemany(
+            "INSERT OR REPLACE INTO chunk_clusters(chunk_id, cluster) VALUES(?,?)",
+            [(cid, int(crow[a][0])) for cid, a in zip(ids, assign)],
+        )
+        cur.executemany("UPDATE cluster_centroids SET centroid=?, size=? WHERE cluster=?", upd)
+        con.commit()
+        reset_cluster_cache(db_path)
+        metrics.inc("clusters.incremental")
+        return {"mode": "incremental", "clusters": k_now, "chunks": len(ids)}
+    finally:
+        con.close()
+
+
+def reset_cluster_cache(db_path: str) -> None:
+    with _lock:
+        _members.pop(db_path, None)
+        for key in [k for k in _cursor if k[0] == db_path]:
+            _cursor.pop(key, None)
+
+
+def _cluster_members(db_path: str) -> dict[int, list[int]]:
+    with _lock:
+        m = _members.get(db_path)
+    if m is not None:
+        return m
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT cluster, chunk_id FROM chunk_clusters ORDER BY cluster, chunk_id")
+        m = {}
+        for c, cid in cur.fetchall():
+            m.setdefault(int(c), []).append(int(cid))
+    finally:
+        con.close()
+    with _lock:
+        _members[db_path] = m
+    return m
+
+
+def cluster_contexts(db_path: str, k: int) -> list[dict]:
+    """~k chunków po równo z każdego klastra (kolejne wywołania biorą kolejne chunki klastra).
+
+    Wynik w formacie rag_search; "group" = numer klastra (0..g-1), żeby /gen rotował klastry.
+    Pusta lista, gdy klastrów jeszcze nie ma (wtedy wołający wraca do wyszukiwania).
+    """
+    members = _cluster_members(db_path)
+    clusters = [c for c in sorted(members) if members[c]]
+    if not clusters:
+        return []
+    per = max(2, int(math.ceil(k / len(clusters))))
+
+    picked: list[tuple[int, int]] = []  # (group, chunk_id)
+    with _lock:
+        for g, c in enumerate(clusters):
+            ids = members[c]
+            start = _cursor.get((db_path, c), 0)
+            take = min(per, len(ids))
+            for j in range(take):
+                picked.append((g, ids[(start + j) % len(ids)]))
+            _cursor[(db_path, c)] = (start + take) % len(ids)
+
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        ids = [cid for _, cid in picked]
+        placeholders = ",".join(["?"] * len(ids))
+        cur.execute(
+            f"""SELECT c.id, c.source_id, s.filename, c.page, c.text, c.quote
+                FROM chunks c JOIN sources s ON s.id = c.source_id
+                WHERE c.id IN ({placeholders})""",
+            ids,
+        )
+        rows = {int(r[0]): r for r in cur.fetchall()}
+
+        out = []
+        for g, cid in picked:
+            r = rows.get(cid)
+            if r is None:
+                continue
+            out.append({
+                "chunk_id": cid,
+                "source_id": int(r[1]),
+                "source": r[2],
+                "page": int(r[3]),
+                "quote": _pick_snippet(r[5], r[4]),
+                "text": r[4],
+                "score": 1.0,
+                "group": g,
+            })
+        if settings.ctx_sentences > 0:
+            # bez zapytania nie ma rankingu zdań -> pierwsze zdania chunka, jak w rag_search
+            _attach_sentences(con, out, None, per_chunk=settings.ctx_sentences)
+    finally:
+        con.close()
+    return out
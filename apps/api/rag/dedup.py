@@ -0,0 +1,92 @@
+import hashlib, re
+import numpy as np
+
+from ..settings import settings
+
+# MinHash + LSH dla chunków: prawie identyczne fragmenty (powtórzone slajdy tytułowe,
+# agendy, te same definicje w kilku plikach/latach) trzymamy raz, a kolejne wystąpienia
+# zapisujemy jako dodatkowe (source, page) w chunk_provenance — cytowania dalej działają,
+# a macierz embeddingów i koszt wyszukiwania nie rosną.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+
+_PRIME = np.uint64(4294967311)  # > 2^32
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+_NONWORD_RX = re.compile(r"[^0-9a-ząćęłńóśźż]+")
+
+
+def _shingles(text: str) -> set[str]:
+    words = _NONWORD_RX.sub(" ", (text or "").lower()).split()
+    if len(words) < SHINGLE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def minhash(text: str) -> np.ndarray | None:
+    """Sygnatura MinHash (NUM_PERM x uint64) albo None dla pustego tekstu."""
+    sh = _shingles(text)
+    if not sh:
+        return None
+    hv = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in sh),
+        dtype=np.uint64,
+        count=len(sh),
+    )
+    # (a*x + b) mod p dla wszystkich permutacji naraz; a, b < 2^31, x < 2^32 -> bez przepełnienia
+    vals = (np.outer(hv, _A) + _B) % _PRIME
+    return vals.min(axis=0)
+
+
+def band_keys(sig: np.ndarray) -> list[int]:
+    """Klucz kubełka LSH dla każdego pasma (int64 z hasha pasma)."""
+    out = []
+    for b in range(BANDS):
+        d = hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).digest()
+        out.append(int.from_bytes(d, "little", signed=True))
+    return out
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Szacowany współczynnik Jaccarda z sygnatur."""
+    return float(np.mean(a == b))
+
+
+def find_duplicate(cur, sig: np.ndarray, keys: list[int]) -> int | None:
+    """Id kanonicznego chunka o podobieństwie >= DEDUP_JACCARD (kandydaci z kubełków LSH)."""
+    placeholders = " OR ".join(["(band=? AND bucket=?)"] * BANDS)
+    params = [x for b, k in enumerate(keys) for x in (b, k)]
+    cur.execute(f"SELECT DISTINCT chunk_id FROM chunk_lsh WHERE {placeholders}", params)
+    cand = [int(r[0]) for r in cur.fetchall()]
+    if not cand:
+        return None
+    ph = ",".join(["?"] * len(cand))
+    cur.execute(f"SELECT chunk_id, signature FROM chunk_minhash WHERE chunk_id IN ({ph})", cand)
+    best, best_sim = None, 0.0
+    for cid, blob in cur.fetchall():
+        s = similarity(sig, np.frombuffer(blob, dtype=np.uint64))
+        if s > best_sim:
+            best, best_sim = int(cid), s
+    return best if best_sim >= settings.dedup_jaccard else None
+
+
+def index_chunk(cur, chunk_id: int, sig: np.ndarray, keys: list[int]) -> None:
+    cur.execute("INSERT OR REPLACE INTO chunk_minhash(chunk_id, signature) VALUES(?,?)", (chunk_id, sig.tobytes()))
+    cur.executemany(
+        "INSERT OR IGNORE INTO chunk_lsh(band, bucket, chunk_id) VALUES(?,?,?)",
+        [(b, k, chunk_id) for b, k in enumerate(keys)],
+    )
+
+
+def add_provenance(cur, chunk_id: int, source_id: int, page: int) -> None:
+    cur.execute(
+        """INSERT OR IGNORE INTO chunk_provenance(chunk_id, source_id, page)
+           SELECT ?, ?, ? WHERE NOT EXISTS (
+             SELECT 1 FROM chunks WHERE id=? AND source_id=? AND page=?)""",
+        (chunk_id, source_id, page, chunk_id, source_id, page),
+    )
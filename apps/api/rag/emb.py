@@ -1,10 +1,11 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 _model_cache = {}
 
 def get_model(name:str):
     if name not in _model_cache:
+        # leniwie (jak CrossEncoder): import modułów API nie ciągnie torcha
+        from sentence_transformers import SentenceTransformer
         _model_cache[name] = SentenceTransformer(name)
     return _model_cache[name]
 
@@ -17,3 +18,12 @@ def embed_query(text:str, model_name:str)->np.ndarray:
     m = get_model(model_name)
     v = m.encode([text], normalize_embeddings=True)[0]
     return np.asarray(v, dtype=np.float32)
+
+_ce_cache = {}
+
+def get_cross_encoder(name:str):
+    """CrossEncoder (NLI / reranker) na CPU, cache per nazwa modelu."""
+    if name not in _ce_cache:
+        from sentence_transformers import CrossEncoder
+        _ce_cache[name] = CrossEncoder(name, device="cpu")
+    return _ce_cache[name]
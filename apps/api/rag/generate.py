@@ -1,11 +1,33 @@
 import datetime
 import random
+import time
 import re
 import json
 import ast
 from typing import Any
 
-from .llm import ask_llm
+from .llm import ask_llm, context_room
+from .util import JsonObjectScanner
+from .hedge import hedged
+from .stem_index import is_near_duplicate
+from .store import DEFAULT_TOPIC
+from .verifier import verify_yn, verify_mcq, record_shadow, mode as verifier_mode
+from .schemas import (
+    YN_SCHEMA,
+    MCQ_SCHEMA,
+    YN_CHECK_SCHEMA,
+    MCQ_CHECK_SCHEMA,
+    YN_VERDICT,
+    MCQ_VERDICT,
+    batch_schema,
+    check_map_schema,
+    output_format,
+)
+from ..providers.profiles import GENERATE_QUESTION, SEMANTIC_CHECK, REPAIR
+from .. import metrics
+
+# parafraza istniejącego pytania (stem_index) — odrzucamy przed semantic checkiem
+NEAR_DUPLICATE = "near_duplicate: pytanie zbyt podobne do już istniejącego, wybierz inny fakt"
 
 # -----------------------------
 # Utilities: citations / context
@@ -55,6 +77,10 @@ def _pick_snippet(quote: str, text: str, max_len: int = 180) -> str:
     return s
 
 
+# bezpiecznik na długość kontekstu; właściwy budżet ustala packer (CTX_TOKEN_BUDGET)
+_CTX_MAX_CHARS = 8000
+
+
 def _flatten_ctx(ctx: Any) -> tuple[str, list[dict]]:
     """
     Wejście: lista dictów (rag_search),
@@ -68,6 +94,7 @@ def _flatten_ctx(ctx: Any) -> tuple[str, list[dict]]:
     seen = set()
     citations: list[dict] = []
     lines: list[str] = []
+    size = 0
 
     for c in ctx:
         if not isinstance(c, dict):
@@ -85,21 +112,25 @@ def _flatten_ctx(ctx: Any) -> tuple[str, list[dict]]:
 
         quote = (c.get("quote") or "").strip()
         text = (c.get("text") or "").strip()
-        snippet = _pick_snippet(quote, text)
+        # zdania wybrane z indeksu sentences są już gotowym, krótkim cytatem
+        snippet = quote if c.get("sentences") else _pick_snippet(quote, text)
 
         if snippet:
-            lines.append(f"[{source}|p.{page}] {snippet}")
+            line = f"[{source}|p.{page}] {snippet}"
+            # twardy limit, żeby nie przeładować LLM — tylko całe linie (bez ucinania tagu)
+            if lines and size + len(line) + 1 > _CTX_MAX_CHARS:
+                break
+            lines.append(line)
+            size += len(line) + 1
 
         citations.append({"source": str(source), "page": int(page), "quote": snippet})
 
-    ctx_txt = "\n".join(lines)
-    # twardy limit, żeby nie przeładować LLM
-    return ctx_txt[:8000], citations
+    return "\n".join(lines), citations
 
 
 def _meta(topic: str | None, diff: str | None) -> dict:
     return {
-        "topic": topic or "general",
+        "topic": topic or DEFAULT_TOPIC,
         "difficulty": diff or "medium",
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
     }
@@ -215,35 +246,55 @@ def _extract_json(s: str | None):
         if isinstance(obj, dict):
             return obj
 
-    # find first JSON object
-    start = s.find("{")
-    if start == -1:
+    # find first JSON object (ten sam automat, którego używa streaming w providerach)
+    blob = JsonObjectScanner().feed(s)
+    if blob is None:
         return None
+    obj = _try_parse_obj(blob)
+    if isinstance(obj, list):
+        # automat zwraca całą tablicę na najwyższym poziomie -> pierwszy obiekt w niej
+        obj = next((x for x in obj if isinstance(x, dict)), None)
+    return obj if isinstance(obj, dict) else None
 
-    depth = 0
-    in_str = False
-    esc = False
-    for i in range(start, len(s)):
-        ch = s[i]
-        if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == '"':
-                in_str = False
-        else:
-            if ch == '"':
-                in_str = True
-            elif ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-                if depth == 0:
-                    blob = s[start : i + 1]
-                    obj = _try_parse_obj(blob)
-                    return obj if isinstance(obj, dict) else None
-    return None
+
+def _track_parse(kind: str, ok: bool) -> None:
+    """Licznik parsowania wyjść LLM (llm.parse.<kind>.ok/fail) — do oceny structured output."""
+    metrics.inc(f"llm.parse.{kind}.{'ok' if ok else 'fail'}")
+
+
+def _extract_items(s: str | None) -> list[dict]:
+    """Lista kandydatów z odpowiedzi batchowej: {"items":[...]} albo goła tablica JSON."""
+    txt = (s or "").strip()
+    m = re.match(r"```(?:json)?\s*(.*?)\s*```$", txt, flags=re.DOTALL | re.IGNORECASE)
+    if m:
+        txt = m.group(1).strip()
+
+    # goła tablica (też po wstępie tekstem): najpierw cała — _extract_json wziąłby
+    # tylko jej pierwszy obiekt
+    start, brace = txt.find("["), txt.find("{")
+    if start != -1 and (brace == -1 or start < brace):
+        end = txt.rfind("]")
+        if end > start:
+            arr = _try_parse_obj(txt[start : end + 1])
+            if isinstance(arr, list):
+                return [x for x in arr if isinstance(x, dict)]
+
+    obj = _extract_json(s)
+    if isinstance(obj, dict):
+        items = obj.get("items")
+        if isinstance(items, list):
+            return [x for x in items if isinstance(x, dict)]
+        # model zwrócił pojedynczy obiekt zamiast listy
+        if "stem" in obj:
+            return [obj]
+
+    start = txt.find("[")
+    end = txt.rfind("]")
+    if start != -1 and end > start:
+        arr = _try_parse_obj(txt[start : end + 1])
+        if isinstance(arr, list):
+            return [x for x in arr if isinstance(x, dict)]
+    return []
 
 
 # -----------------------------
@@ -273,6 +324,24 @@ def _validate_yn_obj(obj: dict) -> tuple[bool, str]:
     return True, "ok"
 
 def _semantic_check_yn(body: str, stem: str, provider: str | None) -> tuple[bool, str | None]:
+    """Checker YN: lokalny weryfikator NLI, gdy jest pewny (NLI_VERIFIER=on), inaczej LLM."""
+    local = verify_yn(body, stem)
+    if local is not None and verifier_mode() == "on":
+        return True, local
+    t0 = time.perf_counter()
+    res = _llm_check_yn(body, stem, provider)
+    _observe_llm_check(t0, 1, provider)
+    record_shadow(local, res[1])
+    return res
+
+
+def _observe_llm_check(t0: float, n: int, provider: str | None) -> None:
+    # czas checkera LLM na pytanie — do porównania z nli.ms (ile oszczędza weryfikator)
+    if provider not in (None, "none") and n:
+        metrics.observe("check.llm_ms", (time.perf_counter() - t0) * 1000.0 / n)
+
+
+def _llm_check_yn(body: str, stem: str, provider: str | None) -> tuple[bool, str | None]:
     """
     Z fragmentów oceń, czy zdanie (stem) jest prawdziwe.
     WAŻNE: jeśli checker nie da się sparsować -> nie blokujemy generowania (skip),
@@ -303,11 +372,12 @@ Fragmenty:
 {body}
 """.strip()
 
-        resp = ask_llm(prompt, provider=provider)
+        resp = ask_llm(prompt, format=output_format(YN_CHECK_SCHEMA), provider=provider, profile=SEMANTIC_CHECK)
         if not resp:
             return None
 
         obj = _extract_json(resp)
+        _track_parse("yn_check", isinstance(obj, dict) and obj.get("answer") in {"TAK", "NIE"})
         if isinstance(obj, dict) and obj.get("answer") in {"TAK", "NIE"}:
             return obj["answer"]
 
@@ -328,10 +398,76 @@ Fragmenty:
 
 
 
-def gen_yes_no(ctx, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1):
-    body, cites = _flatten_ctx(ctx)
+def _prepare_yn(qobj, cites: list[dict]) -> tuple[bool, str]:
+    """Normalizacja explanation + walidacja składni kandydata YN."""
+    if isinstance(qobj, dict) and isinstance(qobj.get("explanation"), str):
+        qobj["explanation"] = _ensure_expl_has_rationale(qobj["explanation"], cites)
+        qobj["explanation"] = _force_single_expl_tag(qobj["explanation"], cites)
+    if not isinstance(qobj, dict):
+        return False, "no json"
+    return _validate_yn_obj(qobj)
+
+
+def _align_yn_answer(qobj: dict, sem_ans: str | None) -> str:
+    """Dopasowuje answer do werdyktu checkera (zamiast wywalać pytanie)."""
+    if sem_ans not in {"TAK", "NIE"} or sem_ans == qobj.get("answer"):
+        return "ok"
+
+    qobj["answer"] = sem_ans
+
+    m = re.search(r"(\[[^\|\]]+\|p\.\d+\])", qobj.get("explanation", "") or "")
+    tag = m.group(1) if m else ""
+
+    if sem_ans == "TAK":
+        expl_rest = _strip_tags(qobj.get("explanation", ""))
+        if len(expl_rest) < 12:
+            expl_rest = "Zdanie wynika wprost z przytoczonego fragmentu."
+        qobj["explanation"] = f"{tag} {expl_rest}".strip()
+    else:
+        qobj["explanation"] = (
+            f"{tag} W przytoczonym fragmencie nie ma jednoznacznego potwierdzenia tego zdania, "
+            "więc nie wynika ono wprost z materiału."
+        ).strip()
+
+    return "ok_after_semantic_alignment"
+
 
-    base_prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj JEDNO pytanie TAK/NIE (wariant {variant}).
+def _finalize_yn(qobj: dict, cites: list[dict], topic, difficulty) -> tuple[dict | None, str]:
+    qobj["kind"] = "YN"
+    qobj["metadata"] = _meta(topic, difficulty)
+
+    # citations tylko dla taga w explanation
+    qobj["citations"] = _filter_citations_by_expl(qobj.get("explanation", ""), cites)
+
+    # jeśli explanation to prawie sam tag -> dopisz snippet
+    qobj["explanation"] = _ensure_expl_has_rationale(qobj.get("explanation", ""), qobj["citations"])
+
+    # po dopisaniu jeszcze raz sprawdź minimalną jakość (żeby nie wrócił sam tag)
+    ok2, r2 = _validate_yn_obj(qobj)
+    if ok2:
+        return qobj, "ok"
+    return None, f"postprocess_validate_failed: {r2}"
+
+
+def _finish_yn(qobj, body: str, cites: list[dict], topic, difficulty, provider) -> tuple[dict | None, str]:
+    """Kandydat z LLM -> gotowe pytanie YN albo (None, powód odrzucenia)."""
+    ok, reason = _prepare_yn(qobj, cites)
+    if not ok:
+        return None, reason
+    if is_near_duplicate("YN", topic, qobj.get("stem", "")):
+        return None, NEAR_DUPLICATE
+
+    # semantic check: czy odpowiedź TAK/NIE wynika z fragmentów?
+    sem_ok, sem_ans = _semantic_check_yn(body, qobj.get("stem", ""), provider=provider)
+    if not sem_ok:
+        return None, "semantic_check_parse_failed"
+    _align_yn_answer(qobj, sem_ans)
+
+    return _finalize_yn(qobj, cites, topic, difficulty)
+
+
+def _yn_prompt(body: str, variant: int) -> str:
+    return f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj JEDNO pytanie TAK/NIE (wariant {variant}).
 Zwróć TYLKO JSON: {{"stem":str,"answer":"TAK"|"NIE","explanation":str}}.
 
 Wymagania twarde:
@@ -346,69 +482,41 @@ Fragmenty:
 {body}
 """.strip()
 
+
+def _yn_attempt(prompt: str, body: str, cites: list[dict], topic, difficulty, provider, variant: int, profile: str) -> tuple[dict | None, str]:
+    llm = ask_llm(prompt, format=output_format(YN_SCHEMA), provider=provider, variant=variant, profile=profile)
+    qobj = _extract_json(llm) if llm else None
+    if llm:
+        _track_parse("yn", isinstance(qobj, dict))
+    return _finish_yn(qobj, body, cites, topic, difficulty, provider)
+
+
+def gen_yes_no(ctx, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1, hedge: int = 1):
+    """hedge > 1: pierwsza próba to `hedge` równoległych kandydatów (różne warianty),
+    wygrywa pierwszy poprawny; dalej zwykła pętla naprawcza."""
+    body, cites = _flatten_ctx(ctx)
+
+    base_prompt = _yn_prompt(body, variant)
     prompt = base_prompt
+    profile = GENERATE_QUESTION
     last_reason = "init"
 
     for attempt in range(3):
-        llm = ask_llm(prompt, provider=provider)
-        qobj = _extract_json(llm) if llm else None
-        if isinstance(qobj, dict) and isinstance(qobj.get("explanation"), str):
-            qobj["explanation"] = _ensure_expl_has_rationale(qobj["explanation"], cites)
-            qobj["explanation"] = _force_single_expl_tag(qobj["explanation"], cites)
-
-        ok = False
-        reason = "no json"
-        if isinstance(qobj, dict):
-            ok, reason = _validate_yn_obj(qobj)
-
-        if ok:
-            # semantic check: czy odpowiedź TAK/NIE wynika z fragmentów?
-            sem_ok, sem_ans = _semantic_check_yn(body, qobj.get("stem", ""), provider=provider)
-            if not sem_ok:
-                ok = False
-                reason = "semantic_check_parse_failed"
-            elif sem_ans in {"TAK", "NIE"} and sem_ans != qobj.get("answer"):
-                # zamiast wywalać pytanie: dopasuj answer do checkera i ustaw spójne uzasadnienie
-                qobj["answer"] = sem_ans
-
-                m = re.search(r"(\[[^\|\]]+\|p\.\d+\])", qobj.get("explanation", "") or "")
-                tag = m.group(1) if m else ""
-
-                if sem_ans == "TAK":
-                    expl_rest = _strip_tags(qobj.get("explanation", ""))
-                    if len(expl_rest) < 12:
-                        expl_rest = "Zdanie wynika wprost z przytoczonego fragmentu."
-                    qobj["explanation"] = f"{tag} {expl_rest}".strip()
-                else:
-                    qobj["explanation"] = (
-                        f"{tag} W przytoczonym fragmencie nie ma jednoznacznego potwierdzenia tego zdania, "
-                        "więc nie wynika ono wprost z materiału."
-                    ).strip()
-
-                ok = True
-                reason = "ok_after_semantic_alignment"
-
-
-        if ok:
-            qobj["kind"] = "YN"
-            qobj["metadata"] = _meta(topic, difficulty)
-
-            # citations tylko dla taga w explanation
-            qobj["citations"] = _filter_citations_by_expl(qobj.get("explanation", ""), cites)
-
-            # jeśli explanation to prawie sam tag -> dopisz snippet
-            qobj["explanation"] = _ensure_expl_has_rationale(qobj.get("explanation", ""), qobj["citations"])
-
-            # po dopisaniu jeszcze raz sprawdź minimalną jakość (żeby nie wrócił sam tag)
-            ok2, r2 = _validate_yn_obj(qobj)
-            if ok2:
-                return qobj
-
-            ok = False
-            reason = f"postprocess_validate_failed: {r2}"
+        if attempt == 0 and hedge > 1 and provider != "none":
+            q, reason = hedged(
+                lambda v: _yn_attempt(_yn_prompt(body, v), body, cites, topic, difficulty, provider, v, GENERATE_QUESTION),
+                variant,
+                hedge,
+            )
+        else:
+            q, reason = _yn_attempt(prompt, body, cites, topic, difficulty, provider, variant, profile)
+        if q is not None:
+            return q
 
         last_reason = reason
 
+        profile = REPAIR
+        metrics.inc("llm.repair.yn")
         prompt = (
             "NAPRAW OUTPUT. Zwróć WYŁĄCZNIE poprawny JSON. "
             f"Problem: {reason}. "
@@ -568,6 +676,19 @@ def _extract_letter_list_from_text(resp: str) -> list[str]:
     return out
 
 def _semantic_check_mcq(body: str, q: dict, provider: str | None) -> tuple[bool, str]:
+    """Checker MCQ: lokalny weryfikator NLI, gdy jest pewny (NLI_VERIFIER=on), inaczej LLM."""
+    letters = verify_mcq(body, q)
+    local = _mcq_verdict(letters, q.get("answer")) if letters is not None else None
+    if local is not None and verifier_mode() == "on":
+        return local
+    t0 = time.perf_counter()
+    res = _llm_check_mcq(body, q, provider)
+    _observe_llm_check(t0, 1, provider)
+    record_shadow(local[0] if local else None, res[0])
+    return res
+
+
+def _llm_check_mcq(body: str, q: dict, provider: str | None) -> tuple[bool, str]:
     """
     ok=True tylko gdy wg fragmentów dokładnie 1 opcja jest prawdziwa i zgadza się z q["answer"].
     Jeśli checker nie zwróci się w formacie JSON, próbujemy parsować litery z tekstu.
@@ -601,21 +722,22 @@ Fragmenty:
 """.strip()
 
 
-        resp = ask_llm(check_prompt, format="json", provider=provider)
+        resp = ask_llm(
+            check_prompt,
+            format=output_format(MCQ_CHECK_SCHEMA, default="json"),
+            provider=provider,
+            profile=SEMANTIC_CHECK,
+        )
         if not resp:
             return None
 
         obj = _extract_json(resp)
+        _track_parse("mcq_check", isinstance(obj, dict) and isinstance(obj.get("correct"), list))
         if isinstance(obj, dict):
             # 1) preferowane: {"correct":[...]}
             corr = obj.get("correct")
             if isinstance(corr, list):
-                letters = []
-                for x in corr:
-                    a = _norm_answer_letter(str(x))
-                    if a in {"a", "b", "c", "d"} and a not in letters:
-                        letters.append(a)
-                return letters
+                return _norm_letters(corr)
 
             # 2) czasem model zwraca {"answer":"b"} lub {"correct":"b"}
             for key in ("answer", "correct"):
@@ -643,6 +765,10 @@ Fragmenty:
         if letters is None:
             return True, "skipped_no_llm"
 
+    return _mcq_verdict(letters, q.get("answer"))
+
+
+def _mcq_verdict(letters: list[str], answer: str | None) -> tuple[bool, str]:
     # nadal nie umiemy sparsować → SKIP (zamiast FAIL, bo teraz wpadasz w fallback MCQ)
     if letters == []:
         return True, "semantic_check_parse_failed"
@@ -650,17 +776,214 @@ Fragmenty:
     if len(letters) != 1:
         return False, f"semantic_check_expected_1_correct_got={letters}"
 
-    if letters[0] != q.get("answer"):
-        return False, f"semantic_check_answer_mismatch expected={q.get('answer')} got={letters[0]}"
+    if letters[0] != answer:
+        return False, f"semantic_check_answer_mismatch expected={answer} got={letters[0]}"
 
     return True, "ok"
 
 
+def _norm_letters(val) -> list[str]:
+    """["b"] / "b" / ["a)", "C"] -> unikalne litery a-d."""
+    if isinstance(val, str):
+        val = [val]
+    if not isinstance(val, list):
+        return []
+    letters: list[str] = []
+    for x in val:
+        a = _norm_answer_letter(str(x))
+        if a in {"a", "b", "c", "d"} and a not in letters:
+            letters.append(a)
+    return letters
 
-def gen_mcq(ctx, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1):
-    body, cites = _flatten_ctx(ctx)
 
-    base_prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj JEDNO pytanie wielokrotnego wyboru (wariant {variant}).
+# -----------------------------
+# Batched semantic check (kilka kandydatów nad tym samym kontekstem, jedno wywołanie)
+# -----------------------------
+
+def _semantic_check_yn_batch(body: str, stems: list[str], provider: str | None) -> list[str | None]:
+    """Werdykty TAK/NIE dla wielu stemów: pewne z weryfikatora NLI, reszta jednym wywołaniem LLM."""
+    local = [verify_yn(body, st) for st in stems]
+    if verifier_mode() == "on":
+        todo = [i for i, v in enumerate(local) if v is None]
+        out = list(local)
+        t0 = time.perf_counter()
+        for i, v in zip(todo, _llm_check_yn_batch(body, [stems[i] for i in todo], provider)):
+            out[i] = v
+        _observe_llm_check(t0, len(todo), provider)
+        return out
+    t0 = time.perf_counter()
+    out = _llm_check_yn_batch(body, stems, provider)
+    _observe_llm_check(t0, len(stems), provider)
+    for a, b in zip(local, out):
+        record_shadow(a, b)
+    return out
+
+
+def _llm_check_yn_batch(body: str, stems: list[str], provider: str | None) -> list[str | None]:
+    """Werdykty TAK/NIE dla wielu stemów w jednym wywołaniu LLM.
+
+    Odpowiedź: mapa {"1":"TAK","2":"NIE",...}. Pozycje, których nie da się
+    odczytać, sprawdzamy pojedynczo (_llm_check_yn), więc jakość się nie zmienia.
+    """
+    if not stems:
+        return []
+    if provider in (None, "none"):
+        return [None] * len(stems)
+    if len(stems) == 1:
+        return [_llm_check_yn(body, stems[0], provider=provider)[1]]
+
+    numbered = "\n".join(f"{i}. {st}" for i, st in enumerate(stems, start=1))
+    prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej.
+Dla KAŻDEGO ponumerowanego pytania TAK/NIE oceń, jaka odpowiedź jest poprawna.
+Jeśli nie wynika jednoznacznie z fragmentów, odpowiedz "NIE".
+
+Zwróć TYLKO JSON — mapę numer -> odpowiedź, np. {{"1":"TAK","2":"NIE"}}.
+
+Pytania TAK/NIE:
+{numbered}
+
+Fragmenty:
+{body}
+""".strip()
+
+    resp = ask_llm(
+        prompt,
+        format=output_format(check_map_schema(YN_VERDICT, len(stems), "yn_check_batch"), default="json"),
+        provider=provider,
+        profile=SEMANTIC_CHECK,
+        # mapa werdyktów rośnie z liczbą pytań
+        options={"max_tokens": 16 + 16 * len(stems)},
+    )
+    obj = _extract_json(resp) if resp else None
+    if resp:
+        _track_parse("yn_check_batch", isinstance(obj, dict))
+
+    out: list[str | None] = []
+    for i, st in enumerate(stems, start=1):
+        ans = obj.get(str(i)) if isinstance(obj, dict) else None
+        if isinstance(ans, str) and ans.strip().upper() in {"TAK", "NIE"}:
+            out.append(ans.strip().upper())
+        else:
+            out.append(_llm_check_yn(body, st, provider=provider)[1])
+    return out
+
+
+def _semantic_check_mcq_batch(body: str, qs: list[dict], provider: str | None) -> list[tuple[bool, str]]:
+    """Werdykty MCQ dla wielu pytań: pewne z weryfikatora NLI, reszta jednym wywołaniem LLM."""
+    local = []
+    for q in qs:
+        letters = verify_mcq(body, q)
+        local.append(_mcq_verdict(letters, q.get("answer")) if letters is not None else None)
+    if verifier_mode() == "on":
+        todo = [i for i, v in enumerate(local) if v is None]
+        out = list(local)
+        t0 = time.perf_counter()
+        for i, v in zip(todo, _llm_check_mcq_batch(body, [qs[i] for i in todo], provider)):
+            out[i] = v
+        _observe_llm_check(t0, len(todo), provider)
+        return out
+    t0 = time.perf_counter()
+    out = _llm_check_mcq_batch(body, qs, provider)
+    _observe_llm_check(t0, len(qs), provider)
+    for a, b in zip(local, out):
+        record_shadow(a[0] if a else None, b[0])
+    return out
+
+
+def _llm_check_mcq_batch(body: str, qs: list[dict], provider: str | None) -> list[tuple[bool, str]]:
+    """Jak _llm_check_mcq, ale dla wielu pytań w jednym wywołaniu.
+
+    Odpowiedź: mapa {"1":["b"],"2":[],...}; brakujące pozycje -> pojedynczy checker.
+    """
+    if not qs:
+        return []
+    if len(qs) == 1:
+        return [_llm_check_mcq(body, qs[0], provider=provider)]
+
+    payload = {
+        str(i): {"stem": q.get("stem", ""), "options": q.get("options", [])}
+        for i, q in enumerate(qs, start=1)
+    }
+    prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej.
+Dla KAŻDEGO ponumerowanego pytania wskaż, które opcje (a,b,c,d w kolejności options) są POPRAWNĄ odpowiedzią.
+- Jeśli pasuje więcej niż jedna opcja -> zwróć wszystkie pasujące.
+- Jeśli nie da się rozstrzygnąć jednoznacznie -> zwróć wszystkie, które mogą pasować.
+- Jeśli żadna nie wynika z fragmentów -> zwróć [].
+
+Zwróć TYLKO JSON — mapę numer -> lista liter, np. {{"1":["b"],"2":["a","d"]}}.
+
+Pytania:
+{json.dumps(payload, ensure_ascii=False)}
+
+Fragmenty:
+{body}
+""".strip()
+
+    resp = ask_llm(
+        prompt,
+        format=output_format(check_map_schema(MCQ_VERDICT, len(qs), "mcq_check_batch"), default="json"),
+        provider=provider,
+        profile=SEMANTIC_CHECK,
+        # mapa werdyktów rośnie z liczbą pytań
+        options={"max_tokens": 16 + 16 * len(qs)},
+    )
+    if not resp:
+        return [(True, "skipped_no_llm")] * len(qs)
+    obj = _extract_json(resp)
+    _track_parse("mcq_check_batch", isinstance(obj, dict))
+
+    out: list[tuple[bool, str]] = []
+    for i, q in enumerate(qs, start=1):
+        val = obj.get(str(i)) if isinstance(obj, dict) else None
+        if isinstance(val, dict):
+            val = val.get("correct")
+        letters = _norm_letters(val)
+        if letters:
+            out.append(_mcq_verdict(letters, q.get("answer")))
+        else:
+            # brak/puste w mapie -> pojedynczy checker (ma też tryb strict)
+            out.append(_llm_check_mcq(body, q, provider=provider))
+    return out
+
+
+
+def _prepare_mcq(qobj, cites: list[dict]) -> tuple[bool, str]:
+    """Normalizacja explanation + walidacja składni kandydata MCQ."""
+    if isinstance(qobj, dict) and isinstance(qobj.get("explanation"), str):
+        qobj["explanation"] = _ensure_expl_has_rationale(qobj["explanation"], cites)
+        # ujednolić tagi (0 tagów / >1 tagów to najczęstszy powód wejścia w fallback)
+        qobj["explanation"] = _force_single_expl_tag(qobj["explanation"], cites)
+    if not isinstance(qobj, dict):
+        return False, "no json"
+    return _validate_mcq_obj(qobj)
+
+
+def _finalize_mcq(qobj: dict, cites: list[dict], topic, difficulty) -> dict:
+    qobj["kind"] = "MCQ"
+    qobj["metadata"] = _meta(topic, difficulty)
+    qobj["citations"] = _filter_citations_by_expl(qobj.get("explanation", ""), cites)
+    qobj["explanation"] = _ensure_expl_has_rationale(qobj.get("explanation", ""), qobj["citations"])
+    return qobj
+
+
+def _finish_mcq(qobj, body: str, cites: list[dict], topic, difficulty, provider) -> tuple[dict | None, str]:
+    """Kandydat z LLM -> gotowe pytanie MCQ albo (None, powód odrzucenia)."""
+    ok, reason = _prepare_mcq(qobj, cites)
+    if not ok:
+        return None, reason
+    if is_near_duplicate("MCQ", topic, qobj.get("stem", "")):
+        return None, NEAR_DUPLICATE
+
+    # semantic check (tylko jeśli syntaktycznie OK)
+    sem_ok, sem_reason = _semantic_check_mcq(body, qobj, provider=provider)
+    if not sem_ok:
+        return None, sem_reason
+
+    return _finalize_mcq(qobj, cites, topic, difficulty), "ok"
+
+
+def _mcq_prompt(body: str, variant: int) -> str:
+    return f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj JEDNO pytanie wielokrotnego wyboru (wariant {variant}).
 
 Wymagania twarde:
 - dokładnie 4 opcje (options), wszystkie UNIKALNE,
@@ -682,42 +1005,43 @@ Fragmenty:
 {body}
 """.strip()
 
+
+def _mcq_attempt(prompt: str, body: str, cites: list[dict], topic, difficulty, provider, variant: int, profile: str) -> tuple[dict | None, str]:
+    llm = ask_llm(prompt, format=output_format(MCQ_SCHEMA), provider=provider, variant=variant, profile=profile)
+    qobj = _extract_json(llm) if llm else None
+    if llm:
+        _track_parse("mcq", isinstance(qobj, dict))
+    return _finish_mcq(qobj, body, cites, topic, difficulty, provider)
+
+
+def gen_mcq(ctx, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1, hedge: int = 1):
+    """hedge > 1: jak w gen_yes_no — pierwsza próba to równolegli kandydaci."""
+    body, cites = _flatten_ctx(ctx)
+
+    base_prompt = _mcq_prompt(body, variant)
     prompt = base_prompt
     last_reason = "init"
 
     # więcej prób = mniej wejść w fallback (a fallback MCQ wygląda słabo)
+    profile = GENERATE_QUESTION
     for attempt in range(3):
-        llm = ask_llm(prompt, provider=provider)
-        qobj = _extract_json(llm) if llm else None
-        if isinstance(qobj, dict) and isinstance(qobj.get("explanation"), str):
-            qobj["explanation"] = _ensure_expl_has_rationale(qobj["explanation"], cites)
-            # ujednolić tagi (0 tagów / >1 tagów to najczęstszy powód wejścia w fallback)
-            qobj["explanation"] = _force_single_expl_tag(qobj["explanation"], cites)
-
-        ok = False
-        reason = "no json"
-        if isinstance(qobj, dict):
-            ok, reason = _validate_mcq_obj(qobj)
-
-        # semantic check (tylko jeśli syntaktycznie OK)
-        if ok:
-            sem_ok, sem_reason = _semantic_check_mcq(body, qobj, provider=provider)
-            if not sem_ok:
-                ok = False
-                reason = sem_reason
-
-        if ok:
-            qobj["kind"] = "MCQ"
-            qobj["metadata"] = _meta(topic, difficulty)
-            qobj["citations"] = _filter_citations_by_expl(qobj.get("explanation", ""), cites)
-            qobj["explanation"] = _ensure_expl_has_rationale(qobj.get("explanation", ""), qobj["citations"])
-            return qobj
-
+        if attempt == 0 and hedge > 1 and provider != "none":
+            q, reason = hedged(
+                lambda v: _mcq_attempt(_mcq_prompt(body, v), body, cites, topic, difficulty, provider, v, GENERATE_QUESTION),
+                variant,
+                hedge,
+            )
+        else:
+            q, reason = _mcq_attempt(prompt, body, cites, topic, difficulty, provider, variant, profile)
+        if q is not None:
+            return q
 
         last_reason = reason
 
         # ważne: modyfikacja prompta MUSI BYĆ W PĘTLI
         if attempt == 0:
+            profile = REPAIR
+            metrics.inc("llm.repair.mcq")
             prompt = (
                 "NAPRAW OUTPUT. Zwróć WYŁĄCZNIE poprawny JSON zgodny ze schematem. "
                 f"Problem: {reason}. "
@@ -725,6 +1049,7 @@ Fragmenty:
                 + base_prompt
             )
         else:
+            profile = GENERATE_QUESTION
             prompt = (
                 "Wygeneruj CAŁKIEM INNE pytanie (inny fakt z fragmentów), "
                 f"bo poprzednie miało problem: {reason}. "
@@ -787,3 +1112,182 @@ Fragmenty:
         "citations": [{"source": src, "page": int(page), "quote": claim}],
         "debug": {"fallback_reason": last_reason},
     }
+
+
+# -----------------------------
+# Batch generation (k pytań na jedno wywołanie LLM)
+# -----------------------------
+
+def _batch_avoid(stems: list[str]) -> str:
+    if not stems:
+        return ""
+    lines = "\n".join(f"- {x}" for x in stems)
+    return f"\nNie powtarzaj tych pytań (już są):\n{lines}\n"
+
+
+def _batch_problems(reasons: list[str]) -> str:
+    if not reasons:
+        return ""
+    return "\nPoprzednie elementy odrzucono, bo: " + "; ".join(sorted(set(reasons))) + ".\n"
+
+
+# budżet wyjścia na jedno pytanie w wywołaniu batchowym i szacunek instrukcji promptu batcha
+_BATCH_ITEM_TOKENS = 500
+_BATCH_PROMPT_TOKENS = 400
+
+
+def _batch_capacity(body: str, k: int, provider: str | None) -> int:
+    """Ile pytań zmieści się w jednym wywołaniu (prompt + k * _BATCH_ITEM_TOKENS <= num_ctx).
+
+    Nadmiar nie ginie — kolejne pytania dojdą w następnym wywołaniu batchowym.
+    """
+    room = context_room(body, provider=provider, profile=GENERATE_QUESTION)
+    if room is None:
+        return k
+    return max(1, min(k, (room - _BATCH_PROMPT_TOKENS) // _BATCH_ITEM_TOKENS))
+
+
+def gen_yes_no_batch(ctx, k: int, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1) -> list[dict]:
+    """Jedno wywołanie LLM -> do k pytań YN nad tym samym kontekstem.
+
+    Każdy element przechodzi osobno walidację i semantic check; ponownie prosimy
+    tylko o brakujące elementy (max 3 wywołania). Bez fallbacku — zwraca to, co przeszło.
+    """
+    body, cites = _flatten_ctx(ctx)
+    k = max(1, int(k))
+    out: list[dict] = []
+    reasons: list[str] = []
+
+    cap = _batch_capacity(body, k, provider)
+
+    for attempt in range(3):
+        need = min(k - len(out), cap)
+        if need <= 0:
+            break
+
+        prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj {need} RÓŻNYCH pytań TAK/NIE (wariant {variant + attempt}).
+Każde pytanie ma dotyczyć innego faktu z fragmentów.
+Zwróć TYLKO JSON: {{"items":[{{"stem":str,"answer":"TAK"|"NIE","explanation":str}}, ...]}} — dokładnie {need} elementów.
+
+Wymagania twarde (dla KAŻDEGO elementu):
+- "answer" to dokładnie "TAK" lub "NIE",
+- "explanation" MUSI mieć dokładnie jeden tag [nazwa_pliku|p.N] z fragmentów,
+- po tagu MUSI być krótkie uzasadnienie (min 1 zdanie), dlaczego TAK/NIE,
+- uzasadnienie ma wynikać z przytoczonych fragmentów, bez zgadywania.
+{_batch_problems(reasons)}{_batch_avoid([q.get("stem", "") for q in out])}
+Bez komentarzy, bez markdown, bez dodatkowego tekstu.
+
+Fragmenty:
+{body}
+""".strip()
+
+        llm = ask_llm(
+            prompt,
+            format=output_format(batch_schema(YN_SCHEMA, need)),
+            provider=provider,
+            variant=variant + attempt,
+            profile=GENERATE_QUESTION,
+            # budżet wyjścia na każde pytanie z listy
+            options={"max_tokens": _BATCH_ITEM_TOKENS * need},
+        )
+        if llm is None and attempt == 0:
+            # brak LLM (provider none / brak konfiguracji) -> zachowanie jak w trybie pojedynczym
+            return [gen_yes_no(ctx, topic=topic, difficulty=difficulty, provider=provider, variant=variant)]
+
+        items = _extract_items(llm)
+        if llm:
+            _track_parse("yn_batch", bool(items))
+        reasons = [] if items else ["no json array"]
+
+        # kolejka kandydatów poprawnych składniowo -> jeden wspólny semantic check
+        queued: list[dict] = []
+        for qobj in items[:need]:
+            ok, reason = _prepare_yn(qobj, cites)
+            if ok and is_near_duplicate("YN", topic, qobj.get("stem", ""), extra=[q.get("stem", "") for q in out + queued]):
+                ok, reason = False, NEAR_DUPLICATE
+            if ok:
+                queued.append(qobj)
+            else:
+                reasons.append(reason)
+
+        verdicts = _semantic_check_yn_batch(body, [q.get("stem", "") for q in queued], provider=provider)
+        for qobj, sem_ans in zip(queued, verdicts):
+            _align_yn_answer(qobj, sem_ans)
+            q, reason = _finalize_yn(qobj, cites, topic, difficulty)
+            if q is not None:
+                out.append(q)
+            else:
+                reasons.append(reason)
+
+    return out
+
+
+def gen_mcq_batch(ctx, k: int, topic=None, difficulty="medium", provider: str | None = None, variant: int = 1) -> list[dict]:
+    """Jedno wywołanie LLM -> do k pytań MCQ nad tym samym kontekstem (jak gen_yes_no_batch)."""
+    body, cites = _flatten_ctx(ctx)
+    k = max(1, int(k))
+    out: list[dict] = []
+    reasons: list[str] = []
+
+    cap = _batch_capacity(body, k, provider)
+
+    for attempt in range(3):
+        need = min(k - len(out), cap)
+        if need <= 0:
+            break
+
+        prompt = f"""Użyj WYŁĄCZNIE fragmentów poniżej i wygeneruj {need} RÓŻNYCH pytań wielokrotnego wyboru (wariant {variant + attempt}).
+Każde pytanie ma dotyczyć innego konkretnego faktu/pojęcia z fragmentów.
+
+Wymagania twarde (dla KAŻDEGO elementu):
+- dokładnie 4 opcje (options), wszystkie UNIKALNE,
+- dokładnie 1 poprawna odpowiedź, 3 błędne (ale wiarygodne),
+- options mają być CZYSTYM tekstem (bez 'a)', 'b)', numeracji itp.),
+- answer ma być literą: "a"|"b"|"c"|"d",
+- nie używaj opcji typu „wszystkie powyższe” ani opcji meta („zgodne/sprzeczne z fragmentami”),
+- w "explanation" MUSI być dokładnie jeden tag w formacie [nazwa_pliku|p.N] z poniższych fragmentów.
+{_batch_problems(reasons)}{_batch_avoid([q.get("stem", "") for q in out])}
+Zwróć TYLKO JSON — dokładnie {need} elementów:
+{{"items":[{{"stem":str,"options":[str,str,str,str],"answer":"a"|"b"|"c"|"d","explanation":str}}, ...]}}
+Bez komentarzy, bez markdown, bez dodatkowego tekstu.
+
+Fragmenty:
+{body}
+""".strip()
+
+        llm = ask_llm(
+            prompt,
+            format=output_format(batch_schema(MCQ_SCHEMA, need)),
+            provider=provider,
+            variant=variant + attempt,
+            profile=GENERATE_QUESTION,
+            # budżet wyjścia na każde pytanie z listy
+            options={"max_tokens": _BATCH_ITEM_TOKENS * need},
+        )
+        if llm is None and attempt == 0:
+            return [gen_mcq(ctx, topic=topic, difficulty=difficulty, provider=provider, variant=variant)]
+
+        items = _extract_items(llm)
+        if llm:
+            _track_parse("mcq_batch", bool(items))
+        reasons = [] if items else ["no json array"]
+
+        # kolejka kandydatów poprawnych składniowo -> jeden wspólny semantic check
+        queued: list[dict] = []
+        for qobj in items[:need]:
+            ok, reason = _prepare_mcq(qobj, cites)
+            if ok and is_near_duplicate("MCQ", topic, qobj.get("stem", ""), extra=[q.get("stem", "") for q in out + queued]):
+                ok, reason = False, NEAR_DUPLICATE
+            if ok:
+                queued.append(qobj)
+            else:
+                reasons.append(reason)
+
+        verdicts = _semantic_check_mcq_batch(body, queued, provider=provider)
+        for qobj, (sem_ok, sem_reason) in zip(queued, verdicts):
+            if sem_ok:
+                out.append(_finalize_mcq(qobj, cites, topic, difficulty))
+            else:
+                reasons.append(sem_reason)
+
+    return out
@@ -0,0 +1,98 @@
+import contextvars, threading, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, TypeVar
+
+from .. import metrics
+from .budget import BudgetExceeded
+from .scheduler import SchedulerBusy
+
+# Hedging generowania: m kandydatów (różne `variant`) równolegle, wygrywa pierwszy,
+# który przejdzie walidację i semantic check; reszta jest anulowana.
+# Anulowanie to Event w contextvar — ask_llm i streaming w providerach sprawdzają go
+# i przerywają wywołanie (LLMCancelled), więc przegrani nie zużywają budżetu ani slotów.
+# Kandydaci zawsze idą strumieniem (bez streamingu nie da się przerwać wywołania w locie).
+
+T = TypeVar("T")
+
+
+class LLMCancelled(RuntimeError):
+    """Wywołanie LLM anulowane (inny kandydat hedgingu już wygrał)."""
+
+
+_cancel: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar("llm_cancel", default=None)
+
+
+def cancelled() -> bool:
+    ev = _cancel.get()
+    return ev is not None and ev.is_set()
+
+
+def cancellable() -> bool:
+    """Wywołanie jest kandydatem hedgingu (może zostać anulowane w trakcie)."""
+    return _cancel.get() is not None
+
+
+def raise_if_cancelled() -> None:
+    if cancelled():
+        raise LLMCancelled("cancelled")
+
+
+def hedged(
+    attempt: Callable[[int], tuple[T | None, str]],
+    variant: int,
+    m: int,
+) -> tuple[T | None, str]:
+    """Uruchamia attempt(variant + i) dla i < m równolegle.
+
+    attempt zwraca (wynik, powód); wynik None = kandydat odrzucony.
+    Zwraca pierwszy zaakceptowany wynik albo (None, powód ostatniego odrzucenia).
+    """
+    if m <= 1:
+        return attempt(variant)
+
+    cancel = threading.Event()
+
+    def run(v: int):
+        _cancel.set(cancel)
+        return attempt(v)
+
+    metrics.inc("llm.hedge.rounds")
+    t0 = time.perf_counter()
+    ex = ThreadPoolExecutor(max_workers=m, thread_name_prefix="hedge")
+    # każdy kandydat we własnej kopii kontekstu (budżet, klient schedulera)
+    futs = [ex.submit(contextvars.copy_context().run, run, variant + i) for i in range(m)]
+    pending = set(futs)
+    last_reason = "hedge_no_candidate"
+    first_error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    res, reason = f.result()
+                except LLMCancelled:
+                    continue
+                except (BudgetExceeded, SchedulerBusy):
+                    # budżet / deadline / kolejka dotyczą całego requestu — nie ma sensu
+                    # czekać na pozostałych kandydatów (finally ich anuluje)
+                    raise
+                except Exception as e:
+                    # błąd jednego kandydata nie przerywa pozostałych
+                    first_error = first_error or e
+                    continue
+                if res is not None:
+                    metrics.inc("llm.hedge.won")
+                    metrics.inc("llm.hedge.cancelled", len(pending))
+                    metrics.observe("llm.hedge.win_ms", (time.perf_counter() - t0) * 1000.0)
+                    return res, reason
+                last_reason = reason
+    finally:
+        cancel.set()
+        # nie czekamy na przegranych: providery czytają odpowiedź kandydata strumieniem
+        # (także przy LLM_STREAM_JSON=0) i rozłączają się przy anulowaniu, zwalniając slot
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    if first_error is not None and last_reason == "hedge_no_candidate":
+        raise first_error
+    metrics.inc("llm.hedge.lost_all")
+    return None, last_reason
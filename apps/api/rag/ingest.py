@@ -4,7 +4,9 @@ from pypdf import PdfReader
 from pptx import Presentation
 import docx2txt
 from ebooklib import epub
-from .util import chunk_text
+from .util import chunk_text, split_sentences
+from .dedup import minhash, band_keys, find_duplicate, index_chunk, add_provenance
+from ..settings import settings
 from .emb import embed_texts
 from .store import _connect, _sha256_file, get_source_id_by_sha256
 
@@ -37,6 +39,77 @@ def _read_epub(p):
     html = " ".join([it.get_body_content().decode("utf-8",errors="ignore") for it in items])
     import re; yield 1, re.sub("<[^>]+>", " ", html)
 
+def _index_sentences(cur, chunk_rows: list[tuple[int, str]], emb_model: str) -> int:
+    """Zdania chunków -> tabela sentences (embedding jednym batchem)."""
+    rows = []
+    for cid, text in chunk_rows:
+        for j, sent in enumerate(split_sentences(text)):
+            rows.append((cid, j, sent))
+    if not rows:
+        return 0
+    embs = embed_texts([r[2] for r in rows], model_name=emb_model)
+    cur.executemany(
+        "INSERT INTO sentences(chunk_id,idx,text,embedding) VALUES(?,?,?,?)",
+        [(cid, j, sent, emb) for (cid, j, sent), emb in zip(rows, embs)],
+    )
+    return len(rows)
+
+def backfill_sentences(db_path:str, emb_model:str, batch:int = 200) -> dict:
+    """Indeks zdań dla chunków wgranych przed jego dodaniem."""
+    con = _connect(db_path)
+    done = 0
+    try:
+        cur = con.cursor()
+        last_id = 0
+        while True:
+            cur.execute(
+                """SELECT c.id, c.text FROM chunks c
+                   WHERE c.id > ? AND NOT EXISTS (SELECT 1 FROM sentences s WHERE s.chunk_id = c.id)
+                   ORDER BY c.id
+                   LIMIT ?""",
+                (last_id, batch),
+            )
+            rows = [(int(r[0]), r[1]) for r in cur.fetchall()]
+            if not rows:
+                break
+            _index_sentences(cur, rows, emb_model)
+            con.commit()
+            last_id = rows[-1][0]
+            done += len(rows)
+        con.commit()
+        return {"chunks": done}
+    finally:
+        con.close()
+
+def backfill_minhash(db_path:str, batch:int = 500) -> dict:
+    """Sygnatury MinHash dla chunków wgranych przed deduplikacją (bez scalania starych kopii)."""
+    con = _connect(db_path)
+    done = 0
+    try:
+        cur = con.cursor()
+        last_id = 0
+        while True:
+            cur.execute(
+                """SELECT c.id, c.text FROM chunks c
+                   WHERE c.id > ? AND NOT EXISTS (SELECT 1 FROM chunk_minhash m WHERE m.chunk_id = c.id)
+                   ORDER BY c.id
+                   LIMIT ?""",
+                (last_id, batch),
+            )
+            rows = [(int(r[0]), r[1]) for r in cur.fetchall()]
+            if not rows:
+                break
+            for cid, text in rows:
+                sig = minhash(text)
+                if sig is not None:
+                    index_chunk(cur, cid, sig, band_keys(sig))
+            con.commit()
+            last_id = rows[-1][0]
+            done += len(rows)
+        return {"chunks": done}
+    finally:
+        con.close()
+
 def ingest_files(paths:list[str], db_path:str, index_dir:str, emb_model:str):
     os.makedirs(index_dir, exist_ok=True)
     con = _connect(db_path)
@@ -65,19 +138,38 @@ def ingest_files(paths:list[str], db_path:str, index_dir:str, emb_model:str):
             
             sid = cur.lastrowid
             chunks, payload = [], []
+            dups = 0
             for page, full in pages:
                 for ch in chunk_text(full, max_chars=1100, overlap=200):
+                    sig = minhash(ch) if settings.dedup_jaccard > 0 else None
+                    keys = band_keys(sig) if sig is not None else []
+                    if sig is not None:
+                        # prawie identyczny chunk już jest (w bazie albo wcześniej w tym pliku)
+                        # -> tylko nowe wystąpienie (source, page), bez embeddingu
+                        canon = find_duplicate(cur, sig, keys)
+                        if canon is not None:
+                            add_provenance(cur, canon, sid, page)
+                            dups += 1
+                            continue
                     quote = (ch[:180] + "…") if len(ch) > 180 else ch
-                    chunks.append((sid, page, ch, quote))
-                    payload.append(ch)
-            if payload:
-                embs = embed_texts(payload, model_name=emb_model)
-                for (sid, page, ch, quote), emb in zip(chunks, embs):
+                    # chunk od razu w bazie (embedding niżej), żeby kolejne duplikaty go widziały
                     cur.execute(
                         "INSERT INTO chunks(source_id,page,text,quote,embedding) VALUES(?,?,?,?,?)",
-                        (sid, page, ch, quote, emb),
+                        (sid, page, ch, quote, b""),
                     )
-            stats.append({"file": os.path.basename(p), "chunks": len(payload)})
+                    cid = cur.lastrowid
+                    if sig is not None:
+                        index_chunk(cur, cid, sig, keys)
+                    chunks.append((cid, ch))
+                    payload.append(ch)
+            if payload:
+                embs = embed_texts(payload, model_name=emb_model)
+                cur.executemany(
+                    "UPDATE chunks SET embedding=? WHERE id=?",
+                    [(emb, cid) for (cid, _), emb in zip(chunks, embs)],
+                )
+                _index_sentences(cur, chunks, emb_model)
+            stats.append({"file": os.path.basename(p), "chunks": len(payload), "duplicates": dups})
         con.commit()
         return stats
     finally:
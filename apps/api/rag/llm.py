@@ -1,5 +1,19 @@
 from ..settings import settings
 from ..providers.base import LLMProvider
+from ..providers.profiles import get_profile
+from .. import metrics
+from .llm_cache import get_cache, make_key
+from .budget import charge_llm_call, check_llm_budget, remaining_seconds, BudgetExceeded
+from .scheduler import llm_slot, SchedulerBusy
+from .hedge import raise_if_cancelled
+from .packer import estimate_tokens
+
+# zapas na szablon czatu / tokeny specjalne przy liczeniu miejsca w num_ctx
+_CTX_MARGIN_TOKENS = 32
+_MIN_OUTPUT_TOKENS = 64
+
+# tyle zostało z deadline'u, gdy scheduler zwrócił timeout -> traktuj jako deadline_exceeded
+_DEADLINE_SLACK_S = 0.05
 
 def _provider(provider_override: str | None = None) -> LLMProvider | None:
     """provider_override:
@@ -23,16 +37,94 @@ def _provider(provider_override: str | None = None) -> LLMProvider | None:
         from ..providers.openai_provider import OpenAIProvider
         return OpenAIProvider(api_key=settings.openai_api_key)
 
-    if prov_name == "ollama" and settings.ollama_base_url:
+    if prov_name == "ollama" and (settings.ollama_endpoints or settings.ollama_base_url):
         from ..providers.ollama_provider import OllamaProvider
-        return OllamaProvider(base_url=settings.ollama_base_url)
+        return OllamaProvider(base_url=settings.ollama_endpoints or settings.ollama_base_url)
 
     # jeśli nie da się zainicjalizować (brak key/url) -> traktuj jak none
     return None
 
 
-def ask_llm(prompt: str, format=None, provider: str | None = None) -> str | None:
+def provider_model(provider: str | None = None) -> str | None:
+    """Model providera (klucz kalibracji znaków/token w packerze), None gdy LLM wyłączony."""
+    prov = _provider(provider)
+    return prov.model if prov else None
+
+
+def context_room(prompt: str, provider: str | None = None, profile: str | None = None) -> int | None:
+    """Ile tokenów wyjścia zmieści się w num_ctx profilu obok promptu (None = bez limitu num_ctx)."""
+    prov = _provider(provider)
+    if not prov:
+        return None
+    num_ctx = get_profile(prov.name, profile).get("num_ctx")
+    if not num_ctx:
+        return None
+    return int(num_ctx) - estimate_tokens(prompt, prov.model) - _CTX_MARGIN_TOKENS
+
+
+def ask_llm(
+    prompt: str,
+    format=None,
+    provider: str | None = None,
+    options: dict | None = None,
+    variant: int | None = None,
+    profile: str | None = None,
+) -> str | None:
+    """Jedno wywołanie LLM.
+
+    profile: typ wywołania (generate_question / semantic_check / repair) —
+      limity tokenów, num_ctx, keep_alive, stop; patrz providers/profiles.py.
+    options: nadpisania opcji ponad profil (np. {"max_tokens": 1600}).
+    variant: numer wariantu generowania — takie wywołania z założenia mają dawać
+      różne wyniki, więc (podobnie jak temperature > 0) omijają cache.
+    """
     prov = _provider(provider)
     if not prov:
         return None
-    return prov.generate(prompt, format=format)
+
+    options = {**get_profile(prov.name, profile), **(options or {})}
+    # prompt + wyjście muszą się zmieścić w num_ctx — inaczej Ollama po cichu obcina prompt
+    num_ctx = options.get("num_ctx")
+    if num_ctx and options.get("max_tokens"):
+        room = int(num_ctx) - estimate_tokens(prompt, prov.model) - _CTX_MARGIN_TOKENS
+        if int(options["max_tokens"]) > room:
+            options["max_tokens"] = max(_MIN_OUTPUT_TOKENS, room)
+            metrics.inc("llm.max_tokens_capped")
+
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        temperature = float(prov.merged_options(options).get("temperature") or 0.0)
+        if variant is None and temperature <= 0.0:
+            key = make_key(prov.name, prov.model, prov.merged_options(options), format, prompt)
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+        else:
+            metrics.inc("llm.cache.bypass")
+
+    # trafienia w cache są darmowe; dopiero prawdziwe wywołanie zużywa budżet requestu
+    raise_if_cancelled()
+    # wyczerpany budżet / minięty deadline -> BudgetExceeded zanim zajmiemy kolejkę
+    check_llm_budget()
+    try:
+        # slot schedulera (fair share między klientami, 429 przy pełnej kolejce)
+        with llm_slot(max_wait_s=remaining_seconds()):
+            # kandydat hedgingu mógł przegrać w czasie czekania na slot
+            raise_if_cancelled()
+            # budżet zużywa dopiero wywołanie, które dostało slot
+            charge_llm_call()
+            metrics.inc("llm.calls")
+            # szacunek (kalibrowany) — prawdziwe liczniki raportuje provider (llm.prompt_tokens)
+            metrics.observe("llm.prompt_tokens_est", estimate_tokens(prompt, prov.model))
+            resp = prov.generate(prompt, format=format, options=options)
+    except SchedulerBusy:
+        # czekanie na slot skończył deadline requestu (max_wait_s = reszta deadline'u),
+        # a nie pełna kolejka -> to samo co minięty deadline, nie 429
+        left = remaining_seconds()
+        if left is not None and left <= _DEADLINE_SLACK_S:
+            raise BudgetExceeded("deadline_exceeded")
+        raise
+    if key is not None and resp:
+        cache.put(key, resp)
+    return resp
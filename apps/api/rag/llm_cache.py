@@ -0,0 +1,142 @@
+import hashlib, json, os, sqlite3, threading, time
+
+from ..settings import settings
+from .. import metrics
+
+# Trwały cache odpowiedzi LLM (SQLite, osobny plik — nie znika przy DELETE /sources).
+# Klucz: (provider, model, opcje generowania, format, hash prompta).
+
+
+def make_key(provider: str, model: str, options: dict | None, format, prompt: str) -> str:
+    prompt_hash = hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()
+    base = json.dumps(
+        [provider, model, options or {}, format, prompt_hash],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, ttl_s: int, max_entries: int):
+        self.path = path
+        self.ttl_s = max(1, int(ttl_s))
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._puts = 0
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                     key TEXT PRIMARY KEY,
+                     response TEXT NOT NULL,
+                     created_at REAL NOT NULL,
+                     last_hit REAL NOT NULL
+                   )"""
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache(last_hit)")
+            con.commit()
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30.0)
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA busy_timeout=30000;")
+        return con
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute("SELECT response, created_at FROM llm_cache WHERE key=?", (key,))
+            row = cur.fetchone()
+            if not row:
+                metrics.inc("llm.cache.miss")
+                return None
+            if now - float(row[1]) > self.ttl_s:
+                cur.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                con.commit()
+                metrics.inc("llm.cache.miss")
+                metrics.inc("llm.cache.expired")
+                return None
+            cur.execute("UPDATE llm_cache SET last_hit=? WHERE key=?", (now, key))
+            con.commit()
+            metrics.inc("llm.cache.hit")
+            return row[0]
+        finally:
+            con.close()
+
+    def put(self, key: str, response: str) -> None:
+        if not response:
+            return
+        now = time.time()
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute(
+                "INSERT OR REPLACE INTO llm_cache(key,response,created_at,last_hit) VALUES(?,?,?,?)",
+                (key, response, now, now),
+            )
+            with self._lock:
+                self._puts += 1
+                evict = self._puts % 50 == 1
+            # eviction co kilkadziesiąt zapisów: najpierw TTL, potem najdawniej używane ponad limit
+            if evict:
+                cur.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,))
+                cur.execute("SELECT COUNT(*) FROM llm_cache")
+                over = int(cur.fetchone()[0] or 0) - self.max_entries
+                if over > 0:
+                    cur.execute(
+                        "DELETE FROM llm_cache WHERE key IN "
+                        "(SELECT key FROM llm_cache ORDER BY last_hit ASC LIMIT ?)",
+                        (over,),
+                    )
+                    metrics.inc("llm.cache.evicted", over)
+            con.commit()
+        finally:
+            con.close()
+
+    def stats(self) -> dict:
+        snap = metrics.snapshot()["counters"]
+        hits = int(snap.get("llm.cache.hit", 0))
+        misses = int(snap.get("llm.cache.miss", 0))
+        con = self._connect()
+        try:
+            entries = int(con.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] or 0)
+        finally:
+            con.close()
+        return {
+            "enabled": True,
+            "hits": hits,
+            "misses": misses,
+            "bypass": int(snap.get("llm.cache.bypass", 0)),
+            "hit_rate": round(hits / (hits + misses), 4) if (hits + misses) else None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+        }
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache | None:
+    """Zwraca cache albo None, gdy wyłączony (LLM_CACHE=0)."""
+    global _cache
+    if not settings.llm_cache:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                settings.llm_cache_path,
+                ttl_s=settings.llm_cache_ttl_s,
+                max_entries=settings.llm_cache_max_entries,
+            )
+        return _cache
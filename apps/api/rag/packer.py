@@ -0,0 +1,107 @@
+import math, threading
+
+from ..settings import settings
+from .. import metrics
+
+# Pakowanie kontekstu pod budżet tokenów (CTX_TOKEN_BUDGET) zamiast stałej liczby fragmentów.
+# Tokeny liczymy estymatorem znaki/token kalibrowanym na prawdziwych licznikach z providera
+# (Ollama `prompt_eval_count`, OpenAI `usage.prompt_tokens`) — osobno per model.
+
+_lock = threading.Lock()
+# model -> średnia krocząca znaków na token
+_chars_per_token: dict[str, float] = {}
+
+
+def _ratio(model: str | None) -> float:
+    with _lock:
+        return _chars_per_token.get(model or "", settings.ctx_chars_per_token)
+
+
+def estimate_tokens(text: str, model: str | None = None) -> int:
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / _ratio(model)))
+
+
+def record_prompt_tokens(model: str | None, prompt: str, tokens: int | None) -> None:
+    """Prawdziwa liczba tokenów promptu z providera: metryka + kalibracja estymatora."""
+    if not tokens or tokens <= 0 or not prompt:
+        return
+    metrics.observe("llm.prompt_tokens", tokens)
+    key = model or ""
+    ratio = len(prompt) / float(tokens)
+    with _lock:
+        prev = _chars_per_token.get(key)
+        _chars_per_token[key] = ratio if prev is None else 0.9 * prev + 0.1 * ratio
+
+
+def record_ttft(model: str | None, prompt: str, ttft_ms: float | None) -> None:
+    """Czas do pierwszego tokenu streamu ~ prefill; ms/token względem estymaty promptu.
+
+    Zastępcze źródło dla llm.prefill_ms_per_token, gdy provider nie podał statystyk
+    (OpenAI, stream Ollamy przerwany przed chunkiem done).
+    """
+    if ttft_ms is None or not prompt:
+        return
+    metrics.observe("llm.ttft_ms_per_token", ttft_ms / max(1, estimate_tokens(prompt, model)))
+
+
+def calibration() -> dict:
+    with _lock:
+        return {m or "default": round(r, 3) for m, r in _chars_per_token.items()}
+
+
+def _snippet(c: dict) -> str:
+    return f"[{c.get('source')}|p.{c.get('page')}] {(c.get('quote') or '').strip()}"
+
+
+def pack_context(
+    items: list[dict],
+    budget_tokens: int,
+    first: dict | None = None,
+    model: str | None = None,
+    source_decay: float = 0.85,
+) -> list[dict]:
+    """Wybiera całe fragmenty (bez cięcia w połowie) mieszczące się w budżecie tokenów.
+
+    Kolejność: `first` (fragment wiodący pytania), dalej wg score z karą za kolejne
+    fragmenty z tego samego źródła (różnorodność). Duplikaty (source, page) pomijane.
+    """
+    budget = max(1, int(budget_tokens))
+    out: list[dict] = []
+    used = 0
+    seen: set[tuple] = set()
+    per_source: dict[str, int] = {}
+
+    def take(c: dict) -> bool:
+        nonlocal used
+        key = (c.get("source"), c.get("page"))
+        if key in seen:
+            return False
+        cost = estimate_tokens(_snippet(c), model) + 1  # +1: nowa linia
+        if out and used + cost > budget:
+            return False
+        seen.add(key)
+        out.append(c)
+        used += cost
+        per_source[str(c.get("source"))] = per_source.get(str(c.get("source")), 0) + 1
+        return True
+
+    if first is not None:
+        take(first)
+
+    rest = [c for c in items if c is not first]
+    while rest:
+        # ponowne ważenie po każdym wyborze: źródło, z którego już coś jest, traci
+        best_i, best_s = -1, -math.inf
+        for j, c in enumerate(rest):
+            s = float(c.get("score") or 0.0) * (source_decay ** per_source.get(str(c.get("source")), 0))
+            if s > best_s:
+                best_i, best_s = j, s
+        c = rest.pop(best_i)
+        if not take(c) and used >= budget:
+            break
+
+    metrics.observe("ctx.pack_tokens", used)
+    metrics.observe("ctx.pack_snippets", len(out))
+    return out
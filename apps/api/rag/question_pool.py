@@ -0,0 +1,148 @@
+import threading, time
+from typing import Callable
+
+from ..settings import settings
+from .. import metrics
+from .store import question_pool_stock, _pool_key
+from .scheduler import get_scheduler
+
+# Pula pre-generowanych pytań per (kind, topic, difficulty).
+# /gen/* najpierw wydaje pytania z puli, a wątek w tle dopełnia zapas do
+# `qpool_target`, gdy nie ma ruchu na żywo (generuje jako klient "pool-worker",
+# priorytet bulk — interaktywne requesty i tak mają pierwszeństwo w schedulerze).
+# Klucze do dopełniania bierzemy z popytu (które tematy ktoś generował) + z tego,
+# co już jest w puli.
+
+POOL_CLIENT = "pool-worker"
+
+# fill(kind, topic, difficulty, n, stop) -> liczba dodanych pytań
+FillFn = Callable[[str, str, str, int, threading.Event], int]
+
+
+class QuestionPoolWorker:
+    def __init__(self, fill: FillFn, db_path: str):
+        self.fill = fill
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # (kind, topic, difficulty) -> [liczba requestów, ostatni request (monotonic)]
+        self._demand: dict[tuple[str, str, str], list] = {}
+        self._last_activity = 0.0
+        # klucze, których nie udało się dopełnić (np. brak LLM) -> nie próbuj do czasu
+        self._backoff: dict[tuple[str, str, str], float] = {}
+
+    # --- ruch na żywo ---
+
+    def note_demand(self, kind: str, topic: str | None, difficulty: str | None) -> None:
+        key = (kind, *_pool_key(topic, difficulty))
+        with self._lock:
+            d = self._demand.setdefault(key, [0, 0.0])
+            d[0] += 1
+            d[1] = time.monotonic()
+            if len(self._demand) > settings.qpool_max_keys:
+                # najdawniej żądany klucz wypada
+                oldest = min(self._demand, key=lambda k: self._demand[k][1])
+                self._demand.pop(oldest, None)
+            # nowy popyt -> daj szansę kluczowi, który wcześniej się nie dopełnił
+            self._backoff.pop(key, None)
+
+    def touch(self) -> None:
+        """Ruch na żywo (każda próba generowania) — wstrzymuje dopełnianie."""
+        with self._lock:
+            self._last_activity = time.monotonic()
+
+    def idle(self) -> bool:
+        with self._lock:
+            quiet = time.monotonic() - self._last_activity >= settings.qpool_idle_s
+        if not quiet:
+            return False
+        sched = get_scheduler()
+        return sched is None or sched.stats()["waiting"] == 0
+
+    # --- wątek dopełniający ---
+
+    def start(self) -> None:
+        if self._thread is not None or settings.qpool_target <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="question-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        t = self._thread
+        self._thread = None
+        if t is not None:
+            t.join(timeout=5.0)
+
+    def _keys(self, stock: dict) -> list[tuple[str, str, str]]:
+        with self._lock:
+            demand = {k: v[0] for k, v in self._demand.items()}
+        keys = set(demand) | set(stock)
+        # najpierw najczęściej żądane
+        return sorted(keys, key=lambda k: (-demand.get(k, 0), k))
+
+    def refill_once(self) -> int:
+        """Dopełnia jeden klucz z deficytem (jeden na raz, żeby często sprawdzać idle)."""
+        stock = {
+            (r["kind"], r["topic"], r["difficulty"]): r["available"]
+            for r in question_pool_stock(self.db_path)
+        }
+        now = time.monotonic()
+        for key in self._keys(stock):
+            if self._backoff.get(key, 0.0) > now:
+                continue
+            deficit = settings.qpool_target - stock.get(key, 0)
+            if deficit <= 0:
+                continue
+            kind, topic, difficulty = key
+            n = min(deficit, max(1, settings.qpool_batch))
+            t0 = time.perf_counter()
+            try:
+                added = self.fill(kind, topic, difficulty, n, self._stop)
+            except Exception:
+                added = 0
+            metrics.observe("qpool.refill_ms", (time.perf_counter() - t0) * 1000.0)
+            metrics.inc("qpool.refilled", added)
+            if added == 0:
+                self._backoff[key] = now + settings.qpool_backoff_s
+            return added
+        return 0
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.qpool_poll_s):
+            if not self.idle():
+                continue
+            try:
+                self.refill_once()
+            except Exception:
+                # np. baza w trakcie resetu (DELETE /sources) — spróbuj w kolejnym cyklu
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            demand = [
+                {"kind": k[0], "topic": k[1], "difficulty": k[2], "requests": v[0]}
+                for k, v in self._demand.items()
+            ]
+        return {
+            "enabled": self._thread is not None,
+            "target": settings.qpool_target,
+            "demand": demand,
+            "stock": question_pool_stock(self.db_path),
+        }
+
+
+_worker: QuestionPoolWorker | None = None
+
+
+def init_pool_worker(fill: FillFn, db_path: str) -> QuestionPoolWorker:
+    global _worker
+    if _worker is None:
+        _worker = QuestionPoolWorker(fill, db_path)
+    return _worker
+
+
+def get_pool_worker() -> QuestionPoolWorker | None:
+    return _worker
@@ -0,0 +1,154 @@
+import atexit, logging, threading, time
+
+from ..settings import settings
+from .. import metrics
+from .store import apply_ratings
+
+# Kolejka write-behind dla ocen: /rate i /rate/batch tylko dopisują do pamięci, a wątek
+# co RATE_FLUSH_MS zapisuje całą paczkę jedną transakcją (apply_ratings: delty wag
+# zsumowane per chunk). Przy wielu ocenach naraz (zajęcia na żywo) zamiast transakcji
+# na głos jest jedna blokada zapisu na okno. Shutdown/atexit dopisuje resztę.
+
+log = logging.getLogger(__name__)
+
+# powyżej tylu ocen w kolejce flush od razu, bez czekania na okno
+_FLUSH_AT = 1000
+_RETRY_S = 1.0
+# po tylu nieudanych zapisach z rzędu paczka jest porzucana (log + metryka), żeby trwały
+# błąd (uszkodzona baza, zły wiersz) nie blokował kolejki na zawsze
+_MAX_ATTEMPTS = 5
+# górny limit kolejki (np. baza długo zablokowana); nadmiar najstarszych ocen odpada
+_MAX_PENDING = 50_000
+
+
+class RatingQueue:
+    def __init__(self, db_path: str, interval_s: float):
+        self.db_path = db_path
+        self.interval_s = max(0.01, float(interval_s))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: list[tuple[str, int, str | None]] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._flushed = 0
+        self._flushes = 0
+        self._failures = 0
+        self._attempts = 0
+        self._dropped = 0
+
+    def submit(self, ratings: list[tuple[str, int, str | None]]) -> int:
+        with self._lock:
+            self._pending.extend(ratings)
+            dropped = self._trim()
+            n = len(self._pending)
+        metrics.inc("rating.queued", len(ratings))
+        if dropped:
+            log.warning("Rating queue full, dropped %d oldest ratings", dropped)
+        if n >= _FLUSH_AT:
+            self._wake.set()
+        return len(ratings)
+
+    def _trim(self) -> int:
+        """Przycina kolejkę do _MAX_PENDING (najstarsze odpadają); woła się pod self._lock."""
+        over = len(self._pending) - _MAX_PENDING
+        if over <= 0:
+            return 0
+        del self._pending[:over]
+        self._dropped += over
+        metrics.inc("rating.dropped", over)
+        return over
+
+    def flush(self) -> int:
+        """Zapisuje wszystko z kolejki; przy błędzie oceny wracają na początek kolejki.
+
+        Po _MAX_ATTEMPTS nieudanych próbach z rzędu paczka jest porzucana.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                apply_ratings(self.db_path, batch)
+            except Exception:
+                metrics.inc("rating.flush_failed")
+                with self._lock:
+                    self._failures += 1
+                    self._attempts += 1
+                    give_up = self._attempts >= _MAX_ATTEMPTS
+                    if give_up:
+                        self._attempts = 0
+                        self._dropped += len(batch)
+                    else:
+                        self._pending[:0] = batch
+                        self._trim()
+                if give_up:
+                    log.exception("Rating flush failed %d times, dropping %d ratings", _MAX_ATTEMPTS, len(batch))
+                    metrics.inc("rating.dropped", len(batch))
+                else:
+                    log.exception("Rating flush failed (%d ratings), will retry", len(batch))
+                return 0
+            metrics.observe("rating.flush_ms", (time.perf_counter() - t0) * 1000.0)
+            metrics.observe("rating.flush_batch", len(batch))
+            with self._lock:
+                self._attempts = 0
+                self._flushed += len(batch)
+                self._flushes += 1
+            return len(batch)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rating-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Zatrzymuje wątek i zapisuje resztę kolejki (shutdown / atexit)."""
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        self._thread = None
+        if t is not None:
+            t.join(timeout=5.0)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self.flush() == 0 and self.stats()["pending"]:
+                # błąd zapisu (np. baza zablokowana) -> nie młóć w pętli
+                self._stop.wait(_RETRY_S)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "pending": len(self._pending),
+                "flushed": self._flushed,
+                "flushes": self._flushes,
+                "failures": self._failures,
+                "dropped": self._dropped,
+                "interval_ms": int(self.interval_s * 1000),
+            }
+
+
+_queue: RatingQueue | None = None
+
+
+def init_rating_queue(db_path: str) -> RatingQueue | None:
+    """Kolejka ocen (RATE_FLUSH_MS > 0), inaczej None = zapis synchroniczny."""
+    global _queue
+    if _queue is None and settings.rate_flush_ms > 0:
+        _queue = RatingQueue(db_path, settings.rate_flush_ms / 1000.0)
+    return _queue
+
+
+def get_rating_queue() -> RatingQueue | None:
+    return _queue
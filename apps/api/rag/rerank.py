@@ -0,0 +1,86 @@
+import time, logging
+import numpy as np
+
+from ..settings import settings
+from .. import metrics
+from .packer import estimate_tokens
+
+# Opcjonalny reranking kandydatów rag_search cross-encoderem na CPU (RERANK=on).
+# Bi-encoder (cosinus x (1+w)) wybiera pulę, cross-encoder ocenia pary (zapytanie, chunk)
+# jednym batchem; kandydaci poniżej RERANK_MIN_SCORE odpadają, więc do promptu trafia
+# mniej, ale trafniejszych fragmentów. Koszt vs zaoszczędzony prefill: blok `rerank` w /metrics.
+
+log = logging.getLogger(__name__)
+
+_BATCH = 32
+_failed = False
+# nazwa modelu -> aktywacja (ustalana raz per model)
+_activations: dict[str, str] = {}
+
+
+def enabled() -> bool:
+    return (settings.rerank or "off").strip().lower() == "on" and not _failed
+
+
+def _activation(model) -> str:
+    """Jak sprowadzić wyjście modelu do P(trafny): z konfiguracji modelu, nie z zakresu batcha.
+
+    1 etykieta: CrossEncoder domyślnie daje sigmoid, ale część modeli ma w configu Identity
+    (surowe logity); >1 etykiet: logity bez aktywacji -> softmax, bierzemy ostatnią etykietę.
+    """
+    n = getattr(model, "num_labels", None) or getattr(getattr(model, "config", None), "num_labels", None) or 1
+    fn = getattr(model, "activation_fn", None) or getattr(model, "default_activation_function", None)
+    name = type(fn).__name__.lower() if fn is not None else ""
+    if int(n) > 1:
+        return "none" if "softmax" in name else "softmax"
+    return "none" if "sigmoid" in name else "sigmoid"
+
+
+def _probs(scores, activation: str) -> np.ndarray:
+    s = np.asarray(scores, dtype=np.float32).reshape(len(scores), -1)
+    if activation == "softmax":
+        e = np.exp(s - s.max(axis=1, keepdims=True))
+        s = e / e.sum(axis=1, keepdims=True)
+    s = s[:, -1]
+    if activation == "sigmoid":
+        s = 1.0 / (1.0 + np.exp(-s))
+    return s
+
+
+def score(query: str, texts: list[str]) -> np.ndarray | None:
+    """P(trafny) dla każdego tekstu albo None (brak modelu -> reranking wyłączony do restartu)."""
+    global _failed
+    if not texts:
+        return np.zeros(0, dtype=np.float32)
+    try:
+        # leniwie: import search (mmr_select, snippety) nie ciągnie sentence_transformers
+        from .emb import get_cross_encoder
+        model = get_cross_encoder(settings.rerank_model)
+    except Exception as e:
+        log.warning("Reranker disabled: %s", e)
+        _failed = True
+        return None
+    act = _activations.get(settings.rerank_model)
+    if act is None:
+        act = _activations.setdefault(settings.rerank_model, _activation(model))
+    t0 = time.perf_counter()
+    raw = model.predict([(query, t) for t in texts], batch_size=_BATCH, show_progress_bar=False)
+    metrics.observe("rerank.ms", (time.perf_counter() - t0) * 1000)
+    metrics.observe("rerank.pairs", len(texts))
+    return _probs(raw, act)
+
+
+def cutoff(scores: np.ndarray, snippets: list[str], k: int) -> np.ndarray:
+    """Indeksy (malejąco po score) powyżej RERANK_MIN_SCORE; co najmniej jeden.
+
+    snippets: kandydaci w kolejności cosinusa, jak poszliby do promptu; odcięte tokeny liczymy
+    tylko z pierwszych k (to, co bez rerankingu byłoby wynikiem).
+    """
+    order = np.argsort(-scores)
+    keep = [int(j) for j in order if scores[j] >= settings.rerank_min_score] or [int(order[0])]
+    dropped = len(order) - len(keep)
+    metrics.inc("rerank.cut", dropped)
+    if dropped:
+        kept = set(keep)
+        metrics.observe("rerank.cut_tokens", sum(estimate_tokens(snippets[j]) for j in range(min(k, len(snippets))) if j not in kept))
+    return np.asarray(keep, dtype=np.int64)
@@ -0,0 +1,178 @@
+import contextvars, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+from ..settings import settings
+from .. import metrics
+
+# Centralny scheduler przed ask_llm: LLM to najrzadszy zasób.
+# - max_concurrency wywołań naraz (sloty),
+# - ograniczona kolejka oczekujących (admission control -> SchedulerBusy / HTTP 429),
+# - priorytety: interaktywne (n=1) przed batchowymi,
+# - w obrębie priorytetu round-robin między klientami (fair share).
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class SchedulerBusy(RuntimeError):
+    """Kolejka pełna albo za długie czekanie na slot."""
+
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"llm scheduler busy, retry after {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class _Ticket:
+    __slots__ = ("client", "granted")
+
+    def __init__(self, client: str):
+        self.client = client
+        self.granted = False
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait_s: float):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait_s = float(max_wait_s)
+        self._cond = threading.Condition()
+        self._running = 0
+        # priorytet -> klient -> kolejka ticketów; kolejność klientów = round-robin
+        self._queues: dict[int, dict[str, deque[_Ticket]]] = {
+            PRIORITY_INTERACTIVE: {},
+            PRIORITY_BULK: {},
+        }
+        self._waiting = 0
+        self._avg_call_s = 5.0
+
+    def _grant_next(self) -> None:
+        """Wydaje wolne sloty (wywoływane pod lockiem)."""
+        while self._running < self.max_concurrency:
+            ticket = None
+            for prio in (PRIORITY_INTERACTIVE, PRIORITY_BULK):
+                clients = self._queues[prio]
+                if not clients:
+                    continue
+                client = next(iter(clients))
+                q = clients.pop(client)
+                ticket = q.popleft()
+                if q:
+                    # klient wraca na koniec kolejki (round-robin)
+                    clients[client] = q
+                break
+            if ticket is None:
+                return
+            ticket.granted = True
+            self._waiting -= 1
+            self._running += 1
+            self._cond.notify_all()
+
+    def _retry_after(self) -> int:
+        per_slot = max(1, self._waiting) / self.max_concurrency
+        return max(1, int(round(per_slot * self._avg_call_s)))
+
+    def _remove(self, prio: int, ticket: _Ticket) -> None:
+        clients = self._queues[prio]
+        q = clients.get(ticket.client)
+        if q is not None and ticket in q:
+            q.remove(ticket)
+            self._waiting -= 1
+            if not q:
+                clients.pop(ticket.client, None)
+
+    @contextmanager
+    def slot(self, client: str, priority: int, max_wait_s: float | None = None):
+        # deadline requestu tylko skraca czekanie, nigdy nie wydłuża LLM_MAX_WAIT_S
+        wait_s = self.max_wait_s if max_wait_s is None else min(self.max_wait_s, max(0.0, max_wait_s))
+        t0 = time.monotonic()
+        with self._cond:
+            if self._running >= self.max_concurrency and self._waiting >= self.max_queue:
+                metrics.inc("llm.scheduler.rejected")
+                raise SchedulerBusy(self._retry_after())
+
+            ticket = _Ticket(client)
+            self._queues[priority].setdefault(client, deque()).append(ticket)
+            self._waiting += 1
+            self._grant_next()
+
+            deadline = t0 + wait_s
+            while not ticket.granted:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self._remove(priority, ticket)
+                    metrics.inc("llm.scheduler.timeout")
+                    raise SchedulerBusy(self._retry_after())
+                self._cond.wait(timeout=left)
+
+        metrics.observe("llm.scheduler.wait_ms", (time.monotonic() - t0) * 1000.0)
+        t1 = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                # wygładzona średnia czasu wywołania (do Retry-After)
+                self._avg_call_s = 0.8 * self._avg_call_s + 0.2 * (time.monotonic() - t1)
+                self._grant_next()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "running": self._running,
+                "waiting": self._waiting,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "waiting_by_priority": {
+                    "interactive": sum(len(q) for q in self._queues[PRIORITY_INTERACTIVE].values()),
+                    "bulk": sum(len(q) for q in self._queues[PRIORITY_BULK].values()),
+                },
+                "avg_call_s": round(self._avg_call_s, 3),
+            }
+
+
+_scheduler: LLMScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler | None:
+    """None gdy wyłączony (LLM_MAX_CONCURRENCY=0)."""
+    global _scheduler
+    if settings.llm_max_concurrency <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                settings.llm_max_concurrency,
+                max_queue=settings.llm_max_queue,
+                max_wait_s=settings.llm_max_wait_s,
+            )
+        return _scheduler
+
+
+# Kto woła LLM (klient + priorytet) — ustawiane per request w main.py.
+_client: contextvars.ContextVar[tuple[str, int]] = contextvars.ContextVar(
+    "llm_client", default=("anonymous", PRIORITY_INTERACTIVE)
+)
+
+
+@contextmanager
+def llm_client(client: str, priority: int):
+    prev = _client.get()
+    _client.set((client or "anonymous", priority))
+    try:
+        yield
+    finally:
+        _client.set(prev)
+
+
+@contextmanager
+def llm_slot(max_wait_s: float | None = None):
+    """Slot schedulera dla bieżącego klienta (no-op, gdy scheduler wyłączony)."""
+    sched = get_scheduler()
+    if sched is None:
+        yield
+        return
+    client, priority = _client.get()
+    with sched.slot(client, priority, max_wait_s=max_wait_s):
+        yield
@@ -0,0 +1,83 @@
+# JSON Schema dla wyjść LLM (structured output):
+# Ollama przyjmuje schemat w "format", OpenAI w response_format (json_schema).
+# Dzięki temu model nie może zwrócić źle sformatowanego JSON-a, więc rzadziej
+# potrzebne są prompty "NAPRAW OUTPUT" i fallbacki w _extract_json.
+
+from ..settings import settings
+
+YN_SCHEMA = {
+    "title": "yn_question",
+    "type": "object",
+    "properties": {
+        "stem": {"type": "string"},
+        "answer": {"type": "string", "enum": ["TAK", "NIE"]},
+        "explanation": {"type": "string"},
+    },
+    "required": ["stem", "answer", "explanation"],
+    "additionalProperties": False,
+}
+
+MCQ_SCHEMA = {
+    "title": "mcq_question",
+    "type": "object",
+    "properties": {
+        "stem": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4},
+        "answer": {"type": "string", "enum": ["a", "b", "c", "d"]},
+        "explanation": {"type": "string"},
+    },
+    "required": ["stem", "options", "answer", "explanation"],
+    "additionalProperties": False,
+}
+
+YN_CHECK_SCHEMA = {
+    "title": "yn_check",
+    "type": "object",
+    "properties": {"answer": {"type": "string", "enum": ["TAK", "NIE"]}},
+    "required": ["answer"],
+    "additionalProperties": False,
+}
+
+_LETTERS = {"type": "array", "items": {"type": "string", "enum": ["a", "b", "c", "d"]}}
+
+MCQ_CHECK_SCHEMA = {
+    "title": "mcq_check",
+    "type": "object",
+    "properties": {"correct": _LETTERS},
+    "required": ["correct"],
+    "additionalProperties": False,
+}
+
+
+def batch_schema(item_schema: dict, k: int) -> dict:
+    """{"items":[k x item_schema]}"""
+    return {
+        "title": f"{item_schema['title']}_batch",
+        "type": "object",
+        "properties": {
+            "items": {"type": "array", "items": item_schema, "minItems": k, "maxItems": k},
+        },
+        "required": ["items"],
+        "additionalProperties": False,
+    }
+
+
+def check_map_schema(value_schema: dict, k: int, title: str) -> dict:
+    """{"1": value, ..., "k": value} — mapa werdyktów batchowego checkera."""
+    keys = [str(i) for i in range(1, k + 1)]
+    return {
+        "title": title,
+        "type": "object",
+        "properties": {key: value_schema for key in keys},
+        "required": keys,
+        "additionalProperties": False,
+    }
+
+
+YN_VERDICT = {"type": "string", "enum": ["TAK", "NIE"]}
+MCQ_VERDICT = _LETTERS
+
+
+def output_format(schema: dict, default=None):
+    """Schemat do `format` w ask_llm; LLM_JSON_SCHEMA=0 -> stare zachowanie (`default`)."""
+    return schema if settings.llm_json_schema else default
@@ -1,5 +1,7 @@
-import sqlite3, numpy as np, re
+import numpy as np, re
 from ..settings import settings
+from . import rerank
+from .store import connection
 
 _HEADER_PATTERNS = [
     re.compile(r"\b\d+\s*/\s*\d+\b"),
@@ -63,10 +65,89 @@ def _load_all(con):
     n_chunks = mat.shape[0]
     return mat, ids, src, page, text, quote, w, src_map, n_chunks
 
-def rag_search(query: str, k: int, db_path: str):
+def _attach_sentences(con, out: list[dict], qv: np.ndarray | None, per_chunk: int, max_chars: int = 240) -> None:
+    """Zamienia quote każdego wyniku na najtrafniejsze zdania chunka (indeks sentences).
+
+    qv=None (bez zapytania, np. konteksty z klastrów): pierwsze per_chunk zdań chunka.
+    Zdania zostają w kolejności z tekstu; źródło/strona (cytowanie) to nadal chunk-rodzic.
+    Chunki bez zdań w indeksie zostają ze zwykłym snippetem.
+    """
+    if not out:
+        return
+    ids = [r["chunk_id"] for r in out]
+    placeholders = ",".join(["?"] * len(ids))
+    cur = con.cursor()
+    cur.execute(
+        f"SELECT chunk_id, idx, text, embedding FROM sentences WHERE chunk_id IN ({placeholders})",
+        ids,
+    )
+    by_chunk: dict[int, list] = {}
+    for cid, idx, text, emb in cur.fetchall():
+        by_chunk.setdefault(int(cid), []).append((int(idx), text, np.frombuffer(emb, dtype=np.float32)))
+
+    for r in out:
+        sents = by_chunk.get(r["chunk_id"])
+        if not sents:
+            continue
+        if qv is None:
+            top = sorted(range(len(sents)), key=lambda j: sents[j][0])[:per_chunk]
+        else:
+            sims = np.vstack([e for _, _, e in sents]) @ qv
+            top = sorted(np.argsort(-sims)[:per_chunk], key=lambda j: sents[j][0])
+        picked: list[str] = []
+        size = 0
+        for j in top:
+            t = sents[j][1]
+            if picked and size + len(t) + 1 > max_chars:
+                continue
+            picked.append(t[:max_chars])
+            size += len(t) + 1
+        r["sentences"] = picked
+        r["quote"] = " ".join(picked)
+
+
+def mmr_select(vecs: np.ndarray, rel: np.ndarray, k: int, lam: float) -> list[int]:
+    """Maximal marginal relevance: k indeksów, kolejno argmax(lam*rel - (1-lam)*max_sim_do_wybranych).
+
+    vecs: znormalizowane embeddingi kandydatów (N, d); rel: trafność (N,).
+    Jedna iteracja = jeden iloczyn macierz-wektor, więc całość O(k*N*d).
+    """
+    n = int(vecs.shape[0])
+    k = max(0, min(int(k), n))
+    if k == 0:
+        return []
+    chosen: list[int] = []
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    free = np.ones(n, dtype=bool)
+    for _ in range(k):
+        red = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        score = lam * rel - (1.0 - lam) * red
+        score[~free] = -np.inf
+        j = int(np.argmax(score))
+        chosen.append(j)
+        free[j] = False
+        max_sim = np.maximum(max_sim, vecs @ vecs[j])
+    return chosen
+
+
+def rag_search(
+    query: str,
+    k: int,
+    db_path: str,
+    sentences: int = 0,
+    diversity: float = 0.0,
+    groups: int = 0,
+):
+    """Top-k chunków dla zapytania.
+
+    sentences > 0: quote = tyle najtrafniejszych zdań z chunka (krótszy kontekst do generowania).
+    diversity ∈ (0, 1]: wybór MMR z szerszej puli kandydatów (waga kary za podobieństwo do
+      już wybranych) — nakładające się chunki / powtórzone slajdy nie wypełniają wyników.
+    groups > 0 (z diversity): pierwsze `groups` wyników MMR to zarodki grup kontekstu,
+      każdy wynik dostaje "group" = najbliższy zarodek (różne grupy -> różne pytania).
+    """
     global _CACHE
-    con = sqlite3.connect(db_path)
-    try:
+    with connection(db_path) as con:
         cur = con.cursor()
 
         # cache warm / invalidate if chunk count changed
@@ -86,7 +167,28 @@ def rag_search(query: str, k: int, db_path: str):
         sims = mat @ qv
         sims = sims * (1.0 + w)
 
-        idx = np.argsort(-sims)[: max(k * 3, k)]
+        order = np.argsort(-sims)
+        idx = order[: max(k * 3, k)]
+        scores = sims
+        if rerank.enabled() and len(idx) > 0:
+            # cross-encoder na puli top wg cosinusa (co najmniej pula MMR 3k); dalej kolejność
+            # i score z rerankera
+            pool = order[: max(k * 3, settings.rerank_pool)]
+            rs = rerank.score(query, [text[i] for i in pool])
+            if rs is not None:
+                keep = rerank.cutoff(rs, [_pick_snippet(quote[i], text[i]) for i in pool], k)
+                idx = pool[keep]
+                scores = np.zeros_like(sims)
+                scores[pool] = rs
+        group_of: dict[int, int] = {}
+        if diversity > 0 and len(idx) > 0:
+            cand = mat[idx]
+            pick = mmr_select(cand, scores[idx], k, lam=1.0 - min(1.0, float(diversity)))
+            if groups > 0:
+                seeds = cand[pick[: max(1, int(groups))]]
+                assign = np.argmax(cand[pick] @ seeds.T, axis=1)
+                group_of = {int(idx[p]): int(g) for p, g in zip(pick, assign)}
+            idx = idx[pick]
         out = []
         for i in idx:
             fname = src_map.get(int(src[i]), "unknown")
@@ -98,10 +200,12 @@ def rag_search(query: str, k: int, db_path: str):
                 "page": int(page[i]),
                 "quote": snippet,
                 "text": text[i],
-                "score": float(sims[i]),
+                "score": float(scores[i]),
             })
+            if group_of:
+                out[-1]["group"] = group_of[int(i)]
             if len(out) >= k:
                 break
+        if sentences > 0:
+            _attach_sentences(con, out, qv, per_chunk=sentences)
         return out
-    finally:
-        con.close()
@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from ..settings import settings
+from .. import metrics
+from .emb import get_model
+from .store import list_question_stems, question_topic_key
+
+# Indeks wektorowy zapisanych stemów per (kind, topic) — odrzuca parafrazy pytań,
+# które fingerprint (dokładne dopasowanie po normalizacji) przepuszcza.
+# Sprawdzany zaraz po walidacji składni, przed semantic checkiem (oszczędza wywołanie LLM).
+# Ładowany leniwie z bazy przy pierwszym użyciu klucza, uzupełniany po zapisie pytania.
+
+
+# klucz tematu = to samo co questions.topic (brak tematu -> "general"), żeby indeks
+# ładowany z bazy po restarcie widział pytania zapisane bez tematu
+_topic_key = question_topic_key
+
+# embeddingi stemów kandydatów (`extra` w batchu sprawdzane wielokrotnie)
+_EMB_CACHE_MAX = 512
+
+
+def _embed(stems: list[str]) -> np.ndarray:
+    m = get_model(settings.emb_model)
+    vecs = m.encode(stems, normalize_embeddings=True)
+    return np.asarray(vecs, dtype=np.float32).reshape(len(stems), -1)
+
+
+class StemIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._vecs: dict[tuple[str, str], np.ndarray] = {}
+        self._emb_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def _embed_cached(self, stems: list[str]) -> np.ndarray:
+        with self._lock:
+            missing = [s for s in dict.fromkeys(stems) if s not in self._emb_cache]
+        if missing:
+            vecs = _embed(missing)
+            with self._lock:
+                for s, v in zip(missing, vecs):
+                    self._emb_cache[s] = v
+                while len(self._emb_cache) > _EMB_CACHE_MAX:
+                    self._emb_cache.popitem(last=False)
+        with self._lock:
+            out = []
+            for s in stems:
+                v = self._emb_cache.get(s)
+                if v is None:
+                    # wypadło z LRU przy równoległym użyciu
+                    v = _embed([s])[0]
+                else:
+                    self._emb_cache.move_to_end(s)
+                out.append(v)
+        return np.vstack(out).astype(np.float32, copy=False)
+
+    def _load(self, kind: str, topic: str) -> np.ndarray:
+        stems = list_question_stems(self.db_path, kind=kind, topic=topic)
+        if not stems:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _embed(stems)
+
+    def _matrix(self, kind: str, topic: str) -> np.ndarray:
+        key = (kind, topic)
+        with self._lock:
+            mat = self._vecs.get(key)
+        if mat is None:
+            mat = self._load(kind, topic)
+            with self._lock:
+                # równoległy load/add — zostaw to, co już jest (add dopisuje do istniejącej macierzy)
+                mat = self._vecs.setdefault(key, mat)
+        return mat
+
+    def max_similarity(self, kind: str, topic: str | None, stem: str, extra: list[str] | None = None) -> float:
+        """Największe podobieństwo cosinusowe stemu do zapisanych (+ `extra`, np. z tego samego batcha)."""
+        if not stem:
+            return 0.0
+        mat = self._matrix(kind, _topic_key(topic))
+        extra = [x for x in (extra or []) if x]
+        if extra:
+            ev = self._embed_cached(extra)
+            mat = ev if mat.size == 0 else np.vstack([mat, ev])
+        if mat.size == 0:
+            return 0.0
+        v = self._embed_cached([stem])[0]
+        return float(np.max(mat @ v))
+
+    def add(self, kind: str, topic: str | None, stem: str) -> None:
+        key = (kind, _topic_key(topic))
+        with self._lock:
+            mat = self._vecs.get(key)
+        if mat is None or not stem:
+            # klucz jeszcze nie załadowany — i tak wczyta stem z bazy
+            return
+        v = _embed([stem])
+        with self._lock:
+            mat = self._vecs.get(key)
+            if mat is not None:
+                self._vecs[key] = v if mat.size == 0 else np.vstack([mat, v])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._vecs), "stems": sum(int(m.shape[0]) for m in self._vecs.values())}
+
+
+_indexes: dict[str, StemIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_stem_index(db_path: str | None = None) -> StemIndex:
+    path = db_path or settings.db_path
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = StemIndex(path)
+        return _indexes[path]
+
+
+def reset_stem_index(db_path: str | None = None) -> None:
+    with _indexes_lock:
+        _indexes.pop(db_path or settings.db_path, None)
+
+
+def is_near_duplicate(kind: str, topic: str | None, stem: str, extra: list[str] | None = None) -> bool:
+    """True, gdy stem jest parafrazą zapisanego pytania (próg STEM_DUP_THRESHOLD; 0 = wyłączone)."""
+    thr = settings.stem_dup_threshold
+    if thr <= 0:
+        return False
+    sim = get_stem_index().max_similarity(kind, topic, stem, extra=extra)
+    metrics.observe("stem_index.max_sim", sim)
+    if sim >= thr:
+        metrics.inc("stem_index.rejected")
+        return True
+    return False
+
+
+def remember_stem(kind: str, topic: str | None, stem: str) -> None:
+    if settings.stem_dup_threshold > 0:
+        get_stem_index().add(kind, topic, stem)
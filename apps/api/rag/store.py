@@ -1,4 +1,5 @@
-import sqlite3, json, os, hashlib, re
+import sqlite3, json, os, hashlib, re, threading, base64, weakref
+from contextlib import contextmanager
 
 # -----------------------------
 # Question de-duplication
@@ -41,6 +42,44 @@ def get_question_id_by_fingerprint(fingerprint: str, db_path: str) -> str | None
         con.close()
 
 
+# Zbiór fingerprintów w pamięci procesu (per plik bazy): test "czy duplikat" w pętli
+# generowania bez otwierania połączenia. Ładowany raz, uzupełniany przy zapisie;
+# ostatecznym arbitrem pozostaje UNIQUE index na questions.fingerprint.
+_fp_sets: dict[str, set[str]] = {}
+_fp_lock = threading.Lock()
+
+
+def _fingerprints(db_path: str) -> set[str]:
+    with _fp_lock:
+        fps = _fp_sets.get(db_path)
+        if fps is None:
+            con = _connect(db_path)
+            try:
+                cur = con.cursor()
+                cur.execute("SELECT fingerprint FROM questions WHERE fingerprint IS NOT NULL AND fingerprint<>''")
+                fps = {str(r[0]) for r in cur.fetchall()}
+            finally:
+                con.close()
+            _fp_sets[db_path] = fps
+        return fps
+
+
+def question_fingerprint_exists(fingerprint: str, db_path: str) -> bool:
+    """Czy pytanie o tym fingerprincie jest już w bazie (bez zapytania do SQLite)."""
+    if not fingerprint:
+        return False
+    return fingerprint in _fingerprints(db_path)
+
+
+def reset_fingerprint_cache(db_path: str | None = None) -> None:
+    """Unieważnia zbiór fingerprintów (po resecie bazy / zmianie fingerprintów poza store)."""
+    with _fp_lock:
+        if db_path is None:
+            _fp_sets.clear()
+        else:
+            _fp_sets.pop(db_path, None)
+
+
 def list_recent_question_stems(
     db_path: str, kind: str, topic: str | None = None, limit: int = 40
 ) -> list[str]:
@@ -83,6 +122,58 @@ def list_recent_question_stems(
         con.close()
 
 
+def list_question_stems(db_path: str, kind: str, topic: str | None = None) -> list[str]:
+    """Wszystkie stemy danego rodzaju dla tematu (bez wielkości liter; None/'' = DEFAULT_TOPIC)."""
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT stem FROM questions WHERE kind=? AND topic=?",
+            (kind, question_topic_key(topic)),
+        )
+        return [r[0] for r in cur.fetchall() if r and r[0]]
+    finally:
+        con.close()
+
+
+def _norm_topic(topic: str | None) -> str:
+    """Temat w kolumnie questions.topic / filtrach: bez spacji na brzegach, małymi literami."""
+    return (topic or "").strip().lower()
+
+
+# metadata.topic pytań generowanych bez tematu (generate._meta)
+DEFAULT_TOPIC = "general"
+
+
+def question_topic_key(topic: str | None) -> str:
+    """Temat tak, jak ląduje w questions.topic po zapisie (brak tematu -> DEFAULT_TOPIC)."""
+    return _norm_topic(topic) or DEFAULT_TOPIC
+
+
+def backfill_questions_topic(db_path: str) -> dict:
+    """Uzupełnia kolumny topic/difficulty z metadata dla starych pytań (po dodaniu kolumn)."""
+    con = _connect(db_path)
+    updated = 0
+    try:
+        cur = con.cursor()
+        cur.execute("SELECT id, metadata FROM questions WHERE topic IS NULL")
+        rows = cur.fetchall()
+        for qid, metadata in rows:
+            meta = _json_loads_or_none(metadata)
+            meta = meta if isinstance(meta, dict) else {}
+            cur.execute(
+                "UPDATE questions SET topic=?, difficulty=? WHERE id=?",
+                (_norm_topic(meta.get("topic")), _norm_topic(meta.get("difficulty")), qid),
+            )
+            updated += 1
+        con.commit()
+        if updated:
+            reset_questions_total_cache(db_path)
+        return {"updated": updated}
+    finally:
+        con.close()
+
+
 def backfill_questions_fingerprint(db_path: str) -> dict:
     """Uzupełnia fingerprint dla starych pytań (po dodaniu kolumny)."""
     con = _connect(db_path)
@@ -102,19 +193,138 @@ def backfill_questions_fingerprint(db_path: str) -> dict:
             updated += 1
 
         con.commit()
+        if updated:
+            reset_fingerprint_cache(db_path)
         return {"updated": updated}
     finally:
         con.close()
 
 
+# -----------------------------
+# Pula połączeń
+# -----------------------------
+# Połączenia per (wątek, baza), skonfigurowane raz (PRAGMA) i z cache prepared statements;
+# close() oddaje połączenie do puli wątku zamiast je zamykać. Zagnieżdżone _connect w tym
+# samym wątku dostają osobne połączenia (jak wcześniej), więc transakcje się nie mieszają.
+# Pula wątku siedzi w threading.local: po zakończeniu wątku (workery threadpoola, executory
+# hedgingu) znika razem z jego połączeniami, a nowy wątek o tym samym ident nie dostaje cudzych.
+
+_POOL_IDLE_MAX = 4          # wolnych połączeń per (wątek, baza)
+_STATEMENT_CACHE = 256      # prepared statements per połączenie (domyślnie sqlite3: 128)
+
+
+class _ThreadPool:
+    """Wolne połączenia jednego wątku: db_path -> lista."""
+
+    __slots__ = ("idle", "__weakref__")
+
+    def __init__(self):
+        self.idle: dict[str, list["_PooledConnection"]] = {}
+
+
+_pool_lock = threading.Lock()
+_pool_local = threading.local()
+# pule żywych wątków (dla reset_connection_pool); wpis znika z wątkiem
+_pool_all: "weakref.WeakSet[_ThreadPool]" = weakref.WeakSet()
+_pool_gen = 0
+
+
+def _thread_pool() -> _ThreadPool:
+    tp = getattr(_pool_local, "pool", None)
+    if tp is None:
+        tp = _pool_local.pool = _ThreadPool()
+        with _pool_lock:
+            _pool_all.add(tp)
+    return tp
+
+
+class _PooledConnection(sqlite3.Connection):
+    """Połączenie z puli: close() cofa niezatwierdzone zmiany i oddaje je do puli wątku."""
+
+    _pool_db: str | None = None
+    _pool_gen = -1
+
+    def close(self) -> None:
+        try:
+            if self.in_transaction:
+                self.rollback()
+        except sqlite3.Error:
+            super().close()
+            return
+        tp = _thread_pool()
+        with _pool_lock:
+            idle = tp.idle.setdefault(self._pool_db, [])
+            if self._pool_gen == _pool_gen and len(idle) < _POOL_IDLE_MAX:
+                idle.append(self)
+                return
+        super().close()
+
+
 def _connect(db_path: str) -> sqlite3.Connection:
-    con = sqlite3.connect(db_path, timeout=30.0)
+    tp = _thread_pool()
+    with _pool_lock:
+        idle = tp.idle.get(db_path)
+        if idle:
+            return idle.pop()
+        gen = _pool_gen
+    # check_same_thread=False: reset_connection_pool zamyka wolne połączenia z dowolnego wątku;
+    # w użyciu połączenie i tak należy do jednego wątku (pula wątku)
+    con = sqlite3.connect(
+        db_path,
+        timeout=30.0,
+        factory=_PooledConnection,
+        cached_statements=_STATEMENT_CACHE,
+        check_same_thread=False,
+    )
     con.execute("PRAGMA foreign_keys=ON;")  # <--- DODAJ TO
     con.execute("PRAGMA journal_mode=WAL;")
     con.execute("PRAGMA busy_timeout=30000;")
+    con._pool_db, con._pool_gen = db_path, gen
     return con
 
 
+def reset_connection_pool() -> None:
+    """Zamyka wolne połączenia (np. przed usunięciem pliku bazy); używane wrócą i zostaną zamknięte."""
+    global _pool_gen
+    with _pool_lock:
+        _pool_gen += 1
+        conns = []
+        for tp in list(_pool_all):
+            for idle in tp.idle.values():
+                conns.extend(idle)
+            tp.idle.clear()
+    for c in conns:
+        sqlite3.Connection.close(c)
+
+
+@contextmanager
+def connection(db_path: str):
+    """Połączenie z puli na czas bloku (odczyty)."""
+    con = _connect(db_path)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+@contextmanager
+def transaction(db_path: str, immediate: bool = False):
+    """Transakcja na połączeniu z puli: commit po bloku, rollback przy wyjątku.
+
+    immediate=True: BEGIN IMMEDIATE (blokada zapisu od razu, np. wydawanie z puli pytań).
+    """
+    con = _connect(db_path)
+    try:
+        con.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        yield con
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
 def init_db(db_path: str):
     """Tworzy/aktualizuje schemat DB.
 
@@ -123,6 +333,10 @@ def init_db(db_path: str):
     con = _connect(db_path)
     try:
         cur = con.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_stats'")
+        had_stats = cur.fetchone() is not None
+        # question_quality: stary widok (GROUP BY po ratings) -> odtwarzany z schema.sql
+        cur.execute("DROP VIEW IF EXISTS question_quality")
         cur.executescript(open("apps/api/sql/schema.sql", "r", encoding="utf-8").read())
 
         # --- migracje lekkie (dla istniejących baz) ---
@@ -137,6 +351,27 @@ def init_db(db_path: str):
         if "fingerprint" not in qcols:
             cur.execute("ALTER TABLE questions ADD COLUMN fingerprint TEXT")
         cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_fingerprint ON questions(fingerprint)")
+        # pytania: topic/difficulty z metadata jako kolumny (filtr + keyset bez json_extract);
+        # NULL = jeszcze nie uzupełnione (backfill_questions_topic)
+        if "topic" not in qcols:
+            cur.execute("ALTER TABLE questions ADD COLUMN topic TEXT")
+        if "difficulty" not in qcols:
+            cur.execute("ALTER TABLE questions ADD COLUMN difficulty TEXT")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_kind_topic ON questions(kind, topic, created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_created ON questions(created_at, id)")
+        # filtr po samym temacie (bez kind) -> bez tego skan po created_at z filtrem
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions(topic, created_at, id)")
+        # pula pytań: klucz tematu jak questions.topic (stare wpisy z wielkimi literami)
+        cur.execute(
+            "UPDATE question_pool SET topic=lower(trim(topic)), difficulty=lower(trim(difficulty)) "
+            "WHERE topic<>lower(trim(topic)) OR difficulty<>lower(trim(difficulty))"
+        )
+        # oceny: question_stats nowa -> jednorazowo z istniejących ratings (dalej triggery)
+        if not had_stats:
+            cur.execute(
+                """INSERT OR IGNORE INTO question_stats(question_id, rating_sum, votes)
+                   SELECT question_id, SUM(score), COUNT(*) FROM ratings GROUP BY question_id"""
+            )
 
         con.commit()
     finally:
@@ -146,14 +381,9 @@ def get_source_id_by_sha256(sha256: str, db_path: str) -> int | None:
     """Zwraca id źródła, jeśli w bazie jest plik o tym sha256."""
     if not sha256:
         return None
-    con = _connect(db_path)
-    try:
-        cur = con.cursor()
-        cur.execute("SELECT id FROM sources WHERE sha256=? LIMIT 1", (sha256,))
-        row = cur.fetchone()
+    with connection(db_path) as con:
+        row = con.execute("SELECT id FROM sources WHERE sha256=? LIMIT 1", (sha256,)).fetchone()
         return int(row[0]) if row else None
-    finally:
-        con.close()
 
 def _sha256_file(path: str) -> str:
     h = hashlib.sha256()
@@ -184,15 +414,16 @@ def backfill_sources_sha256(src_dir: str, db_path: str) -> dict:
     finally:
         con.close()
 
-def save_question_with_citations(qid: str, q: dict, db_path: str, fingerprint: str | None = None):
+def save_question_with_citations(qid: str, q: dict, db_path: str, fingerprint: str | None = None) -> bool:
+    """Zapisuje pytanie z cytowaniami. False = duplikat (fingerprint już w bazie)."""
     fp = fingerprint or make_question_fingerprint(q["kind"], q["stem"], q.get("options"))
 
-    con = _connect(db_path)
-    try:
+    with transaction(db_path) as con:
         cur = con.cursor()
         cur.execute(
-            """INSERT INTO questions(id,kind,stem,options,answer,explanation,metadata,fingerprint,created_at)
-               VALUES(?,?,?,?,?,?,?,?,datetime('now'))""",
+            """INSERT INTO questions(id,kind,stem,options,answer,explanation,metadata,fingerprint,topic,difficulty,created_at)
+               VALUES(?,?,?,?,?,?,?,?,?,?,datetime('now'))
+               ON CONFLICT(fingerprint) DO NOTHING""",
             (
                 qid,
                 q["kind"],
@@ -202,82 +433,195 @@ def save_question_with_citations(qid: str, q: dict, db_path: str, fingerprint: s
                 q["explanation"],
                 json.dumps(q["metadata"]),
                 fp,
+                _norm_topic(q["metadata"].get("topic")),
+                _norm_topic(q["metadata"].get("difficulty")),
             ),
         )
+        if cur.rowcount == 0:
+            # UNIQUE(fingerprint) — np. wyścig dwóch requestów; zbiór w pamięci nadrabia.
+            # Inne naruszenia (NOT NULL, PK) nie są duplikatem -> IntegrityError do wołającego
+            con.rollback()
+            _fingerprints(db_path).add(fp)
+            return False
         for c in q["citations"]:
             cur.execute(
                 """INSERT OR IGNORE INTO question_citations(question_id,source_id,page,quote)
                    SELECT ?, id, ?, ? FROM sources WHERE filename=?""",
                 (qid, c["page"], c["quote"], c["source"]),
             )
-        con.commit()
-    finally:
-        con.close()
+    _fingerprints(db_path).add(fp)
+    reset_questions_total_cache(db_path)
+    return True
 
 
-def insert_rating(qid: str, score: int, feedback: str | None, db_path: str):
-    score = max(1, min(10, int(score)))
+def _pool_key(topic: str | None, difficulty: str | None) -> tuple[str, str]:
+    """Klucz puli jak questions.topic / filtr /questions: "Grafy" i "grafy" to ta sama pula."""
+    return _norm_topic(topic), _norm_topic(difficulty)
 
-    con = _connect(db_path)
-    try:
+
+def add_to_question_pool(db_path: str, qids: list[str], kind: str, topic: str | None, difficulty: str | None) -> int:
+    """Dodaje zapisane pytania do puli (do wydania później przez /gen/*)."""
+    if not qids:
+        return 0
+    t, d = _pool_key(topic, difficulty)
+    with transaction(db_path) as con:
         cur = con.cursor()
+        cur.executemany(
+            """INSERT OR IGNORE INTO question_pool(question_id,kind,topic,difficulty,created_at)
+               VALUES(?,?,?,?,datetime('now'))""",
+            [(qid, kind, t, d) for qid in qids],
+        )
+        return cur.rowcount
 
-        # 1) zapisz rating
+
+def take_pooled_questions(db_path: str, kind: str, topic: str | None, difficulty: str | None, n: int) -> list[str]:
+    """Wydaje do n pytań z puli (najstarsze pierwsze) i oznacza je jako wydane."""
+    n = max(0, int(n))
+    if n == 0:
+        return []
+    t, d = _pool_key(topic, difficulty)
+    # IMMEDIATE: dwa równoległe requesty nie dostaną tego samego pytania
+    with transaction(db_path, immediate=True) as con:
+        cur = con.cursor()
         cur.execute(
-            """INSERT INTO ratings(question_id,score,feedback,created_at)
-               VALUES(?,?,?,datetime('now'))""",
-            (qid, score, feedback),
+            """
+            SELECT question_id
+            FROM question_pool
+            WHERE kind=? AND topic=? AND difficulty=? AND served_at IS NULL
+            ORDER BY created_at ASC, rowid ASC
+            LIMIT ?
+            """,
+            (kind, t, d, n),
         )
+        qids = [str(r[0]) for r in cur.fetchall()]
+        if qids:
+            placeholders = ",".join(["?"] * len(qids))
+            cur.execute(
+                f"UPDATE question_pool SET served_at=datetime('now') WHERE question_id IN ({placeholders})",
+                qids,
+            )
+        return qids
 
-        # 2) delta (ciągła, „czuć” efekt)
-        # 10 -> +0.27, 1 -> -0.27, 6 -> ~+0.03
-        delta = (score - 5.5) * 0.06
-        if abs(delta) < 1e-9:
-            con.commit()
-            return
 
-        # 3) znajdź chunki z tych samych (source_id, page) co cytowania pytania
+def question_pool_stock(db_path: str) -> list[dict]:
+    """Stan puli per (kind, topic, difficulty): dostępne i wydane."""
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
         cur.execute(
             """
-            SELECT DISTINCT c.id
-            FROM chunks c
-            JOIN question_citations qc
-              ON qc.question_id = ?
-             AND qc.source_id = c.source_id
-             AND qc.page = c.page
-            """,
-            (qid,),
+            SELECT kind, topic, difficulty,
+                   SUM(CASE WHEN served_at IS NULL THEN 1 ELSE 0 END) AS available,
+                   SUM(CASE WHEN served_at IS NULL THEN 0 ELSE 1 END) AS served
+            FROM question_pool
+            GROUP BY kind, topic, difficulty
+            """
         )
-        chunk_ids = [int(r[0]) for r in cur.fetchall()]
-        if not chunk_ids:
-            con.commit()
-            return
+        return [
+            {"kind": r[0], "topic": r[1], "difficulty": r[2], "available": int(r[3] or 0), "served": int(r[4] or 0)}
+            for r in cur.fetchall()
+        ]
+    finally:
+        con.close()
+
+
+def rating_delta(score: int) -> float:
+    """Zmiana wagi chunków za ocenę (ciągła, „czuć” efekt): 10 -> +0.27, 1 -> -0.27, 6 -> ~+0.03."""
+    return (max(1, min(10, int(score))) - 5.5) * 0.06
+
+
+def existing_question_ids(db_path: str, qids: list[str]) -> set[str]:
+    """Które z podanych id pytań są w bazie."""
+    ids = sorted({q for q in qids if q})
+    if not ids:
+        return set()
+    out: set[str] = set()
+    with connection(db_path) as con:
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join(["?"] * len(part))
+            cur = con.execute(f"SELECT id FROM questions WHERE id IN ({placeholders})", part)
+            out.update(str(r[0]) for r in cur.fetchall())
+    return out
+
+
+def apply_ratings(db_path: str, ratings: list[tuple[str, int, str | None]]) -> dict:
+    """Zapisuje paczkę ocen i wagi chunków w jednej transakcji.
+
+    Delty wag są sumowane per chunk (wiele ocen tego samego materiału = jeden UPDATE),
+    clamp stosowany raz do sumy. Oceny nieistniejących pytań są pomijane.
+    """
+    if not ratings:
+        return {"ratings": 0, "chunks": 0}
+    rows = [(qid, max(1, min(10, int(score))), feedback) for qid, score, feedback in ratings]
+
+    with transaction(db_path) as con:
+        cur = con.cursor()
+
+        # 1) zapisz ratingi (question_stats aktualizują triggery)
+        cur.executemany(
+            """INSERT INTO ratings(question_id,score,feedback,created_at)
+               SELECT ?, ?, ?, datetime('now') WHERE EXISTS (SELECT 1 FROM questions WHERE id=?)""",
+            [(qid, score, feedback, qid) for qid, score, feedback in rows],
+        )
+        saved = cur.rowcount
+
+        # 2) delta per pytanie (suma, gdy pytanie oceniono kilka razy)
+        q_delta: dict[str, float] = {}
+        for qid, score, _ in rows:
+            q_delta[qid] = q_delta.get(qid, 0.0) + rating_delta(score)
+        q_delta = {q: d for q, d in q_delta.items() if abs(d) >= 1e-9}
+        if not q_delta:
+            return {"ratings": saved, "chunks": 0}
+
+        # 3) chunki z tych samych (source_id, page) co cytowania pytań
+        #    (+ zdeduplikowane chunki, które mają tę lokalizację w chunk_provenance)
+        chunk_delta: dict[int, float] = {}
+        qids = list(q_delta)
+        for i in range(0, len(qids), 400):
+            part = qids[i:i + 400]
+            placeholders = ",".join(["?"] * len(part))
+            cur.execute(
+                f"""
+                SELECT qc.question_id, c.id
+                FROM question_citations qc
+                JOIN chunks c
+                  ON qc.source_id = c.source_id
+                 AND qc.page = c.page
+                WHERE qc.question_id IN ({placeholders})
+                UNION
+                SELECT qc.question_id, cp.chunk_id
+                FROM question_citations qc
+                JOIN chunk_provenance cp
+                  ON qc.source_id = cp.source_id
+                 AND qc.page = cp.page
+                WHERE qc.question_id IN ({placeholders})
+                """,
+                (*part, *part),
+            )
+            for qid, cid in cur.fetchall():
+                chunk_delta[int(cid)] = chunk_delta.get(int(cid), 0.0) + q_delta[str(qid)]
+        if not chunk_delta:
+            return {"ratings": saved, "chunks": 0}
 
         # 4) upewnij się, że chunk_weights ma rekordy (inaczej UPDATE nic nie zmieni)
         cur.executemany(
             "INSERT OR IGNORE INTO chunk_weights(chunk_id, weight) VALUES(?, 0.0)",
-            [(cid,) for cid in chunk_ids],
+            [(cid,) for cid in chunk_delta],
         )
 
         # 5) update z clampem (żeby (1+w) nie spadło do zera/negatywu i nie wystrzeliło w kosmos)
         # w ∈ [-0.75, +1.50] => mnożnik (1+w) ∈ [0.25, 2.50]
-        placeholders = ",".join(["?"] * len(chunk_ids))
-        cur.execute(
-            f"""
-            UPDATE chunk_weights
-            SET weight = CASE
-              WHEN weight + ? > 1.50 THEN 1.50
-              WHEN weight + ? < -0.75 THEN -0.75
-              ELSE weight + ?
-            END
-            WHERE chunk_id IN ({placeholders})
-            """,
-            (delta, delta, delta, *chunk_ids),
+        cur.executemany(
+            "UPDATE chunk_weights SET weight = MIN(1.50, MAX(-0.75, weight + ?)) WHERE chunk_id = ?",
+            [(d, cid) for cid, d in chunk_delta.items()],
         )
+        return {"ratings": saved, "chunks": len(chunk_delta)}
 
-        con.commit()
-    finally:
-        con.close()
+
+def insert_rating(qid: str, score: int, feedback: str | None, db_path: str):
+    """Jedna ocena synchronicznie (bez kolejki write-behind)."""
+    apply_ratings(db_path, [(qid, score, feedback)])
 
 def list_sources(db_path: str, limit: int = 1000, offset: int = 0) -> dict:
     """Zwraca listę źródeł z DB (z paginacją) + total."""
@@ -346,8 +690,7 @@ def get_question(question_id: str, db_path: str, with_quality: bool = True) -> d
     if not question_id:
         return None
 
-    con = _connect(db_path)
-    try:
+    with connection(db_path) as con:
         cur = con.cursor()
 
         if with_quality:
@@ -355,10 +698,10 @@ def get_question(question_id: str, db_path: str, with_quality: bool = True) -> d
                 """
                 SELECT
                   q.id, q.kind, q.stem, q.options, q.answer, q.explanation, q.metadata, q.created_at,
-                  COALESCE(qq.avg_score, NULL) AS avg_score,
-                  COALESCE(qq.votes, 0) AS votes
+                  CASE WHEN qs.votes > 0 THEN ROUND(1.0 * qs.rating_sum / qs.votes, 2) END AS avg_score,
+                  COALESCE(qs.votes, 0) AS votes
                 FROM questions q
-                LEFT JOIN question_quality qq ON qq.question_id = q.id
+                LEFT JOIN question_stats qs ON qs.question_id = q.id
                 WHERE q.id=?
                 LIMIT 1
                 """,
@@ -414,8 +757,35 @@ def get_question(question_id: str, db_path: str, with_quality: bool = True) -> d
                 "votes": int(votes or 0),
             }
         return out
-    finally:
-        con.close()
+
+
+# Cache COUNT(*) dla /questions per (baza, kind, topic, difficulty): przy głębokim
+# stronicowaniu total liczony raz, unieważniany przy zapisie pytania.
+_total_cache: dict[tuple, int] = {}
+_total_lock = threading.Lock()
+
+
+def reset_questions_total_cache(db_path: str | None = None) -> None:
+    with _total_lock:
+        if db_path is None:
+            _total_cache.clear()
+        else:
+            for key in [k for k in _total_cache if k[0] == db_path]:
+                del _total_cache[key]
+
+
+def _encode_cursor(created_at: str, qid: str) -> str:
+    raw = json.dumps([created_at, qid], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, qid = json.loads(raw)
+        return str(created_at), str(qid)
+    except Exception:
+        return None
 
 
 def list_questions(
@@ -426,8 +796,16 @@ def list_questions(
     topic: str | None = None,          # <-- NOWE
     with_citations: bool = True,
     with_quality: bool = True,
+    difficulty: str | None = None,
+    cursor: str | None = None,
+    with_total: bool = True,
 ) -> dict:
-    """Zwraca listę pytań zapisanych w DB (z paginacją)."""
+    """Zwraca listę pytań zapisanych w DB (z paginacją).
+
+    cursor: keyset (next_cursor z poprzedniej strony) zamiast offset — głębokie strony
+    idą po indeksie (kind, topic, created_at, id) / (topic, created_at, id) bez przewijania OFFSET.
+    with_total=False: bez COUNT (total=None); inaczej total z cache.
+    """
     limit = max(1, min(int(limit), 5000))
     offset = max(0, int(offset))
 
@@ -435,7 +813,11 @@ def list_questions(
     if k not in {"", "YN", "MCQ"}:
         k = ""  # ignoruj niepoprawny filtr
 
-    t = (topic or "").strip().lower()
+    t = _norm_topic(topic)
+    d = _norm_topic(difficulty)
+    after = _decode_cursor(cursor) if cursor else None
+    if cursor and after is None:
+        raise ValueError("invalid_cursor")
 
     con = _connect(db_path)
     try:
@@ -448,37 +830,35 @@ def list_questions(
         if k:
             where.append("q.kind=?")
             params.append(k)
-
-        # topic: preferuj JSON_EXTRACT, a jak SQLite nie ma JSON1 -> fallback LIKE
-        use_json_extract = bool(t)
         if t:
-            where.append("LOWER(json_extract(q.metadata,'$.topic')) = ?")
+            where.append("q.topic=?")
             params.append(t)
+        if d:
+            where.append("q.difficulty=?")
+            params.append(d)
 
         where_sql = ("WHERE " + " AND ".join(where) + " ") if where else ""
 
-        # --- total ---
-        try:
-            cur.execute(f"SELECT COUNT(*) FROM questions q {where_sql}", tuple(params))
-            total = int(cur.fetchone()[0] or 0)
-        except sqlite3.OperationalError:
-            # fallback: JSON_EXTRACT niedostępny -> LIKE na JSON stringu
-            if t and use_json_extract:
-                where = [w for w in where if "json_extract" not in w]
-                params = [p for p in params if p != t]
-                where.append("LOWER(q.metadata) LIKE ?")
-                params.append(f'%"topic": "{t}"%')
-                where_sql = ("WHERE " + " AND ".join(where) + " ") if where else ""
-            cur.execute(f"SELECT COUNT(*) FROM questions q {where_sql}", tuple(params))
-            total = int(cur.fetchone()[0] or 0)
+        # --- total (cache) ---
+        total = None
+        if with_total:
+            key = (db_path, k, t, d)
+            with _total_lock:
+                total = _total_cache.get(key)
+            if total is None:
+                cur.execute(f"SELECT COUNT(*) FROM questions q {where_sql}", tuple(params))
+                total = int(cur.fetchone()[0] or 0)
+                with _total_lock:
+                    _total_cache[key] = total
 
         # --- lista ---
         if with_quality:
             base_sql = (
                 "SELECT q.id, q.kind, q.stem, q.options, q.answer, q.explanation, q.metadata, q.created_at, "
-                "       COALESCE(qq.avg_score, NULL) AS avg_score, COALESCE(qq.votes, 0) AS votes "
+                "       CASE WHEN qs.votes > 0 THEN ROUND(1.0 * qs.rating_sum / qs.votes, 2) END AS avg_score, "
+                "       COALESCE(qs.votes, 0) AS votes "
                 "FROM questions q "
-                "LEFT JOIN question_quality qq ON qq.question_id = q.id "
+                "LEFT JOIN question_stats qs ON qs.question_id = q.id "
             )
         else:
             base_sql = (
@@ -487,26 +867,16 @@ def list_questions(
                 "FROM questions q "
             )
 
-        sql = base_sql + where_sql + "ORDER BY q.created_at DESC, q.id DESC LIMIT ? OFFSET ?"
-        params_list = list(params) + [limit, offset]
+        if after is not None:
+            # keyset: wszystko "starsze" niż ostatni element poprzedniej strony
+            where.append("(q.created_at, q.id) < (?, ?)")
+            params.extend(after)
+            where_sql = "WHERE " + " AND ".join(where) + " "
+            offset = 0
 
-        try:
-            cur.execute(sql, tuple(params_list))
-            rows = cur.fetchall()
-        except sqlite3.OperationalError:
-            # ten sam fallback dla listy (gdy JSON_EXTRACT nie ma)
-            if t and use_json_extract:
-                where = [w for w in where if "json_extract" not in w]
-                params2 = [p for p in params if p != t]
-                where.append("LOWER(q.metadata) LIKE ?")
-                params2.append(f'%"topic": "{t}"%')
-                where_sql = ("WHERE " + " AND ".join(where) + " ") if where else ""
-                sql = base_sql + where_sql + "ORDER BY q.created_at DESC, q.id DESC LIMIT ? OFFSET ?"
-                params_list = list(params2) + [limit, offset]
-                cur.execute(sql, tuple(params_list))
-                rows = cur.fetchall()
-            else:
-                raise
+        sql = base_sql + where_sql + "ORDER BY q.created_at DESC, q.id DESC LIMIT ? OFFSET ?"
+        cur.execute(sql, tuple(params) + (limit, offset))
+        rows = cur.fetchall()
 
         qids = [r[0] for r in rows]
         citations_map: dict[str, list[dict]] = {qid: [] for qid in qids}
@@ -547,6 +917,7 @@ def list_questions(
                 }
             items.append(out)
 
-        return {"total": total, "items": items, "limit": limit, "offset": offset}
+        next_cursor = _encode_cursor(rows[-1][7], rows[-1][0]) if len(rows) == limit else None
+        return {"total": total, "items": items, "limit": limit, "offset": offset, "next_cursor": next_cursor}
     finally:
         con.close()
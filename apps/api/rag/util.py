@@ -1,4 +1,6 @@
 # apps/api/rag/util.py
+import json, re
+
 def chunk_text(text: str, max_chars: int = 1100, overlap: int = 200):
     """
     Prosty chunker: tnie tekst na kawałki o długości ~max_chars z zachodzeniem overlap.
@@ -18,3 +20,115 @@ def chunk_text(text: str, max_chars: int = 1100, overlap: int = 200):
             break
         start = max(0, end - overlap)
     return chunks
+
+
+_SENT_SPLIT_RX = re.compile(r"(?<=[.!?…;])\s+(?=[\"„(\[]?[A-ZĄĆĘŁŃÓŚŹŻ0-9])")
+
+
+def split_sentences(text: str, min_chars: int = 20, max_chars: int = 400) -> list[str]:
+    """
+    Dzieli chunk na zdania (indeks zdań do krótszego kontekstu).
+    Chunk to okno znaków, więc pierwszy/ostatni kawałek bywa urwany — takie odrzucamy,
+    jeśli zostaje cokolwiek innego. Zbyt krótkie kawałki doklejamy do następnego.
+    """
+    if not text:
+        return []
+    text = " ".join(text.split())
+    parts = [p.strip() for p in _SENT_SPLIT_RX.split(text) if p.strip()]
+    if len(parts) > 1 and not re.match(r"^[\"„(\[]?[A-ZĄĆĘŁŃÓŚŹŻ0-9]", parts[0]):
+        parts = parts[1:]
+    if len(parts) > 1 and not re.search(r"[.!?…;:]$", parts[-1]):
+        parts = parts[:-1]
+
+    out: list[str] = []
+    carry = ""
+    for p in parts:
+        p = (carry + " " + p).strip() if carry else p
+        if len(p) < min_chars:
+            carry = p
+            continue
+        carry = ""
+        out.append(p[:max_chars])
+    if carry:
+        if out:
+            out[-1] = (out[-1] + " " + carry)[:max_chars]
+        else:
+            out.append(carry)
+    return out
+
+
+class JsonObjectScanner:
+    """
+    Inkrementalny detektor pierwszej kompletnej wartości JSON (obiekt albo tablica) w strumieniu tekstu.
+    Automat nawiasów/stringów: zlicza { } [ ] poza stringami, pamięta escape w stringach.
+    feed() zwraca blob "{...}" / "[...]" gdy wartość się domknęła (wtedy można przerwać generowanie).
+    Tablica na najwyższym poziomie (batch: [{...},{...}]) nie jest ucinana po pierwszym obiekcie;
+    "[" z prozy (np. "[JSON]:") odpada, bo domknięty blob musi się sparsować.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0          # ile znaków bufora już przeskanowano
+        self._start = -1       # indeks pierwszego "{" / "[" w buforze
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self.blob: str | None = None
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, chunk: str) -> str | None:
+        if self.blob is not None:
+            return self.blob
+        if not chunk:
+            return None
+        self._buf += chunk
+        s = self._buf
+
+        i = self._pos
+        while i < len(s):
+            ch = s[i]
+            if self._start == -1:
+                if ch in "{[":
+                    self._start = i
+                    self._depth = 1
+                i += 1
+                continue
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+            else:
+                if ch == '"':
+                    self._in_str = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        blob = s[self._start : i + 1]
+                        if blob[0] == "[" and not _parses(blob):
+                            # nawias z prozy, nie tablica JSON -> szukaj dalej za nim
+                            i = self._start + 1
+                            self._start = -1
+                            self._in_str = self._esc = False
+                            continue
+                        self.blob = blob
+                        self._pos = i + 1
+                        return self.blob
+            i += 1
+        self._pos = len(s)
+        return None
+
+
+def _parses(blob: str) -> bool:
+    try:
+        json.loads(blob)
+        return True
+    except ValueError:
+        return False
@@ -0,0 +1,125 @@
+import re, time, logging
+import numpy as np
+
+from ..settings import settings
+from .. import metrics
+from .emb import get_cross_encoder
+
+# Lokalny weryfikator (cross-encoder NLI na CPU) zamiast drugiego wywołania LLM w semantic checku.
+# Premisy = fragmenty kontekstu (po jednym na linię "[file|p.N] ..."), hipoteza = stem (YN)
+# albo stem + opcja (MCQ). Zwraca werdykt w kształcie checkera LLM albo None, gdy pewność
+# jest poniżej progu — wtedy decyduje LLM.
+# Tryby (NLI_VERIFIER): off | shadow (liczy oba, porównuje, decyduje LLM) | on.
+
+log = logging.getLogger(__name__)
+
+_TAG_RX = re.compile(r"^\[[^\]]*\]\s*")
+_failed = False
+
+
+def mode() -> str:
+    m = (settings.nli_verifier or "off").strip().lower()
+    return m if m in {"off", "shadow", "on"} and not _failed else "off"
+
+
+def _premises(body: str) -> list[str]:
+    out = []
+    for ln in (body or "").splitlines():
+        s = _TAG_RX.sub("", ln.strip())
+        if s:
+            out.append(s)
+    return out
+
+
+def _label_ids(model) -> tuple[int, int]:
+    """(entailment, contradiction) — z configu modelu, domyślnie kolejność cross-encoder/nli-*."""
+    id2label = getattr(getattr(getattr(model, "model", None), "config", None), "id2label", None) or {}
+    ent = con = None
+    for i, lab in id2label.items():
+        lab = str(lab).lower()
+        if lab.startswith("entail"):
+            ent = int(i)
+        elif lab.startswith("contradict"):
+            con = int(i)
+    if ent is None or con is None:
+        return 1, 0
+    return ent, con
+
+
+def _nli(premises: list[str], hypotheses: list[str]) -> np.ndarray | None:
+    """Macierz (len(hypotheses), 2): max P(entailment), max P(contradiction) po premisach."""
+    global _failed
+    if not premises or not hypotheses:
+        return None
+    try:
+        model = get_cross_encoder(settings.nli_model)
+    except Exception as e:
+        # brak modelu / zależności -> weryfikator wyłączony do restartu, zostaje checker LLM
+        log.warning("NLI verifier disabled: %s", e)
+        _failed = True
+        return None
+
+    t0 = time.perf_counter()
+    pairs = [(p, h) for h in hypotheses for p in premises]
+    logits = np.asarray(model.predict(pairs, batch_size=32), dtype=np.float32).reshape(len(hypotheses), len(premises), -1)
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    probs /= probs.sum(axis=-1, keepdims=True)
+    ent, con = _label_ids(model)
+    metrics.observe("nli.ms", (time.perf_counter() - t0) * 1000.0)
+    return np.stack([probs[:, :, ent].max(axis=1), probs[:, :, con].max(axis=1)], axis=1)
+
+
+def _yn_hypothesis(stem: str) -> str:
+    s = (stem or "").strip()
+    s = re.sub(r"^czy\s+", "", s, flags=re.IGNORECASE)
+    return s.rstrip("?").strip()
+
+
+def verify_yn(body: str, stem: str) -> str | None:
+    """"TAK" / "NIE" albo None (wyłączony / niepewny)."""
+    if mode() == "off":
+        return None
+    scores = _nli(_premises(body), [_yn_hypothesis(stem)])
+    if scores is None:
+        return None
+    ent, con = float(scores[0, 0]), float(scores[0, 1])
+    thr = settings.nli_threshold
+    if ent >= thr and ent > con:
+        return _decided("TAK")
+    if con >= thr and con > ent:
+        return _decided("NIE")
+    metrics.inc("nli.fallback")
+    return None
+
+
+def verify_mcq(body: str, q: dict) -> list[str] | None:
+    """Litery opcji wynikających z fragmentów (jak checker LLM) albo None (niepewny)."""
+    if mode() == "off":
+        return None
+    opts = q.get("options") or []
+    if len(opts) != 4:
+        return None
+    stem = (q.get("stem") or "").strip()
+    scores = _nli(_premises(body), [f"{stem} {o}" for o in opts])
+    if scores is None:
+        return None
+    ent = scores[:, 0]
+    thr = settings.nli_threshold
+    letters = [l for l, e in zip("abcd", ent) if e >= thr]
+    # pewność: są opcje ponad progiem, a reszta wyraźnie poniżej
+    if letters and all(e < 1.0 - thr for l, e in zip("abcd", ent) if l not in letters):
+        return _decided(letters)
+    metrics.inc("nli.fallback")
+    return None
+
+
+def _decided(verdict):
+    metrics.inc("nli.decided")
+    return verdict
+
+
+def record_shadow(local, llm) -> None:
+    """Tryb shadow: zgodność werdyktu lokalnego z LLM (tylko gdy lokalny był pewny)."""
+    if local is None or llm is None:
+        return
+    metrics.inc("nli.shadow.agree" if local == llm else "nli.shadow.disagree")
@@ -12,8 +12,63 @@ class Settings(BaseModel):
     emb_model: str = os.getenv("EMB_MODEL","sentence-transformers/all-MiniLM-L6-v2")
     llm_provider: str = os.getenv("LLM_PROVIDER","none")  # openai|ollama|none
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
+    openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     ollama_base_url: str | None = os.getenv("OLLAMA_BASE_URL")
     ollama_model: str = os.getenv("OLLAMA_MODEL", "qwen3:4b")
+    # kilka maszyn Ollamy: "http://gpu1:11434|2|4,http://gpu2:11434" (url|waga|max_concurrency);
+    # gdy puste -> tylko OLLAMA_BASE_URL
+    ollama_endpoints: str | None = os.getenv("OLLAMA_ENDPOINTS")
+    ollama_down_s: float = float(os.getenv("OLLAMA_DOWN_S", "30"))
+    # structured output: JSON Schema w format/response_format (0 = tylko "json")
+    llm_json_schema: bool = os.getenv("LLM_JSON_SCHEMA", "1").lower() in ("1", "true", "yes")
+    # górny limit `hedge` w /gen/* (równolegli kandydaci pytania)
+    llm_max_hedge: int = int(os.getenv("LLM_MAX_HEDGE", "4"))
+    # budżet tokenów kontekstu (fragmentów) na pytanie i startowy estymator znaków/token
+    # (kalibrowany potem na licznikach tokenów z providera)
+    ctx_token_budget: int = int(os.getenv("CTX_TOKEN_BUDGET", "400"))
+    ctx_chars_per_token: float = float(os.getenv("CTX_CHARS_PER_TOKEN", "3.5"))
+    # ile najtrafniejszych zdań chunka idzie do kontekstu pytania (indeks sentences); 0 = stary snippet
+    ctx_sentences: int = int(os.getenv("CTX_SENTENCES", "2"))
+    # maks. liczba klastrów tematycznych chunków (generowanie bez tematu); k ~ sqrt(chunks/2)
+    cluster_max_k: int = int(os.getenv("CLUSTER_MAX_K", "32"))
+    # deduplikacja chunków przy ingest (MinHash/LSH): min. szacowany Jaccard 5-gramów słów; 0 = wyłączona
+    dedup_jaccard: float = float(os.getenv("DEDUP_JACCARD", "0.85"))
+    # reranking kandydatów rag_search cross-encoderem (CPU): off | on
+    rerank: str = os.getenv("RERANK", "off")
+    rerank_model: str = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    # min. pula kandydatów (top wg cosinusa) oceniana przez cross-encoder
+    rerank_pool: int = int(os.getenv("RERANK_POOL", "30"))
+    # kandydaci z P(trafny) poniżej progu nie trafiają do wyników / promptu
+    rerank_min_score: float = float(os.getenv("RERANK_MIN_SCORE", "0.2"))
+    # lokalny weryfikator NLI zamiast checkera LLM: off | shadow | on
+    nli_verifier: str = os.getenv("NLI_VERIFIER", "off")
+    nli_model: str = os.getenv("NLI_MODEL", "MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7")
+    nli_threshold: float = float(os.getenv("NLI_THRESHOLD", "0.85"))
+    # odrzucanie parafraz: próg cosinusa stemu do zapisanych pytań (ten sam kind/topic); 0 = wyłączone.
+    # Domyślnie wyłączone: próg trzeba dobrać do EMB_MODEL (angielski MiniLM słabo rozróżnia polskie stemy)
+    stem_dup_threshold: float = float(os.getenv("STEM_DUP_THRESHOLD", "0"))
+    # oceny (/rate, /rate/batch): okno kolejki write-behind w ms (jedna transakcja na okno); 0 = zapis synchroniczny
+    rate_flush_ms: int = int(os.getenv("RATE_FLUSH_MS", "300"))
+    # pula pre-generowanych pytań per (kind, topic, difficulty); 0 = wyłączona
+    qpool_target: int = int(os.getenv("QPOOL_TARGET", "0"))
+    qpool_batch: int = int(os.getenv("QPOOL_BATCH", "5"))
+    qpool_idle_s: float = float(os.getenv("QPOOL_IDLE_S", "10"))
+    qpool_poll_s: float = float(os.getenv("QPOOL_POLL_S", "2"))
+    qpool_backoff_s: float = float(os.getenv("QPOOL_BACKOFF_S", "300"))
+    qpool_max_keys: int = int(os.getenv("QPOOL_MAX_KEYS", "20"))
+    # streaming wyjść JSON z przerwaniem po domknięciu obiektu (mniej zmarnowanych tokenów)
+    llm_stream_json: bool = os.getenv("LLM_STREAM_JSON", "1").lower() in ("1", "true", "yes")
+    # nadpisania profili wywołań LLM (JSON, patrz providers/profiles.py)
+    llm_profiles: str | None = os.getenv("LLM_PROFILES")
+    # scheduler wywołań LLM: sloty, długość kolejki (potem 429) i max czekanie na slot
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # 0 = wyłączony
+    llm_max_queue: int = int(os.getenv("LLM_MAX_QUEUE", "64"))
+    llm_max_wait_s: float = float(os.getenv("LLM_MAX_WAIT_S", "60"))
+    # cache odpowiedzi LLM (opt-in): tylko wywołania z temperature=0 i bez `variant`
+    llm_cache: bool = os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes")
+    llm_cache_path: str = os.getenv("LLM_CACHE_PATH", "data/index/llm_cache.db")
+    llm_cache_ttl_s: int = int(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
 settings = Settings()
 LLM_PROVIDER = settings.llm_provider
 OLLAMA_MODEL = settings.ollama_model
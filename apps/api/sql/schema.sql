@@ -20,6 +20,55 @@ CREATE TABLE IF NOT EXISTS chunks (
   embedding BLOB NOT NULL
 );
 
+-- Deduplikacja chunków (MinHash/LSH): sygnatury, kubełki LSH i dodatkowe wystąpienia
+-- (source, page) prawie identycznego chunka zapisanego tylko raz
+CREATE TABLE IF NOT EXISTS chunk_minhash (
+  chunk_id INTEGER PRIMARY KEY REFERENCES chunks(id) ON DELETE CASCADE,
+  signature BLOB NOT NULL   -- uint64 x 64
+);
+
+CREATE TABLE IF NOT EXISTS chunk_lsh (
+  band INTEGER NOT NULL,
+  bucket INTEGER NOT NULL,
+  chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+  PRIMARY KEY (band, bucket, chunk_id)
+);
+
+CREATE TABLE IF NOT EXISTS chunk_provenance (
+  chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+  source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE,
+  page INTEGER NOT NULL,
+  PRIMARY KEY (chunk_id, source_id, page)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_provenance_loc ON chunk_provenance(source_id, page);
+
+-- Zdania chunków (drugi poziom indeksu): krótszy kontekst dla generowania pytań;
+-- cytowanie [file|p.N] bierzemy z chunka-rodzica
+CREATE TABLE IF NOT EXISTS sentences (
+  id INTEGER PRIMARY KEY,
+  chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+  idx INTEGER NOT NULL,     -- kolejność w chunku
+  text TEXT NOT NULL,
+  embedding BLOB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sentences_chunk ON sentences(chunk_id);
+
+-- Klastry tematyczne chunków (k-means) do generowania bez tematu
+CREATE TABLE IF NOT EXISTS chunk_clusters (
+  chunk_id INTEGER PRIMARY KEY REFERENCES chunks(id) ON DELETE CASCADE,
+  cluster INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_clusters_cluster ON chunk_clusters(cluster);
+
+CREATE TABLE IF NOT EXISTS cluster_centroids (
+  cluster INTEGER PRIMARY KEY,
+  centroid BLOB NOT NULL,   -- float32, znormalizowany
+  size INTEGER NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS questions (
   id TEXT PRIMARY KEY,       -- uuid
   kind TEXT NOT NULL,        -- 'YN'|'MCQ'
@@ -29,6 +78,8 @@ CREATE TABLE IF NOT EXISTS questions (
   explanation TEXT NOT NULL,
   metadata JSON,             -- {topic,difficulty,timestamp,...}
   fingerprint TEXT,
+  topic TEXT,                -- metadata.topic (strip+lower, '' = brak) — filtr /questions
+  difficulty TEXT,           -- metadata.difficulty (strip+lower)
   created_at TEXT NOT NULL
 );
 
@@ -57,9 +108,48 @@ CREATE TABLE IF NOT EXISTS chunk_weights (
   weight REAL NOT NULL DEFAULT 0.0     -- używane w retrieve: sim*(1+weight)
 );
 
+-- Pula pre-generowanych pytań (zapisane w questions, jeszcze niewydane klientowi)
+CREATE TABLE IF NOT EXISTS question_pool (
+  question_id TEXT PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+  kind TEXT NOT NULL,
+  topic TEXT NOT NULL DEFAULT '',       -- '' = bez tematu
+  difficulty TEXT NOT NULL DEFAULT '',
+  created_at TEXT NOT NULL,
+  served_at TEXT                        -- NULL = dostępne w puli
+);
+
+CREATE INDEX IF NOT EXISTS idx_question_pool_key ON question_pool(kind, topic, difficulty, served_at);
+
+-- Zagregowane oceny per pytanie, utrzymywane triggerami na ratings (bez GROUP BY przy odczycie)
+CREATE TABLE IF NOT EXISTS question_stats (
+  question_id TEXT PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+  rating_sum INTEGER NOT NULL DEFAULT 0,
+  votes INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_insert AFTER INSERT ON ratings
+BEGIN
+  INSERT INTO question_stats(question_id, rating_sum, votes) VALUES (NEW.question_id, NEW.score, 1)
+  ON CONFLICT(question_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, votes = votes + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_delete AFTER DELETE ON ratings
+BEGIN
+  UPDATE question_stats SET rating_sum = rating_sum - OLD.score, votes = votes - 1
+  WHERE question_id = OLD.question_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_stats_update AFTER UPDATE OF score, question_id ON ratings
+BEGIN
+  UPDATE question_stats SET rating_sum = rating_sum - OLD.score, votes = votes - 1
+  WHERE question_id = OLD.question_id;
+  INSERT INTO question_stats(question_id, rating_sum, votes) VALUES (NEW.question_id, NEW.score, 1)
+  ON CONFLICT(question_id) DO UPDATE SET rating_sum = rating_sum + excluded.rating_sum, votes = votes + 1;
+END;
+
+-- zgodność wstecz: ten sam kształt co dawny widok z GROUP BY (init_db odtwarza go przy starcie)
 CREATE VIEW IF NOT EXISTS question_quality AS
 SELECT q.id AS question_id,
-       ROUND(AVG(r.score),2) AS avg_score,
-       COUNT(r.id) AS votes
-FROM questions q LEFT JOIN ratings r ON r.question_id = q.id
-GROUP BY q.id;
+       CASE WHEN s.votes > 0 THEN ROUND(1.0 * s.rating_sum / s.votes, 2) END AS avg_score,
+       COALESCE(s.votes, 0) AS votes
+FROM questions q LEFT JOIN question_stats s ON s.question_id = q.id;
@@ -0,0 +1,173 @@
+import json, os, random, re, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Pusta baza z pełnym schematem (init_db czyta apps/api/sql/schema.sql względem katalogu projektu)."""
+    from apps.api.rag.store import init_db
+
+    monkeypatch.chdir(ROOT)
+    path = str(tmp_path / "test.db")
+    init_db(path)
+    return path
+
+
+@pytest.fixture
+def http_stub():
+    """Lokalny serwer HTTP: start(respond) -> url; respond(method, path, body) -> (status, [obiekty JSON]).
+
+    Obiekty idą jako NDJSON w chunked transfer encoding (chunk na linię, jak stream Ollamy).
+    """
+    servers = []
+
+    def start(respond):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, body):
+                status, lines = respond(self.command, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for obj in lines:
+                        data = (json.dumps(obj) + "\n").encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # klient przerwał stream
+
+            def do_GET(self):
+                self._reply(None)
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                self._reply(json.loads(self.rfile.read(n) or b"{}"))
+
+            def log_message(self, *args):
+                pass
+
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_port}"
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _fake_answer(prompt: str, n: int) -> str:
+    """Odpowiedź "modelu" na prompty generowania i sprawdzania (YN/MCQ, pojedyncze i batch)."""
+    tag = re.search(r"\[[^|\]]+\|p\.\d+\]", prompt)
+    tag = tag.group(0) if tag else "[W0.pdf|p.1]"
+    batch = re.search(r"wygeneruj (\d+) RÓŻNYCH", prompt)
+    if batch:
+        items = []
+        for j in range(int(batch.group(1))):
+            if "wielokrotnego" in prompt:
+                items.append({"stem": f"Jak nazywa się metoda {n}-{j}?",
+                              "options": [f"o {n}-{j} {x}" for x in "abcd"], "answer": "a",
+                              "explanation": f"{tag} Bo tak wynika z fragmentu {n}-{j}."})
+            else:
+                items.append({"stem": f"Czy fakt {n}-{j} jest prawdziwy?", "answer": "TAK",
+                              "explanation": f"{tag} Bo tak wynika z fragmentu {n}-{j}."})
+        return json.dumps({"items": items})
+    if "Dla KAŻDEGO ponumerowanego" in prompt:
+        nums = sorted({int(x) for x in re.findall(r'"(\d+)": \{', prompt)}) or sorted(
+            {int(x) for x in re.findall(r"^(\d+)\. ", prompt, re.M)}
+        )
+        if "TAK/NIE" in prompt:
+            return json.dumps({str(i): "TAK" for i in nums})
+        return json.dumps({str(i): ["a"] for i in nums})
+    if '"correct"' in prompt or "Wskaż, które opcje" in prompt:
+        return json.dumps({"correct": ["a"]})
+    if "Oceń, jaka odpowiedź" in prompt:
+        return json.dumps({"answer": "TAK"})
+    if "wielokrotnego wyboru" in prompt:
+        return json.dumps({
+            "stem": f"Jak nazywa się metoda {n}?",
+            "options": [f"opcja {n} a", f"opcja {n} b", f"opcja {n} c", f"opcja {n} d"],
+            "answer": "a",
+            "explanation": f"{tag} Bo tak wynika z fragmentu numer {n}.",
+        })
+    return json.dumps({"stem": f"Czy fakt {n} jest prawdziwy?", "answer": "TAK",
+                       "explanation": f"{tag} Bo tak wynika z fragmentu {n}."})
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Provider LLM w pamięci zamiast Ollamy/OpenAI; .calls = liczba wywołań, .delay_s = czas odpowiedzi."""
+    from apps.api.providers.base import LLMProvider
+    from apps.api.rag import llm
+
+    class FakeProvider(LLMProvider):
+        name = "fake"
+        model = "fake-model"
+
+        def __init__(self):
+            self.options = {"temperature": 0.2}
+            self.calls = 0
+            self.delay_s = 0.0
+            self.prompts: list[str] = []
+            self.last_options: dict | None = None
+            self.formats: list = []
+
+        def generate(self, prompt, format=None, options=None):
+            self.calls += 1
+            self.prompts.append(prompt)
+            self.formats.append(format)
+            self.last_options = dict(options or {})
+            if self.delay_s:
+                time.sleep(self.delay_s)
+            return _fake_answer(prompt, self.calls)
+
+    prov = FakeProvider()
+    monkeypatch.setattr(llm, "_provider", lambda provider_override=None: prov)
+    return prov
+
+
+WORDS = ("algorytm heurystyka metaheurystyka przeszukiwanie lokalne tabu symulowane wyżarzanie genetyczny "
+         "populacja mutacja krzyżowanie selekcja funkcja celu optymalizacja ograniczenia").split()
+
+
+@pytest.fixture
+def gen_client(db_path, fake_llm, monkeypatch):
+    """TestClient API na pustej bazie z jednym źródłem; wyszukiwanie kontekstu bez modelu embeddingów."""
+    from fastapi.testclient import TestClient
+
+    from apps.api import main, metrics
+    from apps.api.rag.store import _connect
+
+    monkeypatch.setattr(main.settings, "db_path", db_path)
+    rnd = random.Random(0)
+    con = _connect(db_path)
+    try:
+        con.execute("INSERT INTO sources(id, filename, mime, pages, sha256, imported_at) "
+                    "VALUES(1, 'W0.pdf', 'application/pdf', 10, 'sha0', datetime('now'))")
+        ctx = []
+        for p in range(1, 11):
+            text = " ".join(rnd.choice(WORDS) for _ in range(60)) + f" fakt numer {p} jest ważny."
+            cur = con.execute("INSERT INTO chunks(source_id, page, text, quote, embedding) VALUES(1, ?, ?, ?, x'00000000')",
+                              (p, text, text[:180]))
+            ctx.append({"chunk_id": cur.lastrowid, "source_id": 1, "source": "W0.pdf", "page": p,
+                        "quote": text[:180], "text": text, "score": 1.0 - p / 100})
+        con.commit()
+    finally:
+        con.close()
+    monkeypatch.setattr(main, "rag_search", lambda *a, **kw: [dict(c) for c in ctx])
+    monkeypatch.setattr(main, "cluster_contexts", lambda *a, **kw: [])
+    metrics.reset()
+    return TestClient(main.app)
@@ -0,0 +1,73 @@
+import pytest
+
+from apps.api.rag.budget import BudgetExceeded, LLMBudget
+from apps.api.rag.scheduler import SchedulerBusy
+
+
+def test_budget_charge_and_deadline():
+    b = LLMBudget(max_calls=2)
+    b.charge()
+    b.charge()
+    with pytest.raises(BudgetExceeded, match="llm_budget_exhausted"):
+        b.charge()
+    assert b.calls == 2
+    with pytest.raises(BudgetExceeded, match="deadline_exceeded"):
+        LLMBudget(deadline_ms=0).check()
+    assert LLMBudget().remaining_s() is None
+
+
+def test_call_budget_returns_partial_items_with_reason(gen_client, fake_llm):
+    r = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 10, "max_llm_calls": 5})
+    j = r.json()
+    assert r.status_code == 200
+    assert j["reason"] == "llm_budget_exhausted"
+    assert 0 < len(j["items"]) < 10
+    assert fake_llm.calls <= 5
+
+
+def test_pending_batch_candidates_do_not_need_budget(gen_client, fake_llm):
+    # jeden batch + jego sprawdzenie mieszczą się w 2 wywołaniach; zapis pozostałych kandydatów
+    # z tego samego batcha nie jest nowym wywołaniem LLM
+    r = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 5, "batch": 5, "max_llm_calls": 2})
+    j = r.json()
+    assert (j["reason"], len(j["items"])) == ("completed", 5)
+    assert fake_llm.calls <= 2
+
+
+def test_deadline_returns_partial_items(gen_client, fake_llm):
+    fake_llm.delay_s = 0.05
+    r = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 50, "deadline_ms": 400})
+    j = r.json()
+    assert j["reason"] == "deadline_exceeded"
+    assert len(j["items"]) < 50
+
+
+def test_zero_budget_is_an_empty_partial_result(gen_client, fake_llm):
+    r = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 1, "max_llm_calls": 0})
+    assert (r.status_code, r.json()) == (200, {"items": [], "reason": "llm_budget_exhausted"})
+    assert fake_llm.calls == 0
+
+
+def _busy_after(fake_llm, n_ok: int):
+    gen = fake_llm.generate
+
+    def generate(prompt, format=None, options=None):
+        if fake_llm.calls >= n_ok:
+            raise SchedulerBusy(7)
+        return gen(prompt, format=format, options=options)
+
+    fake_llm.generate = generate
+
+
+def test_scheduler_busy_after_some_items_ends_with_reason(gen_client, fake_llm):
+    _busy_after(fake_llm, 4)
+    j = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 5}).json()
+    assert j["reason"] == "scheduler_busy"
+    assert 0 < len(j["items"]) < 5
+
+
+def test_scheduler_busy_without_items_is_429(gen_client, fake_llm):
+    _busy_after(fake_llm, 0)
+    r = gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 5})
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "7"
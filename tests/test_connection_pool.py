@@ -0,0 +1,53 @@
+import gc, sqlite3, threading, weakref
+
+import pytest
+
+from apps.api.rag import store
+
+
+def test_connection_is_reused_within_thread(db_path):
+    con = store._connect(db_path)
+    con.close()
+    again = store._connect(db_path)
+    assert again is con
+    # zagnieżdżone _connect dostaje osobne połączenie
+    other = store._connect(db_path)
+    assert other is not again
+    other.close()
+    again.close()
+
+
+def test_idle_connections_go_away_with_their_thread(db_path):
+    refs = []
+
+    def work():
+        with store.connection(db_path) as con:
+            con.execute("SELECT 1")
+            refs.extend([weakref.ref(con), weakref.ref(store._thread_pool())])
+
+    t = threading.Thread(target=work)
+    t.start()
+    t.join()
+    gc.collect()
+    # pula wątku (i jej wolne połączenie) nie przeżywa wątku
+    assert [r() for r in refs] == [None, None]
+
+
+def test_reset_closes_idle_connections_of_other_threads(db_path):
+    ready, done = threading.Event(), threading.Event()
+    held = []
+
+    def work():
+        with store.connection(db_path) as con:
+            held.append(con)
+        ready.set()
+        done.wait(5)
+
+    t = threading.Thread(target=work)
+    t.start()
+    ready.wait(5)
+    store.reset_connection_pool()
+    with pytest.raises(sqlite3.ProgrammingError):
+        held[0].execute("SELECT 1")
+    done.set()
+    t.join()
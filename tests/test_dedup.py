@@ -0,0 +1,49 @@
+import numpy as np
+
+from apps.api.rag import dedup
+from apps.api.rag.store import _connect
+
+BASE = " ".join(f"słowo{i}" for i in range(200))
+
+
+def _jaccard(a: str, b: str) -> float:
+    sa, sb = dedup._shingles(a), dedup._shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_minhash_estimates_jaccard():
+    other = BASE.replace("słowo100", "inne100").replace("słowo150", "inne150")
+    a, b = dedup.minhash(BASE), dedup.minhash(other)
+    assert a.shape == (dedup.NUM_PERM,)
+    assert dedup.similarity(a, a) == 1.0
+    assert abs(dedup.similarity(a, b) - _jaccard(BASE, other)) < 0.15
+    assert dedup.similarity(a, dedup.minhash("zupełnie inny tekst o czymś innym niż reszta")) < 0.2
+    assert dedup.minhash("") is None
+
+
+def _add_chunk(cur, cid: int, text: str) -> None:
+    cur.execute("INSERT INTO chunks(id, source_id, page, text, quote, embedding) VALUES(?,?,?,?,?,?)",
+                (cid, 1, cid, text, text[:50], np.zeros(4, dtype=np.float32).tobytes()))
+    sig = dedup.minhash(text)
+    dedup.index_chunk(cur, cid, sig, dedup.band_keys(sig))
+
+
+def test_find_duplicate_via_lsh(db_path, monkeypatch):
+    monkeypatch.setattr(dedup.settings, "dedup_jaccard", 0.9)
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        cur.execute("INSERT INTO sources(id, filename, mime, pages, sha256, imported_at) "
+                    "VALUES(1, 'a.pdf', 'application/pdf', 10, 'x', datetime('now'))")
+        _add_chunk(cur, 1, BASE)
+        _add_chunk(cur, 2, " ".join(f"inny{i}" for i in range(200)))
+
+        near = BASE.replace("słowo199", "koniec")
+        sig = dedup.minhash(near)
+        assert dedup.find_duplicate(cur, sig, dedup.band_keys(sig)) == 1
+
+        far = " ".join(f"nowy{i}" for i in range(200))
+        sig = dedup.minhash(far)
+        assert dedup.find_duplicate(cur, sig, dedup.band_keys(sig)) is None
+    finally:
+        con.close()
@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+from apps.api.rag.store import _connect, save_question_with_citations
+
+
+def _q(stem="Czy graf pełny K4 jest planarny?"):
+    return {"kind": "yn", "stem": stem, "options": None, "answer": "TAK", "explanation": "",
+            "metadata": {"topic": "Grafy"}, "citations": []}
+
+
+def _count(db_path):
+    return _connect(db_path).execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+
+def test_duplicate_fingerprint_returns_false(db_path):
+    assert save_question_with_citations("q1", _q(), db_path) is True
+    # inne id, ten sam fingerprint -> ON CONFLICT DO NOTHING, bez wyjątku
+    assert save_question_with_citations("q2", _q(), db_path) is False
+    assert _count(db_path) == 1
+
+
+def test_other_integrity_errors_raise(db_path):
+    assert save_question_with_citations("q1", _q(), db_path) is True
+    # duplikat PK to nie duplikat pytania
+    with pytest.raises(sqlite3.IntegrityError):
+        save_question_with_citations("q1", _q("Czy drzewo jest grafem spójnym?"), db_path)
+    assert save_question_with_citations("q3", _q("Czy drzewo jest grafem spójnym?"), db_path) is True
+    assert _count(db_path) == 2
@@ -0,0 +1,55 @@
+import contextvars, threading, time
+
+import pytest
+
+from apps.api.providers import ollama_provider
+from apps.api.providers.ollama_provider import OllamaProvider
+from apps.api.rag import hedge
+from apps.api.rag.budget import BudgetExceeded
+
+
+def _slow_lines():
+    for _ in range(50):
+        time.sleep(0.1)
+        yield {"response": "x", "done": False}
+    yield {"response": "", "done": True}
+
+
+def test_non_stream_loser_disconnects_on_cancel(http_stub, monkeypatch):
+    # LLM_STREAM_JSON=0: kandydat hedgingu i tak czyta strumieniem, więc anulowanie działa w locie
+    monkeypatch.setattr(ollama_provider.settings, "llm_stream_json", False)
+    url = http_stub(lambda method, path, body: (200, _slow_lines()))
+    cancel = threading.Event()
+    result = {}
+
+    def run():
+        hedge._cancel.set(cancel)
+        try:
+            OllamaProvider(url).generate("p", format="json")
+        except BaseException as e:
+            result["err"] = e
+
+    t = threading.Thread(target=contextvars.copy_context().run, args=(run,))
+    t0 = time.monotonic()
+    t.start()
+    time.sleep(0.3)
+    cancel.set()
+    t.join(5)
+    assert isinstance(result.get("err"), hedge.LLMCancelled)
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_first_accepted_candidate_wins():
+    def attempt(v):
+        time.sleep(0.05 * v)
+        return (f"q{v}" if v >= 2 else None), "rejected"
+
+    assert hedge.hedged(attempt, 1, 3) == ("q2", "rejected")
+
+
+def test_budget_error_is_raised_not_swallowed():
+    def attempt(v):
+        raise BudgetExceeded("deadline_exceeded")
+
+    with pytest.raises(BudgetExceeded):
+        hedge.hedged(attempt, 1, 2)
@@ -0,0 +1,28 @@
+from apps.api.rag.util import JsonObjectScanner
+
+
+def _feed(parts):
+    sc = JsonObjectScanner()
+    for p in parts:
+        blob = sc.feed(p)
+        if blob is not None:
+            return blob
+    return None
+
+
+def test_object_closes_on_matching_brace():
+    assert _feed(['Oto: {"a": "}{', '", "b": {"c": 1}}', " i dalej"]) == '{"a": "}{", "b": {"c": 1}}'
+
+
+def test_top_level_array_is_not_cut_after_first_object():
+    assert _feed(['[{"stem":"a"},', '{"stem":"b"}', "]"]) == '[{"stem":"a"},{"stem":"b"}]'
+
+
+def test_bracket_in_prose_is_skipped():
+    assert _feed(["Odpowiedź [JSON]: ", '{"stem": "x [1]"}']) == '{"stem": "x [1]"}'
+
+
+def test_incomplete_value_returns_none():
+    sc = JsonObjectScanner()
+    assert sc.feed('[{"stem": "a"}') is None
+    assert sc.text == '[{"stem": "a"}'
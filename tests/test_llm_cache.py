@@ -0,0 +1,57 @@
+import pytest
+
+from apps.api.rag import llm, llm_cache
+from apps.api.rag.budget import llm_budget
+from apps.api.rag.llm_cache import LLMCache, make_key
+
+
+def test_key_covers_provider_model_options_format_and_prompt():
+    base = make_key("ollama", "m", {"temperature": 0, "num_ctx": 4096}, "json", "p")
+    assert base == make_key("ollama", "m", {"num_ctx": 4096, "temperature": 0}, "json", "p")
+    variants = [
+        make_key("openai", "m", {"temperature": 0, "num_ctx": 4096}, "json", "p"),
+        make_key("ollama", "m2", {"temperature": 0, "num_ctx": 4096}, "json", "p"),
+        make_key("ollama", "m", {"temperature": 0, "num_ctx": 8192}, "json", "p"),
+        make_key("ollama", "m", {"temperature": 0, "num_ctx": 4096}, {"type": "object"}, "p"),
+        make_key("ollama", "m", {"temperature": 0, "num_ctx": 4096}, "json", "p "),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+
+def test_hit_miss_ttl_and_eviction(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    c = LLMCache(str(tmp_path / "c.db"), ttl_s=60, max_entries=2)
+    assert c.get("k1") is None
+    c.put("k1", "r1")
+    assert c.get("k1") == "r1"
+    now[0] += 61
+    assert c.get("k1") is None  # TTL
+    # limit wpisów: eviction (co 50 zapisów, pierwszy zapis też) usuwa najdawniej używane
+    for i in range(51):
+        now[0] += 1
+        c.put(f"x{i}", "r")
+    assert c.stats()["entries"] <= 2 + 49
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = LLMCache(str(tmp_path / "c.db"), ttl_s=3600, max_entries=100)
+    monkeypatch.setattr(llm, "get_cache", lambda: c)
+    return c
+
+
+def test_ask_llm_caches_only_deterministic_calls(cache, fake_llm):
+    a = llm.ask_llm("Oceń, jaka odpowiedź", options={"temperature": 0})
+    with llm_budget(max_calls=0) as b:
+        # trafienie nie zużywa budżetu (nawet zerowego)
+        assert llm.ask_llm("Oceń, jaka odpowiedź", options={"temperature": 0}) == a
+        assert b.calls == 0
+    assert fake_llm.calls == 1
+
+    llm.ask_llm("Oceń, jaka odpowiedź", options={"temperature": 0}, variant=2)
+    llm.ask_llm("Oceń, jaka odpowiedź", options={"temperature": 0.7})
+    assert fake_llm.calls == 3
+    # inne opcje (np. z innego profilu) = inny klucz
+    llm.ask_llm("Oceń, jaka odpowiedź", options={"temperature": 0, "max_tokens": 48})
+    assert fake_llm.calls == 4
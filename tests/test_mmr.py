@@ -0,0 +1,28 @@
+import numpy as np
+
+from apps.api.rag.search import mmr_select
+
+
+def _unit(rows):
+    m = np.asarray(rows, dtype=np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def test_mmr_lambda_one_is_relevance_order():
+    vecs = _unit([[1, 0], [1, 0.01], [0, 1]])
+    rel = np.asarray([0.9, 0.8, 0.5], dtype=np.float32)
+    assert mmr_select(vecs, rel, 3, lam=1.0) == [0, 1, 2]
+
+
+def test_mmr_skips_near_duplicate():
+    # 0 i 1 to prawie ten sam chunk; przy lam=0.5 drugi wybór to odległy, mniej trafny 2
+    vecs = _unit([[1, 0], [1, 0.01], [0, 1]])
+    rel = np.asarray([0.9, 0.8, 0.5], dtype=np.float32)
+    assert mmr_select(vecs, rel, 2, lam=0.5) == [0, 2]
+
+
+def test_mmr_k_bounds():
+    vecs = _unit([[1, 0], [0, 1]])
+    rel = np.asarray([0.2, 0.1], dtype=np.float32)
+    assert mmr_select(vecs, rel, 0, lam=0.5) == []
+    assert sorted(mmr_select(vecs, rel, 5, lam=0.5)) == [0, 1]
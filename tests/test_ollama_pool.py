@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from apps.api.providers import ollama_provider
+from apps.api.providers.ollama_pool import OllamaEndpoint, OllamaPool
+from apps.api.providers.ollama_provider import OllamaProvider
+
+
+class _Stub:
+    """Zachowanie stuba Ollamy: healthy=False -> 500 na generate i probe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.healthy = True
+        self.calls = 0
+
+    def __call__(self, method, path, body):
+        if path == "/api/tags":
+            return (200 if self.healthy else 500), [{"models": []}]
+        self.calls += 1
+        if not self.healthy:
+            return 500, [{"error": "boom"}]
+        return 200, [{"response": f'{{"from": "{self.name}"}}', "done": True, "prompt_eval_count": 5}]
+
+
+@pytest.fixture(autouse=True)
+def _no_stream(monkeypatch):
+    monkeypatch.setattr(ollama_provider.settings, "llm_stream_json", False)
+
+
+def _provider(pool: OllamaPool) -> OllamaProvider:
+    prov = OllamaProvider(pool.endpoints[0].url)
+    prov.pool = pool
+    return prov
+
+
+def test_routes_to_least_loaded_endpoint():
+    pool = OllamaPool([OllamaEndpoint("http://a", max_concurrency=2), OllamaEndpoint("http://b", max_concurrency=2)])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.url, second.url} == {"http://a", "http://b"}
+    pool.release(first, ok=True)
+    assert pool.acquire().url == first.url
+
+
+def test_failover_and_probe_recovery(http_stub):
+    bad, good = _Stub("bad"), _Stub("good")
+    bad.healthy = False
+    pool = OllamaPool([OllamaEndpoint(http_stub(bad)), OllamaEndpoint(http_stub(good))], down_s=0.2)
+    prov = _provider(pool)
+
+    # remis obciążenia -> pierwszy (bad), 500 -> down i failover na good w tym samym wywołaniu
+    assert prov.generate("p") == '{"from": "good"}'
+    assert (bad.calls, good.calls) == (1, 1)
+    st = {s["url"]: s for s in pool.stats()}
+    assert st[pool.endpoints[0].url]["errors"] == 1
+
+    # w oknie down_s endpoint jest pomijany
+    assert prov.generate("p") == '{"from": "good"}'
+    assert bad.calls == 1
+
+    # po down_s probe nadal pada -> endpoint zostaje poza pulą
+    time.sleep(0.25)
+    assert prov.generate("p") == '{"from": "good"}'
+    assert bad.calls == 1
+    assert pool.endpoints[0].is_down(time.monotonic())
+
+    # probe przechodzi -> endpoint wraca do routingu
+    bad.healthy = True
+    time.sleep(0.25)
+    assert prov.generate("p") == '{"from": "bad"}'
+    assert pool.endpoints[0].failures == 0
+
+
+def test_all_endpoints_down_raises(http_stub):
+    a, b = _Stub("a"), _Stub("b")
+    a.healthy = b.healthy = False
+    pool = OllamaPool([OllamaEndpoint(http_stub(a)), OllamaEndpoint(http_stub(b))], down_s=30.0)
+    with pytest.raises(RuntimeError, match="Ollama unavailable"):
+        _provider(pool).generate("p")
+    assert all(not s["up"] for s in pool.stats())
@@ -0,0 +1,44 @@
+import pytest
+
+from apps.api import metrics
+from apps.api.providers import ollama_provider
+from apps.api.providers.ollama_provider import OllamaProvider
+from apps.api.rag import packer
+
+PROMPT = "x" * 70
+
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    monkeypatch.setattr(ollama_provider.settings, "llm_stream_json", True)
+    monkeypatch.setattr(ollama_provider.settings, "ollama_model", "stub-model")
+    monkeypatch.setattr(packer, "_chars_per_token", {})
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _stats(done_after: int):
+    # obiekt JSON domyka się w drugim chunku, statystyki przychodzą w chunku done
+    lines = [{"response": '{"a":', "done": False}, {"response": " 1}", "done": False}]
+    lines += [{"response": " ", "done": False}] * done_after
+    lines.append({"response": "", "done": True, "prompt_eval_count": 10, "prompt_eval_duration": 20_000_000})
+    return lines
+
+
+def test_stream_early_stop_still_records_prompt_stats(http_stub):
+    url = http_stub(lambda method, path, body: (200, _stats(done_after=2)))
+    assert OllamaProvider(url).generate(PROMPT, format="json") == '{"a": 1}'
+    assert packer.calibration() == {"stub-model": 7.0}
+    obs = metrics.snapshot()["observations"]
+    assert obs["llm.prompt_tokens"]["p50"] == 10
+    assert obs["llm.prefill_ms_per_token"]["p50"] == 2.0
+
+
+def test_stream_stops_model_that_keeps_generating(http_stub):
+    url = http_stub(lambda method, path, body: (200, _stats(done_after=500)))
+    assert OllamaProvider(url).generate(PROMPT, format="json") == '{"a": 1}'
+    assert metrics.snapshot()["counters"]["llm.stream.early_stop"] == 1
+    assert packer.calibration() == {}
+    # bez chunka done: ms/token prefillu z czasu do pierwszego tokenu (dla /metrics rerank)
+    assert metrics.snapshot()["observations"]["llm.ttft_ms_per_token"]["count"] == 1
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from apps.api.providers.openai_provider import OpenAIProvider
+from apps.api.rag.budget import BudgetExceeded, llm_budget
+
+
+class _Completions:
+    def __init__(self):
+        self.kwargs = None
+
+    def create(self, **kwargs):
+        self.kwargs = kwargs
+        msg = SimpleNamespace(content='{"ok": 1}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=msg)], usage=None)
+
+
+def _provider() -> tuple[OpenAIProvider, _Completions]:
+    prov = OpenAIProvider(api_key="test")
+    comp = _Completions()
+    prov.cli = SimpleNamespace(chat=SimpleNamespace(completions=comp))
+    return prov, comp
+
+
+def test_timeout_follows_remaining_deadline_without_floor():
+    prov, comp = _provider()
+    with llm_budget(deadline_ms=300):
+        prov.generate("p")
+    assert 0 < comp.kwargs["timeout"] <= 0.3
+
+
+def test_expired_deadline_raises_before_request():
+    prov, comp = _provider()
+    with llm_budget(deadline_ms=0):
+        with pytest.raises(BudgetExceeded, match="deadline_exceeded"):
+            prov.generate("p")
+    assert comp.kwargs is None
@@ -0,0 +1,38 @@
+import pytest
+
+from apps.api.rag.store import _connect, _decode_cursor, _encode_cursor, list_questions
+
+
+def test_cursor_round_trip():
+    c = _encode_cursor("2026-01-02 03:04:05", "q-ąę/+=")
+    assert "=" not in c
+    assert _decode_cursor(c) == ("2026-01-02 03:04:05", "q-ąę/+=")
+    assert _decode_cursor("nie-kursor") is None
+
+
+def test_keyset_pages_cover_all_rows(db_path):
+    con = _connect(db_path)
+    try:
+        con.executemany(
+            "INSERT INTO questions(id, kind, stem, answer, explanation, topic, difficulty, created_at) "
+            "VALUES(?, 'YN', ?, 'TAK', '-', ?, 'medium', ?)",
+            # część pytań z tym samym created_at -> kolejność rozstrzyga id
+            [(f"q{i:02d}", f"pytanie {i}", "grafy" if i % 2 else "sieci", f"2026-01-01 00:00:{i // 3:02d}")
+             for i in range(20)],
+        )
+        con.commit()
+    finally:
+        con.close()
+
+    seen, cursor = [], None
+    while True:
+        page = list_questions(db_path, limit=3, topic="grafy", cursor=cursor, with_citations=False)
+        seen += [q["question_id"] for q in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    expected = sorted((f"q{i:02d}" for i in range(20) if i % 2), key=lambda q: ((int(q[1:]) // 3), q), reverse=True)
+    assert seen == expected
+
+    with pytest.raises(ValueError):
+        list_questions(db_path, cursor="zly")
@@ -0,0 +1,52 @@
+import pytest
+
+from apps.api import metrics
+from apps.api.providers.profiles import GENERATE_QUESTION, SEMANTIC_CHECK, get_profile
+from apps.api.rag import generate, llm, packer
+
+
+@pytest.fixture
+def ollama_like(fake_llm, monkeypatch):
+    # profile domyślne są per nazwa providera
+    fake_llm.name = "ollama"
+    monkeypatch.setattr(packer.settings, "ctx_chars_per_token", 4.0)
+    monkeypatch.setattr(packer, "_chars_per_token", {})
+    metrics.reset()
+    return fake_llm
+
+
+def test_profiles_with_overrides(monkeypatch):
+    assert get_profile("ollama", SEMANTIC_CHECK)["temperature"] == 0
+    assert get_profile("ollama", None) == {}
+    monkeypatch.setattr(
+        "apps.api.providers.profiles.settings.llm_profiles",
+        '{"ollama": {"semantic_check": {"max_tokens": 24}}}',
+    )
+    assert get_profile("ollama", SEMANTIC_CHECK)["max_tokens"] == 24
+    assert get_profile("ollama", GENERATE_QUESTION)["max_tokens"] == 800
+
+
+def test_short_prompt_keeps_profile_max_tokens(ollama_like):
+    llm.ask_llm("krótki prompt", profile=GENERATE_QUESTION)
+    assert ollama_like.last_options["max_tokens"] == 800
+    assert ollama_like.last_options["num_ctx"] == 4096
+
+
+def test_long_prompt_caps_max_tokens_to_num_ctx(ollama_like):
+    prompt = "x" * (3500 * 4)  # ~3500 tokenów estymaty przy num_ctx 4096
+    llm.ask_llm(prompt, profile=GENERATE_QUESTION)
+    room = 4096 - 3500 - llm._CTX_MARGIN_TOKENS
+    assert ollama_like.last_options["max_tokens"] == room
+    assert metrics.snapshot()["counters"]["llm.max_tokens_capped"] == 1
+
+    llm.ask_llm("x" * (4100 * 4), profile=GENERATE_QUESTION)
+    assert ollama_like.last_options["max_tokens"] == llm._MIN_OUTPUT_TOKENS
+
+
+def test_batch_capacity_follows_context_room(ollama_like):
+    assert llm.context_room("x" * 400, profile=GENERATE_QUESTION) == 4096 - 100 - llm._CTX_MARGIN_TOKENS
+    room = 4096 - 100 - llm._CTX_MARGIN_TOKENS
+    assert generate._batch_capacity("x" * 400, 10, None) == (room - generate._BATCH_PROMPT_TOKENS) // generate._BATCH_ITEM_TOKENS
+    assert generate._batch_capacity("x" * (4000 * 4), 10, None) == 1
+    ollama_like.name = "fake"  # brak num_ctx w profilu -> bez limitu
+    assert generate._batch_capacity("x" * 400, 10, None) == 10
@@ -0,0 +1,41 @@
+from apps.api.rag.question_pool import QuestionPoolWorker
+from apps.api.rag.store import _connect, add_to_question_pool, init_db, take_pooled_questions
+
+
+def _questions(db_path: str, qids: list[str]) -> None:
+    con = _connect(db_path)
+    try:
+        con.executemany(
+            "INSERT INTO questions(id, kind, stem, answer, explanation, created_at) "
+            "VALUES(?, 'YN', ?, 'TAK', '-', datetime('now'))",
+            [(q, q) for q in qids],
+        )
+        con.commit()
+    finally:
+        con.close()
+
+
+def test_pool_key_ignores_topic_case(db_path):
+    _questions(db_path, ["q1", "q2"])
+    assert add_to_question_pool(db_path, ["q1", "q2"], "YN", "Grafy ", "Medium") == 2
+    assert take_pooled_questions(db_path, "YN", " grafy", "medium", 5) == ["q1", "q2"]
+
+
+def test_init_db_normalizes_old_pool_keys(db_path):
+    _questions(db_path, ["q1"])
+    con = _connect(db_path)
+    try:
+        con.execute("INSERT INTO question_pool(question_id, kind, topic, difficulty, created_at) "
+                    "VALUES('q1', 'YN', ' Grafy', 'Medium', datetime('now'))")
+        con.commit()
+    finally:
+        con.close()
+    init_db(db_path)
+    assert take_pooled_questions(db_path, "YN", "GRAFY", "medium", 5) == ["q1"]
+
+
+def test_demand_key_matches_pool_key(tmp_path):
+    w = QuestionPoolWorker(lambda *a: 0, str(tmp_path / "x.db"))
+    w.note_demand("YN", "Grafy", "Medium")
+    w.note_demand("YN", " grafy ", "medium")
+    assert w._demand[("YN", "grafy", "medium")][0] == 2
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from apps.api.rag import rating_queue
+from apps.api.rag.store import _connect, apply_ratings, init_db, list_questions, rating_delta
+
+
+def _seed(db_path: str) -> None:
+    con = _connect(db_path)
+    try:
+        cur = con.cursor()
+        cur.execute("INSERT INTO sources(id, filename, mime, pages, sha256, imported_at) "
+                    "VALUES(1, 'a.pdf', 'application/pdf', 2, 'x', datetime('now'))")
+        emb = np.zeros(4, dtype=np.float32).tobytes()
+        cur.executemany("INSERT INTO chunks(id, source_id, page, text, quote, embedding) VALUES(?, 1, ?, 't', 't', ?)",
+                        [(1, 1, emb), (2, 2, emb)])
+        cur.executemany("INSERT INTO questions(id, kind, stem, answer, explanation, created_at) "
+                        "VALUES(?, 'YN', ?, 'TAK', '-', datetime('now'))", [("qa", "a"), ("qb", "b")])
+        cur.executemany("INSERT INTO question_citations(question_id, source_id, page, quote) VALUES(?, 1, ?, 'c')",
+                        [("qa", 1), ("qb", 1), ("qb", 2)])
+        con.commit()
+    finally:
+        con.close()
+
+
+def _weights(db_path: str) -> dict[int, float]:
+    con = _connect(db_path)
+    try:
+        return {int(c): float(w) for c, w in con.execute("SELECT chunk_id, weight FROM chunk_weights")}
+    finally:
+        con.close()
+
+
+def test_apply_ratings_sums_deltas_per_chunk(db_path):
+    _seed(db_path)
+    res = apply_ratings(db_path, [("qa", 10, None), ("qa", 10, "ok"), ("qb", 1, None), ("brak", 7, None)])
+    assert res == {"ratings": 3, "chunks": 2}
+    w = _weights(db_path)
+    assert w[1] == pytest.approx(2 * rating_delta(10) + rating_delta(1))
+    assert w[2] == pytest.approx(rating_delta(1))
+
+
+def test_apply_ratings_clamps_summed_delta_once(db_path):
+    _seed(db_path)
+    con = _connect(db_path)
+    try:
+        con.execute("INSERT INTO chunk_weights(chunk_id, weight) VALUES(1, 1.4)")
+        con.commit()
+    finally:
+        con.close()
+    # +0.27 i -0.27 w jednej paczce: suma 0, waga bez zmian (ocena po ocenie: 1.5 -> 1.23)
+    apply_ratings(db_path, [("qa", 10, None), ("qa", 1, None)])
+    assert _weights(db_path)[1] == pytest.approx(1.4)
+
+
+def test_queue_drops_batch_after_max_attempts(monkeypatch):
+    calls = []
+
+    def failing(db_path, batch):
+        calls.append(len(batch))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(rating_queue, "apply_ratings", failing)
+    q = rating_queue.RatingQueue(":memory:", 1.0)
+    q.submit([("qa", 5, None)] * 3)
+    for _ in range(rating_queue._MAX_ATTEMPTS + 1):
+        assert q.flush() == 0
+    st = q.stats()
+    assert calls == [3] * rating_queue._MAX_ATTEMPTS
+    assert (st["pending"], st["dropped"], st["failures"]) == (0, 3, rating_queue._MAX_ATTEMPTS)
+
+
+def test_queue_caps_pending(monkeypatch):
+    monkeypatch.setattr(rating_queue, "_MAX_PENDING", 10)
+    q = rating_queue.RatingQueue(":memory:", 1.0)
+    q.submit([(f"q{i}", 5, None) for i in range(15)])
+    st = q.stats()
+    assert (st["pending"], st["dropped"]) == (10, 5)
+    assert q._pending[0][0] == "q5"
+
+
+def _quality(db_path: str) -> dict[str, tuple]:
+    con = _connect(db_path)
+    try:
+        return {q: (avg, votes) for q, avg, votes in con.execute("SELECT question_id, avg_score, votes FROM question_quality")}
+    finally:
+        con.close()
+
+
+def test_question_stats_backfill_and_triggers(db_path):
+    _seed(db_path)
+    con = _connect(db_path)
+    try:
+        # baza sprzed question_stats: same ratings, bez tabeli statystyk i triggerów
+        con.executescript(
+            """
+            DROP TRIGGER trg_ratings_stats_insert;
+            DROP TRIGGER trg_ratings_stats_delete;
+            DROP TRIGGER trg_ratings_stats_update;
+            DROP VIEW question_quality;
+            DROP TABLE question_stats;
+            INSERT INTO ratings(question_id, score, created_at) VALUES
+              ('qa', 8, datetime('now')), ('qa', 4, datetime('now')), ('qb', 10, datetime('now'));
+            """
+        )
+    finally:
+        con.close()
+
+    init_db(db_path)
+    assert _quality(db_path) == {"qa": (6.0, 2), "qb": (10.0, 1)}
+    # backfill jednorazowy: kolejny start nie liczy ocen drugi raz
+    init_db(db_path)
+    assert _quality(db_path) == {"qa": (6.0, 2), "qb": (10.0, 1)}
+
+    con = _connect(db_path)
+    try:
+        con.execute("INSERT INTO ratings(question_id, score, created_at) VALUES('qb', 2, datetime('now'))")
+        con.commit()
+        assert _quality(db_path) == {"qa": (6.0, 2), "qb": (6.0, 2)}
+
+        # przeniesienie oceny 4 z qa na qb (UPDATE question_id i score naraz)
+        con.execute("UPDATE ratings SET question_id='qb', score=3 WHERE question_id='qa' AND score=4")
+        con.commit()
+        assert _quality(db_path) == {"qa": (8.0, 1), "qb": (5.0, 3)}
+
+        con.execute("DELETE FROM ratings WHERE question_id='qa'")
+        con.commit()
+        assert _quality(db_path) == {"qa": (None, 0), "qb": (5.0, 3)}
+    finally:
+        con.close()
+
+    page = list_questions(db_path, with_citations=False)
+    assert {i["question_id"]: i["quality"] for i in page["items"]} == {
+        "qa": {"avg_score": None, "votes": 0},
+        "qb": {"avg_score": 5.0, "votes": 3},
+    }
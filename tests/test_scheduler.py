@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from apps.api.rag.scheduler import PRIORITY_INTERACTIVE, LLMScheduler, SchedulerBusy
+
+
+def _wait_busy(sched: LLMScheduler, max_wait_s: float | None) -> float:
+    t0 = time.monotonic()
+    with pytest.raises(SchedulerBusy):
+        with sched.slot("b", PRIORITY_INTERACTIVE, max_wait_s=max_wait_s):
+            pass
+    return time.monotonic() - t0
+
+
+def test_request_deadline_caps_but_never_extends_max_wait():
+    sched = LLMScheduler(1, max_queue=4, max_wait_s=0.1)
+    with sched.slot("a", PRIORITY_INTERACTIVE):
+        # duży deadline_ms nie trzyma wątku w kolejce dłużej niż LLM_MAX_WAIT_S
+        assert _wait_busy(sched, 60.0) < 1.0
+        # krótszy deadline skraca czekanie
+        assert _wait_busy(sched, 0.0) < 0.05
+    assert sched.stats()["waiting"] == 0
+
+
+def test_full_queue_is_rejected_immediately():
+    sched = LLMScheduler(1, max_queue=0, max_wait_s=5.0)
+    with sched.slot("a", PRIORITY_INTERACTIVE):
+        assert _wait_busy(sched, None) < 0.05
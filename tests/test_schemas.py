@@ -0,0 +1,42 @@
+from apps.api.providers import ollama_provider
+from apps.api.providers.ollama_provider import OllamaProvider
+from apps.api.rag import schemas
+from apps.api.rag.schemas import MCQ_SCHEMA, YN_CHECK_SCHEMA, YN_SCHEMA, YN_VERDICT, batch_schema, check_map_schema
+
+
+def test_batch_and_check_map_schemas():
+    b = batch_schema(MCQ_SCHEMA, 3)
+    assert b["properties"]["items"]["items"] is MCQ_SCHEMA
+    assert (b["properties"]["items"]["minItems"], b["properties"]["items"]["maxItems"]) == (3, 3)
+    m = check_map_schema(YN_VERDICT, 2, "yn_check_batch")
+    assert m["required"] == ["1", "2"] and m["additionalProperties"] is False
+
+
+def test_output_format_switch(monkeypatch):
+    assert schemas.output_format(YN_SCHEMA) is YN_SCHEMA
+    monkeypatch.setattr(schemas.settings, "llm_json_schema", False)
+    assert schemas.output_format(YN_SCHEMA) is None
+    assert schemas.output_format(YN_SCHEMA, default="json") == "json"
+
+
+def test_generation_sends_schemas(gen_client, fake_llm):
+    gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 1})
+    assert fake_llm.formats[:2] == [YN_SCHEMA, YN_CHECK_SCHEMA]
+
+
+def test_generation_without_schemas(gen_client, fake_llm, monkeypatch):
+    monkeypatch.setattr(schemas.settings, "llm_json_schema", False)
+    gen_client.post("/gen/yn", json={"topic": "algorytm", "n": 1})
+    assert all(f in (None, "json") for f in fake_llm.formats)
+
+
+def test_ollama_puts_schema_in_format(http_stub, monkeypatch):
+    monkeypatch.setattr(ollama_provider.settings, "llm_stream_json", False)
+    seen = []
+
+    def respond(method, path, body):
+        seen.append(body)
+        return 200, [{"response": '{"answer": "TAK"}', "done": True}]
+
+    OllamaProvider(http_stub(respond)).generate("p", format=YN_CHECK_SCHEMA)
+    assert seen[0]["format"] == YN_CHECK_SCHEMA
@@ -0,0 +1,36 @@
+from apps.api.rag.util import split_sentences
+
+
+def test_split_polish_sentences():
+    text = (
+        "Algorytm genetyczny przetwarza populację rozwiązań. "
+        "Operator krzyżowania łączy dwa osobniki w nowego potomka! "
+        "Czy mutacja zwiększa różnorodność populacji? "
+        "Łańcuch Markowa opisuje przejścia między stanami."
+    )
+    assert split_sentences(text) == [
+        "Algorytm genetyczny przetwarza populację rozwiązań.",
+        "Operator krzyżowania łączy dwa osobniki w nowego potomka!",
+        "Czy mutacja zwiększa różnorodność populacji?",
+        "Łańcuch Markowa opisuje przejścia między stanami.",
+    ]
+
+
+def test_split_drops_cut_edges_of_chunk_window():
+    # chunk to okno znaków: urwany początek (mała litera) i koniec bez kropki odpadają
+    text = (
+        "czenia wartości funkcji celu. "
+        "Przeszukiwanie tabu zapamiętuje ostatnio odwiedzone rozwiązania. "
+        "Symulowane wyżarzanie akceptuje gorsze ruchy z malejącym prawdopodobieństwem. "
+        "Temperatura w kolejnych krokach"
+    )
+    assert split_sentences(text) == [
+        "Przeszukiwanie tabu zapamiętuje ostatnio odwiedzone rozwiązania.",
+        "Symulowane wyżarzanie akceptuje gorsze ruchy z malejącym prawdopodobieństwem.",
+    ]
+
+
+def test_split_merges_short_fragments_and_keeps_abbreviations():
+    text = "Np. tak. Funkcja celu ocenia jakość rozwiązania, np. długość trasy."
+    assert split_sentences(text) == ["Np. tak. Funkcja celu ocenia jakość rozwiązania, np. długość trasy."]
+    assert split_sentences("") == []
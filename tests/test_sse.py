@@ -0,0 +1,45 @@
+import asyncio, json
+from types import SimpleNamespace
+
+from apps.api import main
+
+
+def _events(body: str) -> list[dict]:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_stream_sends_each_question_then_done(gen_client):
+    with gen_client.stream("POST", "/gen/yn/stream", json={"topic": "algorytm", "n": 3}) as r:
+        assert r.headers["content-type"].startswith("text/event-stream")
+        evs = _events("".join(r.iter_text()))
+    assert [e["event"] for e in evs if e["event"] != "progress"] == ["question"] * 3 + ["done"]
+    assert evs[-1]["count"] == 3
+
+
+class _Request:
+    """Request rozłączany po `after` sprawdzeniach is_disconnected."""
+
+    def __init__(self, after: int):
+        self.after = after
+        self.checks = 0
+        self.headers = {"x-client-id": "sse-test"}
+        self.client = SimpleNamespace(host="127.0.0.1")
+
+    async def is_disconnected(self) -> bool:
+        self.checks += 1
+        return self.checks > self.after
+
+
+def test_disconnect_stops_generation(gen_client, fake_llm):
+    req = main.GenReq(topic="algorytm", n=20)
+
+    async def consume():
+        return [chunk async for chunk in main._sse(_Request(after=2), req, "YN")]
+
+    chunks = asyncio.run(consume())
+    assert len(chunks) == 2
+    calls = fake_llm.calls
+    # po rozłączeniu generator jest zamknięty: żadnych dalszych wywołań LLM
+    asyncio.run(asyncio.sleep(0.2))
+    assert fake_llm.calls == calls
+    assert calls < 20